@@ -1,5 +1,7 @@
 from fastapi import APIRouter, HTTPException, Body, BackgroundTasks
-from backend.db.firestore import get_db
+from backend.db.firestore import get_db_async
+from backend.services.ingestion import interaction_buffer
+from backend.services.recommendation import recommendation_service
 # Import sync function logic or move it. 
 # For now, let's assume we can import it from the root backend (as per sys.path in original)
 # A better way is to move sync_graph to backend/services/sync.py, but for now we import relatively if possible.
@@ -16,23 +18,34 @@ except ImportError:
 router = APIRouter()
 
 @router.post("/track")
-def track_interaction(data: dict = Body(...)):
+async def track_interaction(data: dict = Body(...)):
     """
     Receives interaction data:
     { "user_id": "u_123", "song_id": "s_55", ... }
+
+    Queued (and logged to the write-ahead log) for a batched Firestore write;
+    the response does not wait for Firestore.
     """
-    db = get_db()
+    db = await get_db_async()
     if not db:
         raise HTTPException(status_code=503, detail="Database not configured")
-    
-    try:
-        db.collection('interactions').add(data)
-        return {"status": "recorded"}
-    except Exception as e:
-        print(f"Error saving interaction: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+    if not interaction_buffer.submit(data):
+        # Backpressure: the buffer is full, the client may retry later
+        raise HTTPException(status_code=503, detail="Interaction queue full")
+    return {"status": "queued"}
+
+@router.get("/stats")
+def ingestion_stats():
+    """Queue depth, flush latency, batch sizes and backpressure drops of the ingestion buffer."""
+    return interaction_buffer.stats()
+
+def _sync_and_refresh():
+    # New interactions re-embed their users; serve them right away
+    if sync_interactions_to_graph():
+        recommendation_service.refresh_user_updates()
 
 @router.post("/sync")
 def trigger_sync(background_tasks: BackgroundTasks):
-    background_tasks.add_task(sync_interactions_to_graph)
+    background_tasks.add_task(_sync_and_refresh)
     return {"status": "Sync started"}
@@ -1,18 +1,14 @@
 from fastapi import APIRouter, HTTPException, Body
 from firebase_admin import firestore
-from backend.db.firestore import get_db
+from backend.db.firestore import get_db_async, run_db
+from backend.services.library_cache import library_cache
 
 router = APIRouter()
 
-@router.get("/{user_id}")
-def get_user_library(user_id: str):
-    db = get_db()
-    if not db:
-        raise HTTPException(status_code=503, detail="Database not available")
-
+def _load_library(db, user_id: str) -> dict:
     user_ref = db.collection('users').document(user_id)
     doc = user_ref.get()
-    
+
     if not doc.exists:
          # Create default profile
          user_ref.set({
@@ -20,61 +16,78 @@ def get_user_library(user_id: str):
              'playlists': []
          }, merge=True)
          return {'liked': [], 'playlists': []}
-    
+
     data = doc.to_dict()
     return {
         'liked': data.get('liked_songs', []),
         'playlists': data.get('playlists', [])
     }
 
+@router.get("/{user_id}")
+async def get_user_library(user_id: str):
+    db = await get_db_async()
+    if not db:
+        raise HTTPException(status_code=503, detail="Database not available")
+
+    # Served from the in-process cache; on a miss, read and (for new users)
+    # default-profile write in one executor hop
+    return await library_cache.get(user_id, lambda: run_db(_load_library, db, user_id))
+
+@router.get("/cache/stats")
+def get_library_cache_stats():
+    """Hit rate and size of the per-user library cache."""
+    return library_cache.stats()
+
 @router.post("/like")
-def toggle_like(payload: dict = Body(...)):
+async def toggle_like(payload: dict = Body(...)):
     """
     { "user_id": "...", "song_id": "...", "action": "add" | "remove" }
     """
-    db = get_db()
+    db = await get_db_async()
     if not db:
         raise HTTPException(status_code=503, detail="Database not available")
 
     uid = payload.get('user_id')
     sid = payload.get('song_id')
     action = payload.get('action') # 'add' or 'remove'
-    
+
     user_ref = db.collection('users').document(uid)
-    
+
     if action == 'add':
-        user_ref.update({
+        await run_db(user_ref.update, {
             'liked_songs': firestore.ArrayUnion([sid])
         })
     elif action == 'remove':
-        user_ref.update({
+        await run_db(user_ref.update, {
             'liked_songs': firestore.ArrayRemove([sid])
         })
-        
+    library_cache.apply_like(uid, sid, action) # Write-through once Firestore accepted the update
+
     return {"status": "success", "song_id": sid, "action": action}
 
 @router.post("/playlist")
-def manage_playlist(payload: dict = Body(...)):
+async def manage_playlist(payload: dict = Body(...)):
     """
     { "user_id": "...", "playlist": { "id": "p_123", "title": "My Mix", "tracks": [] } }
     """
     import time
-    db = get_db()
+    db = await get_db_async()
     if not db:
         raise HTTPException(status_code=503, detail="Database not available")
 
     uid = payload.get('user_id')
-    playlist = payload.get('playlist') 
-    
+    playlist = payload.get('playlist')
+
     if not uid or not playlist:
         raise HTTPException(status_code=400, detail="Missing data")
-        
+
     # MVP: Save to subcollection
     playlist_id = playlist.get('id')
     if not playlist_id:
         playlist_id = f"p_{int(time.time())}"
         playlist['id'] = playlist_id
-        
-    db.collection('users').document(uid).collection('playlists').document(playlist_id).set(playlist)
-    
+
+    await run_db(db.collection('users').document(uid).collection('playlists').document(playlist_id).set, playlist)
+    library_cache.invalidate(uid)
+
     return {"status": "saved", "playlist": playlist}
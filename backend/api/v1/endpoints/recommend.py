@@ -1,15 +1,56 @@
-from fastapi import APIRouter
-from backend.services.recommendation import recommendation_service
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Body, BackgroundTasks, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from backend.core.config import get_settings
+from backend.services.recommendation import recommendation_service, recommendation_coalescer
 
 router = APIRouter()
+settings = get_settings()
+
+@router.post("/batch")
+def get_recommendations_batch(payload: dict = Body(...)):
+    """
+    { "user_ids": ["u_1", "u_2", ...], "top_k": 20 }
+    """
+    user_ids = payload.get('user_ids')
+    top_k = payload.get('top_k', 20)
+
+    if not isinstance(user_ids, list) or not all(isinstance(u, str) for u in user_ids):
+        raise HTTPException(status_code=400, detail="user_ids must be a list of strings")
+    if len(user_ids) > settings.RECOMMEND_MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {settings.RECOMMEND_MAX_BATCH_SIZE} users per batch")
+    if not isinstance(top_k, int) or top_k <= 0:
+        raise HTTPException(status_code=400, detail="top_k must be a positive integer")
+
+    body = recommendation_service.render_recommendations_map(user_ids, top_k=top_k)
+    return Response(content=body, media_type="application/json")
+
+@router.get("/stats")
+def get_coalescer_stats():
+    # Queue depth / batch size metrics of the request coalescer
+    return recommendation_coalescer.stats()
+
+@router.get("/model")
+def get_model_info():
+    return recommendation_service.model_info()
+
+@router.post("/reload")
+def reload_model(background_tasks: BackgroundTasks, x_admin_token: Optional[str] = Header(None)):
+    if settings.ADMIN_TOKEN and x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    # Load in the background; the current model keeps serving until the swap
+    background_tasks.add_task(recommendation_service.reload)
+    return {"status": "Reload started", "model_version": recommendation_service.version}
 
 @router.get("/{user_id}")
-def get_recommendations(user_id: str):
-    # Retrieve top 20 recommendations
-    recs = recommendation_service.get_recommendations(user_id, top_k=20)
-    
-    # If no recs (cold start or error), return empty list with info
-    if not recs:
-         return {"recommendations": [], "info": "No recommendations available"}
-         
-    return {"recommendations": recs}
+async def get_recommendations(user_id: str):
+    # Retrieve top 20 recommendations as a pre-assembled JSON body
+    # (empty list with info on cold start without catalog or error)
+    if settings.RECOMMEND_COALESCE:
+        body = await recommendation_coalescer.submit(user_id, top_k=20)
+    else:
+        bodies = await run_in_threadpool(recommendation_service.render_recommendations_batch, [user_id], 20)
+        body = bodies[user_id]
+
+    return Response(content=body, media_type="application/json")
@@ -9,7 +9,12 @@ class Settings(BaseSettings):
     
     # Database
     FIREBASE_CREDENTIALS_PATH: str = os.path.join("backend", "serviceAccountKey.json")
-    
+    # "firestore" = Cloud Firestore, "local" = in-memory stand-in (offline development / benchmarks)
+    FIRESTORE_BACKEND: str = "firestore"
+    LOCAL_FIRESTORE_LATENCY_MS: float = 0.0 # Simulated round-trip time of the local stand-in
+    # Threads that run blocking Firestore calls for the async endpoints
+    FIRESTORE_MAX_WORKERS: int = 64
+
     # ML Models
     # Base dir is calculated relative to this file? 
     # Let's make paths relative to project root usually.
@@ -19,6 +24,45 @@ class Settings(BaseSettings):
     MODEL_PATH_HNN: str = os.path.join("recommendation_engine", "hnn_model.pth")
     MODEL_PATH_MF: str = os.path.join("recommendation_engine", "mf_model.pth")
     EMBEDDINGS_PATH: str = os.path.join("recommendation_engine", "final_embeddings.pt")
+    # "npy" = memory-mapped store next to EMBEDDINGS_PATH, "pt" = torch pickle, "auto" = newest of the two
+    EMBEDDINGS_FORMAT: str = "auto"
+
+    # Recommendation serving
+    RECOMMEND_MAX_BATCH_SIZE: int = 1000
+    # Micro-batching of concurrent single-user requests
+    RECOMMEND_COALESCE: bool = True
+    RECOMMEND_BATCH_WINDOW_MS: float = 2.0
+    RECOMMEND_BATCH_MAX_SIZE: int = 64
+
+    # Song retrieval index: "exact" (brute force) or "ivf" (approximate, persisted next to the embeddings)
+    ANN_INDEX: str = "exact"
+    ANN_NLIST: int = 0 # 0 = 4 * sqrt(num_songs)
+    ANN_NPROBE: int = 16
+    # Serve users from the precomputed top-K cache (final_embeddings.topk.npz) when it matches the embeddings
+    TOPK_CACHE_ENABLED: bool = True
+    # Seconds between checks of the embeddings file for a new training run (0 = only reload via the admin endpoint)
+    EMBEDDINGS_WATCH_INTERVAL: float = 0.0
+
+    # Catalog snapshot: "firestore" bulk export, "dataset" (dataset.json) or "auto" (Firestore, falling back to dataset.json)
+    CATALOG_SOURCE: str = "auto"
+    CATALOG_REFRESH_SECONDS: float = 300.0
+    CATALOG_POOL_SIZE: int = 300 # Tracks the trending / new-release picks are sampled from
+
+    # Interaction ingestion: events are queued, spilled to a write-ahead log and flushed as Firestore batches
+    INGEST_BATCH_SIZE: int = 500 # Events per batch commit (Firestore caps batches at 500 writes)
+    INGEST_FLUSH_INTERVAL: float = 1.0 # Seconds; a full batch flushes immediately
+    INGEST_QUEUE_MAX: int = 50000 # Events queued or awaiting commit before new ones are dropped
+    INGEST_WAL_DIR: str = os.path.join("backend", "wal")
+    INGEST_WAL_FSYNC: bool = False # fsync every WAL group commit (survives power loss, not just a process crash)
+    # Seconds between WAL group commits by the flusher thread; events accepted within this window are lost on a crash
+    INGEST_WAL_COMMIT_INTERVAL: float = 0.05
+
+    # Per-user library documents cached in the API process (write-through from the like / playlist endpoints)
+    LIBRARY_CACHE_SIZE: int = 10000 # Users kept (LRU); 0 disables the cache
+    LIBRARY_CACHE_TTL: float = 60.0 # Seconds; bounds staleness from writes made by other processes
+
+    # Admin endpoints (e.g. model reload) require this in the X-Admin-Token header when set
+    ADMIN_TOKEN: str = ""
 
     @property
     def ABS_EMBEDDINGS_PATH(self) -> str:
@@ -31,6 +75,11 @@ class Settings(BaseSettings):
         base = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         return os.path.join(base, self.FIREBASE_CREDENTIALS_PATH)
 
+    @property
+    def ABS_INGEST_WAL_DIR(self) -> str:
+        base = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return os.path.join(base, self.INGEST_WAL_DIR)
+
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Tuple
+
+FIRESTORE_BATCH_LIMIT = 500 # Max writes per Firestore batch commit
+
+def content_hash(data: Dict) -> str:
+    """Stable digest of a document's content (key order does not matter)."""
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+class BulkLoader:
+    """
+    Parallel, resumable bulk writer for one Firestore collection.
+
+    Documents are grouped into batch commits of `batch_size` writes, and up
+    to `workers` commits run concurrently on a thread pool. The client is
+    blocking, and each commit waits out one round-trip with the GIL
+    released. At most 2 * workers batches are in flight.
+
+    Rows sharing a doc id are collapsed before hashing and batching, the last
+    one winning as with a sequential loop: two writes for one id in
+    concurrent batches would land in either order, and the checkpoint would
+    never settle on one hash. This keeps one reference per distinct id in
+    memory while the input is read.
+
+    A failed commit is retried with exponential backoff and jitter. A batch
+    that still fails after `max_retries` is counted and skipped; its
+    documents are not checkpointed, so the next run writes them again.
+
+    Checkpoint: every committed batch appends one line of [doc_id, content
+    hash] pairs to `checkpoint_path` (JSON lines, flushed, torn last line
+    ignored). A rerun skips documents whose id and hash are already in it,
+    so an interrupted seed resumes where it stopped and a re-seed only
+    writes changed documents. After a run without failures the log is
+    rewritten as one snapshot line.
+    """
+
+    def __init__(self, db, collection: str, checkpoint_path: Optional[str] = None, batch_size: int = 400,
+                 workers: int = 8, max_retries: int = 5, backoff: float = 0.5):
+        self.db = db
+        self.collection = collection
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = max(1, min(batch_size, FIRESTORE_BATCH_LIMIT))
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self._committed: Dict[str, str] = self._read_checkpoint()
+        self._checkpoint_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._checkpoint_file = None
+
+        # Stats
+        self.seen = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed_batches = 0
+        self.failed_docs = 0
+
+    # --- Checkpoint ---
+
+    def _read_checkpoint(self) -> Dict[str, str]:
+        committed = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        committed.update(json.loads(line))
+                    except ValueError:
+                        break # Torn last line from a crash mid-append
+        return committed
+
+    def _record(self, pairs: List[Tuple[str, str]]):
+        if not self.checkpoint_path:
+            return
+        with self._checkpoint_lock:
+            if self._checkpoint_file is None:
+                self._checkpoint_file = open(self.checkpoint_path, 'a', encoding='utf-8')
+            self._checkpoint_file.write(json.dumps(dict(pairs), separators=(",", ":")) + "\n")
+            self._checkpoint_file.flush()
+            self._committed.update(pairs)
+
+    def _compact_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        with self._checkpoint_lock:
+            if self._checkpoint_file is not None:
+                self._checkpoint_file.close()
+                self._checkpoint_file = None
+            tmp = self.checkpoint_path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(self._committed, separators=(",", ":")) + "\n")
+            os.replace(tmp, self.checkpoint_path)
+
+    # --- Writing ---
+
+    def _commit(self, docs: List[Tuple[str, Dict, str]]):
+        collection = self.db.collection(self.collection)
+        for attempt in range(self.max_retries + 1):
+            batch = self.db.batch()
+            for doc_id, data, _ in docs:
+                batch.set(collection.document(doc_id), data)
+            try:
+                batch.commit()
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"Batch of {len(docs)} documents failed after {attempt + 1} attempts: {e}")
+                    return False
+                with self._stats_lock:
+                    self.retries += 1
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+        self._record([(doc_id, digest) for doc_id, _, digest in docs])
+        return True
+
+    def load(self, documents: Iterable[Tuple[str, Dict]], progress_every: int = 10000) -> Dict:
+        """Writes (doc_id, data) pairs; returns the run's stats."""
+        start = time.perf_counter()
+        pending = {}
+        next_report = progress_every
+
+        def collect(done):
+            for future in done:
+                docs = pending.pop(future)
+                if future.result():
+                    self.written += len(docs)
+                    self.batches += 1
+                else:
+                    self.failed_batches += 1
+                    self.failed_docs += len(docs)
+
+        latest: Dict[str, Dict] = {} # First position, last content
+        for doc_id, data in documents:
+            self.seen += 1
+            latest[str(doc_id)] = data
+        self.duplicates = self.seen - len(latest)
+        if self.duplicates:
+            print(f"{self.duplicates} rows repeat an earlier doc id; keeping the last of each.")
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-load") as pool:
+            batch: List[Tuple[str, Dict, str]] = []
+            for doc_id, data in latest.items():
+                digest = content_hash(data)
+                if self._committed.get(doc_id) == digest:
+                    self.skipped += 1
+                    continue
+                batch.append((doc_id, data, digest))
+                if len(batch) < self.batch_size:
+                    continue
+
+                if len(pending) >= 2 * self.workers: # Bound the buffered batches
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[pool.submit(self._commit, batch)] = batch
+                batch = []
+                if progress_every and self.written >= next_report:
+                    print(f"Written {self.written} documents ({self.skipped} unchanged skipped)...")
+                    next_report += progress_every
+
+            if batch:
+                pending[pool.submit(self._commit, batch)] = batch
+            collect(wait(pending)[0])
+
+        if self.failed_batches:
+            with self._checkpoint_lock:
+                if self._checkpoint_file is not None:
+                    self._checkpoint_file.close()
+                    self._checkpoint_file = None
+        else:
+            self._compact_checkpoint()
+        return self.stats(time.perf_counter() - start)
+
+    def stats(self, elapsed: float = 0.0) -> Dict:
+        return {
+            "documents": self.seen,
+            "duplicate_ids": self.duplicates,
+            "written": self.written,
+            "skipped_unchanged": self.skipped,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed_batches": self.failed_batches,
+            "failed_documents": self.failed_docs,
+            "seconds": round(elapsed, 3),
+            "docs_per_second": round(self.written / elapsed, 1) if elapsed else 0.0,
+        }
+
+def checkpoint_path_for(base_dir: str, collection: str, project: str = "default") -> str:
+    """Checkpoint file per target project and collection, e.g. backend/.seed_tracks.my-project.jsonl."""
+    return os.path.join(base_dir, f".seed_{collection}.{project}.jsonl")
@@ -1,10 +1,16 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+import asyncio
+import functools
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from backend.core.config import get_settings
 
 settings = get_settings()
 _db_client = None
+_db_executor = None
+_executor_lock = threading.Lock()
 
 def get_db():
     global _db_client
@@ -14,7 +20,13 @@ def get_db():
 
 def init_db():
     global _db_client
-    
+
+    if settings.FIRESTORE_BACKEND == "local":
+        from backend.db.local_store import LocalFirestore
+        _db_client = LocalFirestore(latency_ms=settings.LOCAL_FIRESTORE_LATENCY_MS)
+        print(f"Using local in-memory Firestore stand-in ({settings.LOCAL_FIRESTORE_LATENCY_MS} ms latency)")
+        return
+
     # Check if already initialized to avoid error
     if firebase_admin._apps:
         _db_client = firestore.client()
@@ -34,7 +46,7 @@ def init_db():
             print(f"Error initializing from env var: {e}")
 
     cred_path = settings.ABS_CREDENTIALS_PATH
-    
+
     if os.path.exists(cred_path):
         try:
             cred = credentials.Certificate(cred_path)
@@ -47,3 +59,28 @@ def init_db():
     else:
         print(f"WARNING: Service account key not found at {cred_path}")
         _db_client = None
+
+# --- Async access ---
+# The Firestore client is blocking (one gRPC round-trip per call). Async
+# endpoints hand those calls to a dedicated, bounded pool instead of the
+# shared request threadpool; all workers reuse the one cached client and
+# therefore its gRPC channel.
+
+def get_db_executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        with _executor_lock:
+            if _db_executor is None:
+                _db_executor = ThreadPoolExecutor(max_workers=settings.FIRESTORE_MAX_WORKERS, thread_name_prefix="firestore")
+    return _db_executor
+
+async def run_db(fn, *args, **kwargs):
+    """Awaits a blocking Firestore call on the database executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(fn, *args, **kwargs))
+
+async def get_db_async():
+    """Like get_db(), but a first-time client initialization does not block the event loop."""
+    if _db_client is not None:
+        return _db_client
+    return await run_db(get_db)
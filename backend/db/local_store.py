@@ -0,0 +1,254 @@
+import copy
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# In-memory stand-in for the subset of the Firestore client API this backend uses
+# (collections/sub-collections, get/set/update/add/delete, where/order_by/limit
+# queries, batched writes, ArrayUnion/ArrayRemove/SERVER_TIMESTAMP transforms).
+# As in Firestore, a range filter only matches values of the filter's type.
+#
+# Every simulated round-trip sleeps `latency_ms`, which releases the GIL just like
+# a blocking gRPC call, so concurrency/throughput of the API can be benchmarked
+# offline. Enable it for the API with FIRESTORE_BACKEND=local. `failure_rate`
+# makes that fraction of round-trips raise Unavailable (before any write is
+# applied), to exercise retry paths.
+
+class NotFound(Exception):
+    pass
+
+class Unavailable(Exception):
+    pass
+
+def _transform(current: Any, value: Any) -> Any:
+    # firestore.ArrayUnion / ArrayRemove sentinels expose the operands as `.values`
+    kind = type(value).__name__
+    if kind == "ArrayUnion":
+        result = list(current or [])
+        result.extend(v for v in value.values if v not in result)
+        return result
+    if kind == "ArrayRemove":
+        return [v for v in (current or []) if v not in value.values]
+    if kind == "Sentinel" and "server timestamp" in repr(value):
+        return datetime.now(timezone.utc)
+    return copy.deepcopy(value)
+
+class DocumentSnapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict], reference: "DocumentReference"):
+        self.id = doc_id
+        self._data = data
+        self.reference = reference
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+class DocumentReference:
+    def __init__(self, store: "LocalFirestore", path: tuple):
+        self._store = store
+        self._path = path
+
+    @property
+    def id(self) -> str:
+        return self._path[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._path)
+
+    def collection(self, name: str) -> "CollectionReference":
+        return CollectionReference(self._store, self._path + (name,))
+
+    def get(self) -> DocumentSnapshot:
+        self._store._round_trip()
+        return DocumentSnapshot(self.id, self._store._read(self._path), self)
+
+    def set(self, data: Dict, merge: bool = False):
+        self._store._round_trip()
+        self._store._write(self._path, data, merge=merge)
+
+    def update(self, data: Dict):
+        self._store._round_trip()
+        self._store._update(self._path, data)
+
+    def delete(self):
+        self._store._round_trip()
+        self._store._delete(self._path)
+
+class Query:
+    def __init__(self, store: "LocalFirestore", path: tuple, filters=(), orders=(), limit_to=None):
+        self._store = store
+        self._path = path
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit_to
+
+    def _copy(self, **changes) -> "Query":
+        q = Query(self._store, self._path, self._filters, self._orders, self._limit)
+        for key, value in changes.items():
+            setattr(q, key, value)
+        return q
+
+    def where(self, field: str, op: str, value: Any) -> "Query":
+        return self._copy(_filters=self._filters + [(field, op, value)])
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "Query":
+        return self._copy(_orders=self._orders + [(field, direction)])
+
+    def limit(self, count: int) -> "Query":
+        return self._copy(_limit=count)
+
+    def stream(self):
+        self._store._round_trip()
+        docs = self._store._list(self._path)
+        for field, op, value in self._filters:
+            docs = [(i, d) for i, d in docs if field in d and _matches(op, d[field], value)]
+        for field, direction in reversed(self._orders):
+            docs = [(i, d) for i, d in docs if field in d]
+            docs.sort(key=lambda item: item[1][field], reverse=(direction == "DESCENDING"))
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        for doc_id, data in docs:
+            yield DocumentSnapshot(doc_id, copy.deepcopy(data), DocumentReference(self._store, self._path + (doc_id,)))
+
+    def get(self) -> List[DocumentSnapshot]:
+        return list(self.stream())
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    "in": lambda a, b: a in b,
+    "array_contains": lambda a, b: b in (a or []),
+}
+
+def _matches(op: str, current: Any, value: Any) -> bool:
+    try:
+        return _OPS[op](current, value)
+    except TypeError:
+        return False # e.g. a timestamp field against a number filter
+
+class CollectionReference(Query):
+    def __init__(self, store: "LocalFirestore", path: tuple):
+        super().__init__(store, path)
+
+    @property
+    def id(self) -> str:
+        return self._path[-1]
+
+    def document(self, doc_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._store, self._path + (doc_id or uuid.uuid4().hex[:20],))
+
+    def add(self, data: Dict):
+        ref = self.document()
+        ref.set(data)
+        return time.time(), ref
+
+class WriteBatch:
+    """Buffers writes and applies them atomically in one simulated round-trip."""
+    MAX_WRITES = 500
+
+    def __init__(self, store: "LocalFirestore"):
+        self._store = store
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, ref: DocumentReference, data: Dict, merge: bool = False):
+        self._writes.append(("set", ref._path, data, merge))
+
+    def update(self, ref: DocumentReference, data: Dict):
+        self._writes.append(("update", ref._path, data, False))
+
+    def delete(self, ref: DocumentReference):
+        self._writes.append(("delete", ref._path, None, False))
+
+    def commit(self):
+        if len(self._writes) > self.MAX_WRITES:
+            raise ValueError(f"Batch exceeds {self.MAX_WRITES} writes")
+        self._store._round_trip()
+        with self._store._lock:
+            for op, path, data, merge in self._writes:
+                if op == "set":
+                    self._store._write(path, data, merge=merge)
+                elif op == "update":
+                    self._store._update(path, data)
+                else:
+                    self._store._delete(path)
+        self._store.batch_commits += 1
+        writes, self._writes = self._writes, []
+        return writes
+
+class LocalFirestore:
+    def __init__(self, latency_ms: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency_ms / 1000.0
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._docs: Dict[tuple, Dict[str, Dict]] = {} # collection path -> {doc_id: data}
+        self._lock = threading.RLock()
+        self.round_trips = 0
+        self.batch_commits = 0
+        self.failures = 0
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+            failed = self.failure_rate and self._rng.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            raise Unavailable("Simulated transient failure")
+
+    # --- Storage primitives (re-entrant lock, so a batch commit applies atomically) ---
+
+    def _read(self, path: tuple) -> Optional[Dict]:
+        with self._lock:
+            data = self._docs.get(path[:-1], {}).get(path[-1])
+            return copy.deepcopy(data) if data is not None else None
+
+    def _write(self, path: tuple, data: Dict, merge: bool = False):
+        with self._lock:
+            collection = self._docs.setdefault(path[:-1], {})
+            current = collection.get(path[-1]) if merge else None
+            new = dict(current or {})
+            for key, value in data.items():
+                new[key] = _transform(new.get(key), value)
+            collection[path[-1]] = new
+
+    def _update(self, path: tuple, data: Dict):
+        with self._lock:
+            collection = self._docs.get(path[:-1], {})
+            if path[-1] not in collection:
+                raise NotFound(f"No document to update: {'/'.join(path)}")
+            self._write(path, data, merge=True)
+
+    def _delete(self, path: tuple):
+        with self._lock:
+            self._docs.get(path[:-1], {}).pop(path[-1], None)
+
+    def _list(self, path: tuple):
+        with self._lock:
+            return sorted(self._docs.get(path, {}).items())
+
+    # --- Client API ---
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, (name,))
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
@@ -1,34 +1,160 @@
 import json
 import os
+import threading
+
+try:
+    import fcntl # POSIX only; without it allocation is only safe within one process
+except ImportError:
+    fcntl = None
 
 MAPPING_FILE = os.path.join(os.path.dirname(__file__), "user_mapping.json")
+LOG_FILE = os.path.join(os.path.dirname(__file__), "user_mapping.log")
+
+class UserIdMapper:
+    """
+    Firebase uid <-> dense user index.
+
+    The mapping lives in memory and is persisted as an append-only log with
+    one JSON line [idx, uid] per user, so a lookup is a dict access and a
+    new user is one appended line instead of a rewrite of the whole file.
+
+    Allocation holds the in-process lock and an exclusive flock on the log,
+    and first reads lines other processes appended since the last read, so
+    API workers and the sync job never hand out the same index twice.
+    The legacy user_mapping.json is imported into the log on first use.
+    """
+
+    def __init__(self, log_path=LOG_FILE, legacy_path=MAPPING_FILE):
+        self.log_path = log_path
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+        self._uid_to_idx = {}
+        self._idx_to_uid = {}
+        self._next_idx = 0
+        self._offset = 0 # Bytes of the log already applied
+        self._loaded = False
+
+    # --- Log handling ---
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if not os.path.exists(self.log_path):
+                self._import_legacy()
+            self._catch_up()
+            self._loaded = True
+
+    def _import_legacy(self):
+        lines = []
+        if os.path.exists(self.legacy_path):
+            with open(self.legacy_path, "r") as f:
+                legacy = json.load(f)
+            for uid, idx in sorted(legacy.get("uid_to_idx", {}).items(), key=lambda item: item[1]):
+                lines.append(json.dumps([idx, uid]) + "\n")
+        tmp = f"{self.log_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp, self.log_path) # Atomic create-if-absent: another process may have imported first
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+
+    def _catch_up(self, f=None):
+        """Applies log lines appended since the last read (by this or another process)."""
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == self._offset:
+            return
+        own = f is None
+        f = f or open(self.log_path, "rb")
+        try:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break # Torn line from a crashed writer; cut off by the next allocation
+                idx, uid = json.loads(line)
+                self._uid_to_idx[uid] = idx
+                self._idx_to_uid[str(idx)] = uid
+                self._next_idx = max(self._next_idx, idx + 1)
+                self._offset += len(line)
+        finally:
+            if own:
+                f.close()
+
+    def _allocate(self, uid):
+        with open(self.log_path, "a+b") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._catch_up(f)
+                if uid in self._uid_to_idx:
+                    return self._uid_to_idx[uid]
+                f.truncate(self._offset) # Drop a torn tail before appending
+                idx = self._next_idx
+                f.seek(0, os.SEEK_END)
+                line = (json.dumps([idx, uid]) + "\n").encode()
+                f.write(line)
+                f.flush()
+                self._offset += len(line)
+                self._uid_to_idx[uid] = idx
+                self._idx_to_uid[str(idx)] = uid
+                self._next_idx = idx + 1
+                return idx
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --- API ---
+
+    def get_user_idx(self, uid, create=True):
+        self._ensure_loaded()
+        idx = self._uid_to_idx.get(uid)
+        if idx is not None:
+            return idx
+
+        with self._lock:
+            self._catch_up() # Possibly allocated by another process
+            idx = self._uid_to_idx.get(uid)
+            if idx is not None or not create:
+                return idx
+            # TODO: Check if this idx exceeds model capacity?
+            # For now, we assume we can resize or reserved space.
+            return self._allocate(uid)
+
+    def get_user_indices(self, uids):
+        """Looks up several uids under one lock; unknown ones map to None (nothing is allocated)."""
+        self._ensure_loaded()
+        with self._lock:
+            self._catch_up()
+            return {uid: self._uid_to_idx.get(uid) for uid in uids}
+
+    def mapping(self):
+        """Snapshot in the legacy layout, copied under the lock."""
+        self._ensure_loaded()
+        with self._lock:
+            self._catch_up()
+            return {"uid_to_idx": dict(self._uid_to_idx), "idx_to_uid": dict(self._idx_to_uid), "next_idx": self._next_idx}
+
+_mapper = UserIdMapper()
 
 def load_mapping():
-    if os.path.exists(MAPPING_FILE):
-        with open(MAPPING_FILE, "r") as f:
-            return json.load(f)
-    return {"uid_to_idx": {}, "idx_to_uid": {}, "next_idx": 0}
+    return _mapper.mapping()
 
-def save_mapping(mapping):
-    with open(MAPPING_FILE, "w") as f:
+def save_mapping(mapping=None):
+    """Exports a JSON snapshot in the legacy user_mapping.json format (the log stays authoritative)."""
+    mapping = mapping or load_mapping()
+    tmp = MAPPING_FILE + ".tmp"
+    with open(tmp, "w") as f:
         json.dump(mapping, f, indent=2)
+    os.replace(tmp, MAPPING_FILE)
 
 def get_user_idx(uid, create=True):
-    mapping = load_mapping()
-    uid_to_idx = mapping["uid_to_idx"]
-
-    if uid in uid_to_idx:
-        return uid_to_idx[uid]
-    
-    if create:
-        idx = mapping["next_idx"]
-        # TODO: Check if this idx exceeds model capacity?
-        # For now, we assume we can resize or reserved space.
-        # But if we started model with NUM_USERS from dataset, we simply append.
-        mapping["uid_to_idx"][uid] = idx
-        mapping["idx_to_uid"][str(idx)] = uid
-        mapping["next_idx"] += 1
-        save_mapping(mapping)
-        return idx
-    
-    return None
+    return _mapper.get_user_idx(uid, create=create)
+
+def get_user_indices(uids):
+    return _mapper.get_user_indices(uids)
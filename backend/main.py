@@ -9,6 +9,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from backend.core.config import get_settings
 from backend.db.firestore import init_db
 from backend.api.v1.router import api_router
+from backend.services.recommendation import recommendation_service
+from backend.services.catalog import catalog_service
+from backend.services.ingestion import interaction_buffer
 
 settings = get_settings()
 
@@ -27,6 +30,13 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    catalog_service.refresh_async() # Warm the in-memory catalog without delaying startup
+    recommendation_service.start_watcher(settings.EMBEDDINGS_WATCH_INTERVAL)
+    interaction_buffer.start() # Replays events left in the write-ahead log by a previous run
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    interaction_buffer.stop() # Flush queued interactions before exiting
 
 # Include API Router
 app.include_router(api_router, prefix=settings.API_V1_STR)
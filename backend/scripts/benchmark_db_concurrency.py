@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Setup paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(BASE_DIR))
+
+# Runs against the in-memory Firestore stand-in; must be set before the settings are read
+os.environ.setdefault("FIRESTORE_BACKEND", "local")
+
+import httpx
+from fastapi import Body, FastAPI, HTTPException
+
+from backend.api.v1.endpoints import library
+from backend.core.config import get_settings
+from backend.db import firestore as db_module
+from backend.db.local_store import LocalFirestore
+from backend.services.library_cache import library_cache
+
+# Measures request throughput of the library endpoints under concurrent load,
+# comparing the async data-access layer against the previous blocking `def`
+# endpoints (reproduced below), with a simulated Firestore round-trip time.
+# The async endpoints run once without and once with the per-user library cache.
+
+def build_sync_app() -> FastAPI:
+    """The library endpoints as they were before the async layer: blocking calls in `def` handlers."""
+    app = FastAPI()
+
+    @app.get("/library/{user_id}")
+    def get_user_library(user_id: str):
+        db = db_module.get_db()
+        if not db:
+            raise HTTPException(status_code=503, detail="Database not available")
+        return library._load_library(db, user_id)
+
+    @app.post("/library/like")
+    def toggle_like(payload: dict = Body(...)):
+        db = db_module.get_db()
+        from firebase_admin import firestore
+        db.collection('users').document(payload['user_id']).update({
+            'liked_songs': firestore.ArrayUnion([payload['song_id']])
+        })
+        return {"status": "success"}
+
+    return app
+
+def build_async_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(library.router, prefix="/library")
+    return app
+
+async def drive(app: FastAPI, requests: int, concurrency: int, num_users: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            uid = f"user_{i % num_users}"
+            async with sem:
+                if i % 4 == 3:
+                    r = await client.post("/library/like", json={"user_id": uid, "song_id": f"s{i}", "action": "add"})
+                else:
+                    r = await client.get(f"/library/{uid}")
+                r.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"Firestore stand-in latency {args.latency_ms} ms | "
+          f"{get_settings().FIRESTORE_MAX_WORKERS} database workers | {args.requests} requests per run")
+    print(f"{'concurrency':>12}{'sync req/s':>14}{'async req/s':>14}{'speedup':>10}{'+cache req/s':>14}{'speedup':>10}")
+
+    cache_size = library_cache.max_entries or 10000
+    for concurrency in args.concurrency:
+        results = []
+        for build, cached in ((build_sync_app, False), (build_async_app, False), (build_async_app, True)):
+            library_cache.clear()
+            library_cache.max_entries = cache_size if cached else 0
+            db = LocalFirestore(latency_ms=args.latency_ms)
+            for u in range(args.users):
+                db.collection('users').document(f"user_{u}").set({'liked_songs': [], 'playlists': []})
+            db_module._db_client = db
+            elapsed = asyncio.run(drive(build(), args.requests, concurrency, args.users))
+            results.append(args.requests / elapsed)
+        print(f"{concurrency:>12}{results[0]:>14.0f}{results[1]:>14.0f}{results[1] / results[0]:>9.2f}x"
+              f"{results[2]:>14.0f}{results[2] / results[0]:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Setup paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(BASE_DIR))
+
+from backend.services.search_index import SearchIndex, tokenize
+from recommendation_engine.catalog_store import catalog_exists, load_catalog
+
+DATASET_PATH = os.path.join(BASE_DIR, "dataset.json")
+
+# Builds synthetic catalogs of the requested sizes from the real dataset's
+# vocabulary (plus random invented words so the vocabulary keeps growing with
+# the catalog) and reports build time and query latency percentiles for
+# exact, prefix, substring, typo and multi-word queries.
+
+def make_vocabulary(rng):
+    words = set()
+    if catalog_exists(DATASET_PATH):
+        for track in load_catalog(DATASET_PATH):
+            for field in ('title', 'artist', 'album'):
+                words.update(tokenize(str(track.get(field) or '')))
+    syllables = ["ka", "ri", "lo", "ve", "na", "mi", "sho", "ta", "ra", "en", "de", "su", "yo", "be", "la"]
+    for _ in range(20000):
+        words.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def make_catalog(size, vocab, rng):
+    tracks = []
+    artists = [' '.join(rng.choice(vocab).title() for _ in range(2)) for _ in range(max(size // 20, 10))]
+    for i in range(size):
+        artist = rng.choice(artists)
+        tracks.append({
+            'id': f"t{i}",
+            'title': ' '.join(rng.choice(vocab).title() for _ in range(rng.randint(1, 4))),
+            'artist': artist,
+            'album': ' '.join(rng.choice(vocab).title() for _ in range(rng.randint(1, 3))),
+        })
+    return tracks
+
+def typo(word, rng):
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + rng.choice("aeiourst") + word[i + 1:]
+
+def make_queries(tracks, rng, count):
+    queries = {"exact": [], "prefix": [], "substring": [], "typo": [], "multi-word": []}
+    for _ in range(count):
+        track = rng.choice(tracks)
+        words = tokenize(track['title']) or ['love']
+        word = rng.choice(words)
+        queries["exact"].append(word)
+        queries["prefix"].append(word[:max(2, len(word) // 2)])
+        queries["substring"].append(word[1:] if len(word) > 4 else word)
+        queries["typo"].append(typo(word, rng))
+        queries["multi-word"].append(' '.join(words[:2] + tokenize(track['artist'])[:1]))
+    return queries
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+def run(size, vocab, rng, num_queries):
+    tracks = make_catalog(size, vocab, rng)
+
+    start = time.perf_counter()
+    index = SearchIndex(tracks)
+    build_s = time.perf_counter() - start
+    print(f"\n=== {size:,} tracks | vocab {len(index.vocab):,} terms | build {build_s:.2f}s ===")
+    print(f"{'query type':<12}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'hit rate':>10}")
+
+    for kind, queries in make_queries(tracks, rng, num_queries).items():
+        latencies, hits = [], 0
+        for q in queries:
+            t = time.perf_counter()
+            results = index.search(q, 20)
+            latencies.append((time.perf_counter() - t) * 1000)
+            hits += bool(results)
+        print(f"{kind:<12}{percentile(latencies, 50):>10.3f}{percentile(latencies, 99):>10.3f}"
+              f"{sum(latencies) / len(latencies):>10.3f}{hits / len(queries):>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = make_vocabulary(rng)
+    for size in args.sizes:
+        run(size, vocab, rng, args.queries)
+
+if __name__ == "__main__":
+    main()
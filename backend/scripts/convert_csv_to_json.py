@@ -1,69 +1,96 @@
+import argparse
 import csv
-import json
 import os
 import hashlib
+import sys
+import time
+from operator import itemgetter
 
 # Determine paths relative to this script
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CSV_PATH = os.path.join(os.path.dirname(BASE_DIR), "songs.csv") # Assuming songs.csv is in root
 JSON_OUTPUT_PATH = os.path.join(BASE_DIR, "dataset.json")
 
+sys.path.append(os.path.dirname(BASE_DIR))
+from recommendation_engine.catalog_store import CatalogWriter, catalog_paths
+
+# Streams songs.csv row by row into the catalog artifacts (dataset.jsonl and
+# dataset.columns.npz, see recommendation_engine/catalog_store.py). Only the
+# set of ids seen so far is kept for deduplication; no track dicts are held.
+# --json also writes the legacy dataset.json (compact, one track per line).
+
 def generate_id(title, artist):
     """Generates a consistent ID based on title and artist."""
     raw = f"{title}-{artist}".encode('utf-8')
     return hashlib.md5(raw).hexdigest()[:8]
 
-def convert_csv_to_json():
-    if not os.path.exists(CSV_PATH):
-        print(f"Error: CSV file not found at {CSV_PATH}")
+def _number(value):
+    return int(float(value or 0)) # Handle strings like "211.0"
+
+def convert_csv_to_json(csv_path=CSV_PATH, output_path=JSON_OUTPUT_PATH, write_json=False):
+    if not os.path.exists(csv_path):
+        print(f"Error: CSV file not found at {csv_path}")
         return
 
-    print(f"Reading from: {CSV_PATH}")
-    
-    unique_tracks = {}
-    
-    with open(CSV_PATH, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        
+    print(f"Reading from: {csv_path}")
+    start = time.perf_counter()
+    seen = set()
+    rows = 0
+
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f, CatalogWriter(output_path, write_json) as writer:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        # Columns absent from the header read the '' padding appended to every row
+        fields = ('id', 'title', 'artist', 'album', 'image', 'url', 'duration', 'year', 'genre')
+        pick = itemgetter(*(header.index(name) if name in header else -1 for name in fields))
+        width = len(header)
+
         for row in reader:
+            rows += 1
+            if len(row) < width:
+                row += [''] * (width - len(row))
+            row.append('')
+            track_id, title, artist, album, image, url, duration, year, genre = (v.strip() for v in pick(row))
+
             # Basic cleaning
-            title = row.get('title', '').strip()
-            artist = row.get('artist', '').strip()
-            
             if not title or not artist:
                 continue
-                
+
             # Handle ID: use existing if valid, else generate
-            track_id = row.get('id', '').strip()
-            if not track_id or track_id == '#NAME?' or track_id in unique_tracks:
+            if not track_id or track_id == '#NAME?' or track_id in seen:
                 track_id = generate_id(title, artist)
-            
+
+            # Deduplicate by ID (which is robust due to fallback generation)
+            if track_id in seen:
+                continue
+            seen.add(track_id)
+
             # Map fields
-            new_track = {
+            writer.append({
                 "id": track_id,
                 "title": title,
                 "artist": artist,
-                "album": row.get('album', '').strip(),
-                "coverUrl": row.get('image', '').strip(),
-                "audioUrl": row.get('url', '').strip(),
-                "duration": int(float(row.get('duration', 0) or 0)), # Handle strings like "211.0"
-                "year": int(float(row.get('year', 0) or 0)),
-                "genre": row.get('genre', '').strip(),
+                "album": album,
+                "coverUrl": image,
+                "audioUrl": url,
+                "duration": _number(duration),
+                "year": _number(year),
+                "genre": genre,
                 "lyrics": [] # Default empty
-            }
-            
-            # Deduplicate by ID (which is robust due to fallback generation)
-            if track_id not in unique_tracks:
-                unique_tracks[track_id] = new_track
-    
-    tracks_list = list(unique_tracks.values())
-    
-    print(f"Processed {len(tracks_list)} unique tracks.")
-    
-    with open(JSON_OUTPUT_PATH, 'w', encoding='utf-8') as f:
-        json.dump(tracks_list, f, indent=2)
-        
-    print(f"Successfully wrote to: {JSON_OUTPUT_PATH}")
+            })
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {rows} rows into {writer.rows} unique tracks in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s).")
+    outputs = [catalog_paths(output_path)['jsonl'], catalog_paths(output_path)['columns']]
+    if write_json:
+        outputs.insert(0, output_path)
+    for path in outputs:
+        print(f"Successfully wrote to: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
 
 if __name__ == "__main__":
-    convert_csv_to_json()
+    parser = argparse.ArgumentParser(description="Builds the song catalog artifacts from songs.csv")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--output", default=JSON_OUTPUT_PATH, help="dataset.json path the artifacts are named after")
+    parser.add_argument("--json", action="store_true", help="Also write the legacy dataset.json")
+    args = parser.parse_args()
+    convert_csv_to_json(args.csv, args.output, write_json=args.json)
@@ -1,4 +1,4 @@
-import json
+import argparse
 import os
 import sys
 import firebase_admin
@@ -7,14 +7,17 @@ from firebase_admin import credentials, firestore
 # Setup paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
+sys.path.append(os.path.dirname(BASE_DIR))
+from recommendation_engine.catalog_store import catalog_exists, load_catalog
+from backend.db.bulk_loader import BulkLoader, checkpoint_path_for
 
 DATASET_PATH = os.path.join(BASE_DIR, "dataset.json")
 # Use the config value or hardcoded path relative to this script
 CREDENTIALS_PATH = os.path.join(BASE_DIR, "serviceAccountKey.json")
 
-def seed_database():
+def seed_database(workers=8, batch_size=490, force=False):
     print(f"Checking for dataset at: {DATASET_PATH}")
-    if not os.path.exists(DATASET_PATH):
+    if not catalog_exists(DATASET_PATH):
         print("Error: dataset.json not found!")
         return
 
@@ -24,42 +27,35 @@ def seed_database():
         return
 
     # Initialize Firebase
+    cred = credentials.Certificate(CREDENTIALS_PATH)
     if not firebase_admin._apps:
-        cred = credentials.Certificate(CREDENTIALS_PATH)
         firebase_admin.initialize_app(cred)
     
     db = firestore.client()
     
-    # Load JSON
-    with open(DATASET_PATH, 'r', encoding='utf-8') as f:
-        tracks = json.load(f)
-        
+    # Load catalog (dataset.json or its .jsonl / .columns.npz artifacts)
+    tracks = load_catalog(DATASET_PATH)
+
     print(f"Found {len(tracks)} tracks to seed.")
-    
-    # Batch write (limit 500 per batch)
-    batch = db.batch()
-    count = 0
-    total_batches = 0
-    
-    collection_ref = db.collection('tracks')
-    
-    for track in tracks:
-        doc_ref = collection_ref.document(track['id'])
-        batch.set(doc_ref, track)
-        count += 1
-        
-        if count >= 490: # Commit batch
-            batch.commit()
-            print(f"Committed batch {total_batches + 1}")
-            batch = db.batch()
-            count = 0
-            total_batches += 1
-            
-    if count > 0:
-        batch.commit()
-        print(f"Committed final batch {total_batches + 1}")
-        
-    print("Database seeding completed successfully!")
+
+    # Concurrent batch commits; tracks already committed with the same content
+    # (per the checkpoint of this project) are skipped, so a rerun resumes
+    checkpoint = checkpoint_path_for(BASE_DIR, 'tracks', cred.project_id)
+    if force and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    loader = BulkLoader(db, 'tracks', checkpoint, batch_size=batch_size, workers=workers)
+    stats = loader.load((track['id'], track) for track in tracks)
+    print(f"Seeding stats: {stats}")
+
+    if stats['failed_batches']:
+        print(f"{stats['failed_documents']} tracks failed to upload; rerun to resume.")
+    else:
+        print("Database seeding completed successfully!")
 
 if __name__ == "__main__":
-    seed_database()
+    parser = argparse.ArgumentParser(description="Seeds the tracks collection from the song catalog")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent batch commits")
+    parser.add_argument("--batch-size", type=int, default=490)
+    parser.add_argument("--force", action="store_true", help="Ignore the checkpoint and rewrite every track")
+    args = parser.parse_args()
+    seed_database(args.workers, args.batch_size, args.force)
@@ -1,5 +1,6 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+import argparse
 import csv
 import os
 import sys
@@ -9,29 +10,16 @@ BASE_DIR = os.path.dirname(os.path.dirname(__file__)) # sonicstream/
 CSV_PATH = os.path.join(BASE_DIR, 'songs.csv')
 CRED_PATH = os.path.join(os.path.dirname(__file__), "serviceAccountKey.json")
 
-def seed_database():
-    # Init Firebase
-    if not firebase_admin._apps:
-        if os.path.exists(CRED_PATH):
-            cred = credentials.Certificate(CRED_PATH)
-            firebase_admin.initialize_app(cred)
-        else:
-            print(f"Error: {CRED_PATH} not found.")
-            return
-
-    db = firestore.client()
-    
-    # Load CSV
-    if not os.path.exists(CSV_PATH):
-        print(f"Error: {CSV_PATH} not found.")
-        return
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.db.bulk_loader import BulkLoader, checkpoint_path_for
 
-    tracks = []
-    with open(CSV_PATH, 'r', encoding='utf-8') as f:
+def read_tracks(csv_path=CSV_PATH):
+    """Streams songs.csv rows mapped to the Firestore schema."""
+    with open(csv_path, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
             # Map CSV fields to Firestore Schema
-            track = {
+            yield {
                 "id": row['id'],
                 "title": row['title'],
                 "artist": row['artist'],
@@ -42,33 +30,43 @@ def seed_database():
                 "year": int(row['year']) if row['year'] else 0,
                 "lyrics": [] # Default empty
             }
-            tracks.append(track)
-        
-    print(f"Found {len(tracks)} tracks from songs.csv. Starting upload...")
-    
-    batch = db.batch()
-    count = 0
-    total = 0
+
+def seed_database(workers=8, batch_size=400, force=False):
+    # Init Firebase
+    if not os.path.exists(CRED_PATH):
+        print(f"Error: {CRED_PATH} not found.")
+        return
+    cred = credentials.Certificate(CRED_PATH)
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(cred)
+
+    db = firestore.client()
     
-    for track in tracks:
-        # Create a document reference
-        doc_ref = db.collection('tracks').document(str(track['id']))
-        batch.set(doc_ref, track)
-        
-        count += 1
-        total += 1
-        
-        # Commit batches of 400
-        if count >= 400:
-            batch.commit()
-            print(f"Uploaded {total} tracks...")
-            batch = db.batch()
-            count = 0
-            
-    if count > 0:
-        batch.commit()
-        
-    print(f"Success! Uploaded {total} tracks to Firestore.")
+    # Load CSV
+    if not os.path.exists(CSV_PATH):
+        print(f"Error: {CSV_PATH} not found.")
+        return
+
+    print("Streaming songs.csv to Firestore...")
+
+    # Concurrent batch commits, resumable: tracks already uploaded with the
+    # same content are skipped on a rerun (checkpoint per project)
+    checkpoint = checkpoint_path_for(os.path.dirname(os.path.abspath(__file__)), 'tracks', cred.project_id)
+    if force and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    loader = BulkLoader(db, 'tracks', checkpoint, batch_size=batch_size, workers=workers)
+    stats = loader.load((str(track['id']), track) for track in read_tracks())
+
+    if stats['failed_batches']:
+        print(f"Uploaded {stats['written']} tracks; {stats['failed_documents']} failed, rerun to resume. {stats}")
+    else:
+        print(f"Success! Uploaded {stats['written']} tracks to Firestore "
+              f"({stats['skipped_unchanged']} unchanged skipped, {stats['docs_per_second']} tracks/s).")
 
 if __name__ == "__main__":
-    seed_database()
+    parser = argparse.ArgumentParser(description="Uploads songs.csv to the tracks collection")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent batch commits")
+    parser.add_argument("--batch-size", type=int, default=400)
+    parser.add_argument("--force", action="store_true", help="Ignore the checkpoint and rewrite every track")
+    args = parser.parse_args()
+    seed_database(args.workers, args.batch_size, args.force)
@@ -1,90 +1,155 @@
-from typing import List, Dict
-from firebase_admin import firestore
-from backend.db.firestore import get_db
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import List, Dict, Optional, Sequence
+from backend.core.config import get_settings
+from backend.db.firestore import get_db, get_db_executor
+from backend.services.search_index import SearchIndex
+from recommendation_engine.catalog_store import catalog_exists, load_catalog
+
+settings = get_settings()
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class CatalogSnapshot:
+    """
+    Immutable in-memory copy of the 'tracks' collection with the orderings the
+    catalog endpoints need precomputed. Firestore stays the source of truth;
+    the snapshot is rebuilt from it (or from dataset.json) on refresh.
+    """
+    def __init__(self, tracks: List[Dict], source: str):
+        self.tracks = tracks
+        self.source = source
+        self.loaded_at = time.time()
+
+        # Newest first; stable so equal years keep catalog order
+        self.by_year_desc = sorted(range(len(tracks)), key=lambda i: _as_int(tracks[i].get('year')), reverse=True)
+
+        # Exact-match genre partitions (same semantics as the Firestore equality filter)
+        by_genre = defaultdict(list)
+        for i, track in enumerate(tracks):
+            genre = track.get('genre')
+            if genre:
+                by_genre[genre].append(i)
+        self.by_genre = dict(by_genre)
+
+        # Token / n-gram index over title, artist and album
+        self.search_index = SearchIndex(tracks)
+
+    def sample(self, pool: Sequence[int], limit: int) -> List[Dict]:
+        picked = random.sample(pool, min(limit, len(pool)))
+        return [self.tracks[i] for i in picked]
+
+def _as_int(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
 
 class CatalogService:
     def __init__(self):
-        pass
-        
-    def get_tracks_by_genre(self, genre: str, limit: int = 20) -> List[Dict]:
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._refresh_lock = threading.Lock()
+
+    # --- Snapshot management ---
+
+    def _load_from_firestore(self) -> Optional[List[Dict]]:
         db = get_db()
-        if not db or not genre:
-             return []
+        if not db:
+            return None
         try:
-            # Assumes 'genre' field exists and uses equality
-            # Case-insensitive if dataset is standardized, else exact match
-            # "Melody", "Mass", "Love", "Folk"
-            query = db.collection('tracks').where('genre', '==', genre).limit(limit)
-            docs = query.stream()
-            return [d.to_dict() for d in docs]
+            # One bulk read of the collection per refresh instead of one query per request
+            return [d.to_dict() for d in db.collection('tracks').stream()]
         except Exception as e:
-            print(f"Error fetching genre {genre}: {e}")
+            print(f"Error exporting tracks from Firestore: {e}")
+            return None
+
+    def _load_from_dataset(self) -> Optional[List[Dict]]:
+        dataset_path = os.path.join(BACKEND_DIR, "dataset.json")
+        if not catalog_exists(dataset_path):
+            dataset_path = os.path.join(os.path.dirname(BACKEND_DIR), "dataset.json")
+        if not catalog_exists(dataset_path):
+            return None
+        return load_catalog(dataset_path)
+
+    def refresh(self) -> bool:
+        """Rebuilds the snapshot from the configured source and swaps it in."""
+        source = settings.CATALOG_SOURCE
+        tracks = None
+        if source in ("auto", "firestore"):
+            tracks = self._load_from_firestore()
+            loaded_from = "firestore"
+        if tracks is None and source in ("auto", "dataset"):
+            tracks = self._load_from_dataset()
+            loaded_from = "dataset"
+        if tracks is None:
+            print("Catalog snapshot: no source available.")
+            return False
+
+        self._snapshot = CatalogSnapshot(tracks, loaded_from)
+        print(f"Catalog snapshot loaded {len(tracks)} tracks from {loaded_from}.")
+        return True
+
+    def refresh_async(self):
+        if not self._refresh_lock.acquire(blocking=False):
+            return # A refresh is already running
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refresh_lock.release()
+
+        # The bulk export is a long Firestore read; run it on the bounded database pool
+        get_db_executor().submit(run)
+
+    def _get_snapshot(self) -> Optional[CatalogSnapshot]:
+        """
+        Read-through: the first call loads synchronously; afterwards a stale
+        snapshot keeps being served while a background refresh replaces it.
+        """
+        snap = self._snapshot
+        if snap is None:
+            with self._refresh_lock:
+                if self._snapshot is None:
+                    self.refresh()
+            return self._snapshot
+
+        if time.time() - snap.loaded_at > settings.CATALOG_REFRESH_SECONDS:
+            self.refresh_async()
+        return snap
+
+    # --- Queries ---
+
+    def get_tracks_by_genre(self, genre: str, limit: int = 20) -> List[Dict]:
+        snap = self._get_snapshot()
+        if not snap or not genre:
             return []
+        # Exact match, as the dataset genres are standardized ("Melody", "Mass", "Love", "Folk")
+        return [snap.tracks[i] for i in snap.by_genre.get(genre, [])[:limit]]
 
     def get_trending_tracks(self, limit: int = 20) -> List[Dict]:
-        db = get_db()
-        if not db:
-            return []
-        try:
-            # Fetch a larger pool (300) and shuffle them to ensure variety
-            docs = list(db.collection('tracks').limit(300).stream())
-            results = [d.to_dict() for d in docs]
-            
-            import random
-            random.shuffle(results)
-            
-            return results[:limit]
-        except Exception as e:
-            print(f"Error fetching trending: {e}")
+        snap = self._get_snapshot()
+        if not snap:
             return []
+        # Random picks from a pool to ensure variety
+        return snap.sample(range(min(settings.CATALOG_POOL_SIZE, len(snap.tracks))), limit)
 
     def get_new_releases(self, limit: int = 20) -> List[Dict]:
-        db = get_db()
-        if not db:
+        snap = self._get_snapshot()
+        if not snap:
             return []
-        try:
-            # Sort by year descending and fetch a pool of 300
-            query = db.collection('tracks').order_by('year', direction=firestore.Query.DESCENDING).limit(300)
-            docs = list(query.stream())
-            results = [d.to_dict() for d in docs]
-            
-            import random
-            random.shuffle(results)
-            
-            return results[:limit]
-        except Exception as e:
-            print(f"Error fetching new releases (trying fallback): {e}")
-            # Fallback
-            docs = list(db.collection('tracks').limit(300).stream())
-            results = [d.to_dict() for d in docs]
-            
-            import random
-            random.shuffle(results)
-            
-            return results[:limit]
+        # Random picks from the newest tracks (year descending)
+        return snap.sample(snap.by_year_desc[:settings.CATALOG_POOL_SIZE], limit)
 
     def search_tracks(self, query: str, limit: int = 20) -> List[Dict]:
-        db = get_db()
-        if not db or not query:
-            return []
-            
-        try:
-            # Simple prefix search simulation 
-            # Note: Firestore inequalities ranges are sensitive to case
-            q_title = query.title() 
-            
-            docs = db.collection('tracks')\
-                     .where('title', '>=', q_title)\
-                     .where('title', '<=', q_title + '\uf8ff')\
-                     .limit(limit)\
-                     .stream()
-            
-            results = [d.to_dict() for d in docs]
-            
-            # Simple deduplication or fallback logic could go here
-            return results
-        except Exception as e:
-            print(f"Error searching tracks: {e}")
+        snap = self._get_snapshot()
+        if not snap or not query:
             return []
 
+        # Ranked full-text search with prefix, substring and typo matching
+        return [snap.tracks[i] for i in snap.search_index.search(query, limit)]
+
 catalog_service = CatalogService()
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+class RequestCoalescer:
+    """
+    Collects concurrent single-user recommendation requests that arrive within
+    a short window (or until the batch is full) and scores them with one call
+    to the batched scorer. Each caller awaits its own future.
+
+    The batched scorer is blocking (torch/numpy), so it runs in the default
+    executor to keep the event loop free while the next batch accumulates.
+    """
+
+    def __init__(self, score_batch: Callable[[List[str], int], Dict[str, Any]],
+                 window_ms: float = 2.0, max_batch_size: int = 64):
+        self.score_batch = score_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self._pending: List[Tuple[str, int, asyncio.Future]] = []
+        self._flush_handle = None
+
+        # Metrics
+        self._in_flight = 0
+        self._total_requests = 0
+        self._total_batched = 0
+        self._total_batches = 0
+        self._max_batch_seen = 0
+        self._batch_size_hist = defaultdict(int)
+        self._last_flush_ms = 0.0
+
+    async def submit(self, user_id: str, top_k: int) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((user_id, top_k, future))
+        self._total_requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch = self._pending
+        self._pending = []
+        self._in_flight += len(batch)
+        asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, int, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+
+        # Endpoints normally share one top_k, but keep requests with different k apart
+        by_k = defaultdict(list)
+        for item in batch:
+            by_k[item[1]].append(item)
+
+        try:
+            for top_k, items in by_k.items():
+                user_ids = [uid for uid, _, _ in items]
+                try:
+                    results = await loop.run_in_executor(None, self.score_batch, user_ids, top_k)
+                except Exception as e:
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for uid, _, future in items:
+                    if not future.done():
+                        future.set_result(results.get(uid))
+        finally:
+            self._in_flight -= len(batch)
+            self._total_batches += 1
+            self._total_batched += len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._batch_size_hist[_bucket(len(batch))] += 1
+            self._last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": len(self._pending),
+            "in_flight": self._in_flight,
+            "total_requests": self._total_requests,
+            "total_batches": self._total_batches,
+            "avg_batch_size": round(self._total_batched / self._total_batches, 2) if self._total_batches else 0.0,
+            "max_batch_size": self._max_batch_seen,
+            "batch_size_histogram": dict(sorted(self._batch_size_hist.items(), key=lambda kv: int(kv[0].split('-')[0]))),
+            "last_flush_ms": round(self._last_flush_ms, 3),
+            "window_ms": self.window * 1000,
+            "max_batch_limit": self.max_batch_size,
+        }
+
+def _bucket(size: int) -> str:
+    # Power-of-two buckets: "1-1", "2-3", "4-7", ...
+    lo = 1
+    while lo * 2 <= size:
+        lo *= 2
+    return f"{lo}-{lo * 2 - 1}"
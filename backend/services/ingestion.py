@@ -0,0 +1,300 @@
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from firebase_admin import firestore
+from backend.core.config import get_settings
+from backend.db.firestore import get_db
+
+settings = get_settings()
+
+FIRESTORE_BATCH_LIMIT = 500 # Max writes per Firestore batch commit
+
+class InteractionBuffer:
+    """
+    In-process ingestion buffer for play events.
+
+    `submit` appends the event to an in-memory queue and returns; it never
+    touches the disk or waits on Firestore, so the async endpoint calling it
+    does not block the event loop. A WAL writer thread group-commits newly
+    submitted events to the current write-ahead segment every
+    `wal_interval` seconds (one write + flush, plus fsync if enabled, per
+    group). A separate flusher thread drains the queue into Firestore batch
+    commits when it reaches the batch size or the flush interval passes, so
+    a slow or stuck Firestore commit never holds up the log.
+
+    Durability: an accepted event reaches the WAL within `wal_interval`
+    (INGEST_WAL_COMMIT_INTERVAL, default 50 ms) whatever Firestore is doing;
+    a process crash inside that window loses the events not yet
+    group-committed. On every flush the WAL segment is sealed with exactly
+    the events taken from the queue and only deleted once all of them are
+    committed. Each event gets a document id on
+    submit, so re-committing a segment after a crash or a failed flush
+    overwrites instead of duplicating. Segments left over from a previous
+    process are replayed on start.
+
+    Backpressure: when INGEST_QUEUE_MAX events are queued or awaiting commit
+    (e.g. during a Firestore outage), new events are rejected and counted as
+    drops instead of growing memory and the WAL without bound.
+    """
+
+    def __init__(self, wal_dir: str, batch_size: int, flush_interval: float, max_queue: int, fsync: bool = False,
+                 wal_interval: float = 0.05):
+        self.wal_dir = wal_dir
+        self.batch_size = max(1, min(batch_size, FIRESTORE_BATCH_LIMIT))
+        self.flush_interval = flush_interval
+        self.wal_interval = max(0.001, wal_interval)
+        self.max_queue = max_queue
+        self.fsync = fsync
+
+        self._queue: deque = deque()
+        self._unlogged: List[Dict] = [] # Queued events not yet written to the WAL
+        self._lock = threading.Lock() # Queue state; submit only ever takes this one
+        self._wal_lock = threading.Lock() # Open segment; taken before _lock
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._wal_stop = threading.Event()
+        self._wal_thread: Optional[threading.Thread] = None
+
+        self._wal_writes = 0
+        self._segment_seq = 0
+        self._segment_path: Optional[str] = None
+        self._segment_file = None
+        self._pending: List[Tuple[str, List[Dict]]] = [] # Sealed segments not yet committed
+        self._pending_events = 0
+
+        # Stats
+        self.accepted = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.replayed = 0
+        self._batches = 0
+        self._max_batch = 0
+        self._flushes = 0
+        self._flush_ms_total = 0.0
+        self._flush_ms_max = 0.0
+        self._last_flush_ms = 0.0
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.wal_dir, exist_ok=True)
+        self._replay()
+        self._stopping = False
+        self._wal_stop.clear()
+        self._wal_thread = threading.Thread(target=self._run_wal, name="interaction-wal", daemon=True)
+        self._wal_thread.start()
+        self._thread = threading.Thread(target=self._run, name="interaction-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flushes what is queued and stops the flusher and WAL threads."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # Still waiting on Firestore: it owns the flush path, and the WAL
+            # thread keeps logging, so nothing accepted is lost on exit
+            print(f"Interaction flusher still busy after {timeout}s; queued events stay in the WAL.")
+            return
+        self._thread = None
+        self._wal_stop.set()
+        self._wal_thread.join()
+        self._wal_thread = None
+        self._write_wal() # Events submitted after the last flush are replayed on the next start
+        with self._wal_lock:
+            self._close_segment()
+
+    def _replay(self):
+        segments = sorted(glob.glob(os.path.join(self.wal_dir, "interactions-*.wal")))
+        for path in segments:
+            events = []
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        break # Torn last line from a crash mid-append
+            if events:
+                self._pending.append((path, events))
+                self._pending_events += len(events)
+                self.replayed += len(events)
+            else:
+                os.remove(path)
+            self._segment_seq = max(self._segment_seq, _segment_number(path))
+        if self.replayed:
+            print(f"Interaction buffer: replaying {self.replayed} events from {len(self._pending)} WAL segments.")
+
+    # --- Write path ---
+
+    def submit(self, event: Dict) -> bool:
+        """Queues one event; returns False if it was dropped because the queue is full."""
+        with self._lock:
+            if len(self._queue) + self._pending_events >= self.max_queue:
+                self.dropped += 1
+                return False
+            event = dict(event)
+            event.setdefault('_event_id', uuid.uuid4().hex)
+            self._unlogged.append(event)
+            self._queue.append(event)
+            self.accepted += 1
+            full = len(self._queue) >= self.batch_size
+        if full:
+            self._wake.set()
+        return True
+
+    def _run_wal(self):
+        while not self._wal_stop.wait(self.wal_interval):
+            self._write_wal()
+
+    def _write_wal(self):
+        """Group commit: appends the events submitted since the last call to the WAL segment."""
+        with self._wal_lock:
+            with self._lock:
+                events, self._unlogged = self._unlogged, []
+            self._append_segment(events)
+
+    def _append_segment(self, events: List[Dict]):
+        # Caller holds _wal_lock
+        if not events:
+            return
+        if self._segment_file is None:
+            self._segment_seq += 1
+            self._segment_path = os.path.join(self.wal_dir, f"interactions-{self._segment_seq:012d}.wal")
+            self._segment_file = open(self._segment_path, 'a', encoding='utf-8')
+        self._segment_file.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events))
+        self._segment_file.flush() # Survives a process crash; fsync also survives power loss
+        if self.fsync:
+            os.fsync(self._segment_file.fileno())
+        self._wal_writes += 1
+
+    def _close_segment(self) -> Optional[str]:
+        if self._segment_file is None:
+            return None
+        self._segment_file.close()
+        path = self._segment_path
+        self._segment_file, self._segment_path = None, None
+        return path
+
+    # --- Flush path ---
+
+    def _take(self):
+        """Drains the queue and seals the WAL segment holding exactly those events."""
+        with self._wal_lock:
+            with self._lock:
+                if not self._queue:
+                    return
+                events = list(self._queue)
+                self._queue.clear()
+                unlogged, self._unlogged = self._unlogged, []
+                self._pending_events += len(events)
+            # The segment holds the earlier group commits of these events; add the rest and seal it
+            self._append_segment(unlogged)
+            path = self._close_segment()
+        self._pending.append((path, events))
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._take()
+            self._flush_pending()
+            if self._stopping:
+                self._take()
+                self._flush_pending()
+                return
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        db = get_db()
+        if not db:
+            return # Kept on disk and retried on the next tick
+
+        while self._pending:
+            path, events = self._pending[0]
+            start = time.perf_counter()
+            try:
+                self._commit(db, events)
+            except Exception as e:
+                self.failed_flushes += 1
+                print(f"Interaction flush failed ({len(events)} events kept for retry): {e}")
+                return
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            self._pending.pop(0)
+            with self._lock:
+                self._pending_events -= len(events)
+            if path and os.path.exists(path):
+                os.remove(path)
+            self.flushed += len(events)
+            self._flushes += 1
+            self._flush_ms_total += elapsed_ms
+            self._flush_ms_max = max(self._flush_ms_max, elapsed_ms)
+            self._last_flush_ms = elapsed_ms
+
+    def _commit(self, db, events: List[Dict]):
+        collection = db.collection('interactions')
+        for i in range(0, len(events), self.batch_size):
+            chunk = events[i:i + self.batch_size]
+            batch = db.batch()
+            for event in chunk:
+                data = {k: v for k, v in event.items() if k != '_event_id'}
+                # Watermark field for the incremental graph sync: the commit time,
+                # so a late write (WAL replay, flush retried through an outage)
+                # still lands ahead of the watermark
+                data['ingested_at'] = firestore.SERVER_TIMESTAMP
+                batch.set(collection.document(event['_event_id']), data)
+            batch.commit()
+            self._batches += 1
+            self._max_batch = max(self._max_batch, len(chunk))
+
+    # --- Introspection ---
+
+    def stats(self) -> Dict:
+        wal_files = glob.glob(os.path.join(self.wal_dir, "interactions-*.wal"))
+        return {
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "replayed": self.replayed,
+            "pending_events": self._pending_events,
+            "failed_flushes": self.failed_flushes,
+            "batches": self._batches,
+            "avg_batch_size": round(self.flushed / self._batches, 2) if self._batches else 0.0,
+            "max_batch_size": self._max_batch,
+            "flushes": self._flushes,
+            "avg_flush_ms": round(self._flush_ms_total / self._flushes, 3) if self._flushes else 0.0,
+            "max_flush_ms": round(self._flush_ms_max, 3),
+            "last_flush_ms": round(self._last_flush_ms, 3),
+            "wal_group_commits": self._wal_writes,
+            "wal_segments": len(wal_files),
+            "wal_bytes": sum(os.path.getsize(p) for p in wal_files if os.path.exists(p)),
+        }
+
+def _segment_number(path: str) -> int:
+    try:
+        return int(os.path.basename(path)[len("interactions-"):-len(".wal")])
+    except ValueError:
+        return 0
+
+interaction_buffer = InteractionBuffer(
+    wal_dir=settings.ABS_INGEST_WAL_DIR,
+    batch_size=settings.INGEST_BATCH_SIZE,
+    flush_interval=settings.INGEST_FLUSH_INTERVAL,
+    max_queue=settings.INGEST_QUEUE_MAX,
+    fsync=settings.INGEST_WAL_FSYNC,
+    wal_interval=settings.INGEST_WAL_COMMIT_INTERVAL,
+)
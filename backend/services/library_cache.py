@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+from backend.core.config import get_settings
+
+settings = get_settings()
+
+class LibraryCache:
+    """
+    Per-user cache of library documents ({'liked': [...], 'playlists': [...]})
+    in the API process, LRU-bounded to `max_entries` with entries expiring
+    after `ttl` seconds.
+
+    Concurrent misses for the same user share one Firestore load. Writes go
+    through: after the like endpoint's update succeeds, the cached entry is
+    replaced with the same change applied, and a playlist save drops it.
+    A load may have read the document before a write that finished while it
+    was in flight: likes made meanwhile are replayed onto its result (adds
+    and removes are idempotent), and a load that overlapped a playlist save
+    is returned but not cached.
+
+    Only the event loop touches the cache, so it needs no lock. Writes made
+    by other API processes are not seen until the entry expires, which is
+    what bounds `ttl`.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict() # user_id -> (expires_at, library)
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._likes_while_loading: Dict[str, List[Tuple[str, str]]] = {}
+        self._invalidated_while_loading: Set[str] = set()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.evictions = 0
+        self.write_throughs = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    async def get(self, user_id: str, load: Callable[[], Awaitable[dict]]) -> dict:
+        if not self.enabled:
+            return await load()
+
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            del self._entries[user_id]
+            self.expired += 1
+
+        pending = self._loading.get(user_id)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            library = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # Mark retrieved: there may be no other waiter
+            raise
+        finally:
+            del self._loading[user_id]
+            likes = self._likes_while_loading.pop(user_id, [])
+            stale = user_id in self._invalidated_while_loading
+            self._invalidated_while_loading.discard(user_id)
+
+        for song_id, action in likes:
+            library = _with_like(library, song_id, action)
+        if not stale:
+            self._put(user_id, library)
+        future.set_result(library)
+        return library
+
+    def _put(self, user_id: str, library: dict):
+        self._entries[user_id] = (time.monotonic() + self.ttl, library)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def apply_like(self, user_id: str, song_id: str, action: str):
+        """Mirrors a committed ArrayUnion / ArrayRemove on liked_songs into the cached entry."""
+        if user_id in self._loading:
+            self._likes_while_loading.setdefault(user_id, []).append((song_id, action))
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        # New dict, same expiry: responses already handed out keep their snapshot
+        self._entries[user_id] = (entry[0], _with_like(entry[1], song_id, action))
+        self.write_throughs += 1
+
+    def invalidate(self, user_id: str):
+        if user_id in self._loading:
+            self._invalidated_while_loading.add(user_id)
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced # Expired entries count as misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "write_throughs": self.write_throughs,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+def _with_like(library: dict, song_id: str, action: str) -> dict:
+    liked = library['liked']
+    if action == 'add':
+        liked = liked if song_id in liked else liked + [song_id]
+    elif action == 'remove':
+        liked = [s for s in liked if s != song_id]
+    return dict(library, liked=liked)
+
+library_cache = LibraryCache(
+    max_entries=settings.LIBRARY_CACHE_SIZE,
+    ttl=settings.LIBRARY_CACHE_TTL,
+)
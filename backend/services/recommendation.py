@@ -1,118 +1,385 @@
-import torch
+import copy
 import json
 import os
+import random
+import threading
+import time
 from typing import List, Dict, Optional
+import numpy as np
 from backend.core.config import get_settings
-from backend.id_mapper import get_user_idx # We will fix this import or move the file later
+from backend.id_mapper import get_user_idx, get_user_indices # We will fix this import or move the file later
+from backend.services.coalescer import RequestCoalescer
+from backend.services.song_table import SongTable
+from recommendation_engine.ann_index import load_or_build_index
+from recommendation_engine.topk_cache import cache_path_for, load_topk_cache
+from recommendation_engine.catalog_store import catalog_exists, load_catalog
+from recommendation_engine.embedding_store import load_embeddings, load_user_updates, source_mtime, user_updates_path
+from recommendation_engine.song_index import SongIndex, song_index_path_for
 
 settings = get_settings()
 
+class ModelSnapshot:
+    """
+    Everything a request needs to score and hydrate, loaded together.
+    Snapshots are never mutated after construction: a reload builds a new one
+    in the background and swaps the reference, so in-flight requests keep
+    scoring against the snapshot they started with.
+
+    `user_updates` overlays user vectors recomputed online since training
+    (recommendation_engine/online_update.py) on user_emb; it can also cover
+    users newer than the trained embeddings.
+    """
+    def __init__(self, version: int, user_emb, song_emb, index, topk_cache, checksum: str,
+                 songs: SongTable, source_mtime: float, user_updates=None):
+        self.version = version
+        self.user_emb = user_emb
+        self.song_emb = song_emb
+        self.index = index
+        self.topk_cache = topk_cache
+        self.checksum = checksum
+        self.songs = songs
+        self.source_mtime = source_mtime
+        self.loaded_at = time.time()
+        self._set_user_updates(user_updates)
+
+    def _set_user_updates(self, user_updates):
+        user_idx, vectors = user_updates if user_updates is not None else ((), None)
+        self.updated_rows = {int(u): row for row, u in enumerate(user_idx)}
+        self.updated_vectors = vectors
+
+    def with_user_updates(self, user_updates) -> "ModelSnapshot":
+        snap = copy.copy(self)
+        snap._set_user_updates(user_updates)
+        return snap
+
+    def has_user(self, u_idx: int) -> bool:
+        return u_idx < self.user_emb.shape[0] or u_idx in self.updated_rows
+
+    def user_vectors(self, user_indices: List[int]):
+        """Query vectors, taking online updates over the trained rows."""
+        if not self.updated_rows:
+            return self.user_emb[user_indices]
+        return np.stack([
+            self.updated_vectors[self.updated_rows[u]] if u in self.updated_rows else self.user_emb[u]
+            for u in user_indices
+        ])
+
 class RecommendationService:
     def __init__(self):
-        self.user_emb = None
-        self.song_emb = None
-        self.songs_metadata = {}
-        self.loaded = False
+        self._snapshot: Optional[ModelSnapshot] = None
+        self._version = 0
+        self._reload_lock = threading.Lock()
+        self._watcher = None
         self._load_model()
 
-    def _load_model(self):
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> int:
+        snap = self._snapshot
+        return snap.version if snap else 0
+
+    def _load_model(self) -> bool:
+        snap = self._load_snapshot(self._version + 1)
+        if snap is None:
+            return False
+        self._version = snap.version
+        self._snapshot = snap # Atomic reference swap
+        return True
+
+    def _load_snapshot(self, version: int) -> Optional[ModelSnapshot]:
         try:
             print(f"Loading embeddings from {settings.ABS_EMBEDDINGS_PATH}")
-            if not os.path.exists(settings.ABS_EMBEDDINGS_PATH):
+            mtime = source_mtime(settings.ABS_EMBEDDINGS_PATH)
+            if not mtime:
                 print("Embeddings file not found. Recommendation service will return empty.")
-                return
-
-            # Check for CPU/GPU
-            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-            emb_data = torch.load(settings.ABS_EMBEDDINGS_PATH, map_location=device)
-            
-            self.user_emb = emb_data['user_embeddings'].to(device)
-            self.song_emb = emb_data['song_embeddings'].to(device)
-            
-            # Load metadata
-            # Assuming dataset.json is in the root or known location matching indices
-            # We use the dataset.json in 'backend' if available, or the root one.
-            # config didn't specify dataset path, let's look in backend dir
-            dataset_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dataset.json")
-            if not os.path.exists(dataset_path):
-                # Validation fallback to root
-                dataset_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "dataset.json")
-            
-            if os.path.exists(dataset_path):
-                with open(dataset_path, 'r', encoding='utf-8') as f:
-                    self.songs_metadata = json.load(f)
-            else:
-                print("Dataset json not found!")
-                
-            self.loaded = True
-            print("Recommendation model loaded successfully.")
-            
+                return None
+
+            # Serving runs on CPU with NumPy. With the .npy store the arrays are
+            # read-only memory maps shared through the page cache by all workers.
+            user_emb, song_emb, checksum = load_embeddings(settings.ABS_EMBEDDINGS_PATH, fmt=settings.EMBEDDINGS_FORMAT)
+
+            # Retrieval index (exact brute force or IVF), selected via Settings
+            index = load_or_build_index(
+                settings.ANN_INDEX, song_emb, settings.ABS_EMBEDDINGS_PATH, checksum,
+                nlist=settings.ANN_NLIST, nprobe=settings.ANN_NPROBE,
+            )
+
+            # Precomputed per-user top-K (recommendation_engine/topk_cache.py).
+            # Only used if it was built from exactly these embeddings.
+            topk_cache = None
+            if settings.TOPK_CACHE_ENABLED:
+                topk_cache = load_topk_cache(cache_path_for(settings.ABS_EMBEDDINGS_PATH), checksum)
+                if topk_cache is not None:
+                    print(f"Serving {topk_cache.shape[0]} users from top-{topk_cache.shape[1]} cache.")
+
+            songs = self._load_songs()
+
+            # Users re-embedded online since training, if made from these embeddings
+            user_updates = load_user_updates(settings.ABS_EMBEDDINGS_PATH, checksum)
+            if user_updates is not None:
+                print(f"Applied online updates for {len(user_updates[0])} users.")
+
+            print(f"Recommendation model v{version} loaded successfully.")
+            return ModelSnapshot(version, user_emb, song_emb, index, topk_cache, checksum,
+                                 songs, mtime, user_updates)
+
         except Exception as e:
             print(f"Error loading recommendation model: {e}")
+            return None
+
+    def _load_songs(self) -> SongTable:
+        backend_dir = os.path.dirname(os.path.dirname(__file__))
+        dataset_paths = [os.path.join(backend_dir, "dataset.json"), os.path.join(os.path.dirname(backend_dir), "dataset.json")]
+
+        # Song id <-> embedding index table written with the training graph (recommendation_engine/song_index.py)
+        index_path = song_index_path_for(settings.ABS_EMBEDDINGS_PATH)
+        if os.path.exists(index_path):
+            catalog = []
+            for path in reversed(dataset_paths): # backend/dataset.json wins on duplicate ids
+                if catalog_exists(path):
+                    catalog.extend(load_catalog(path))
+            songs = SongTable.aligned(SongIndex.load(index_path).ids(), catalog)
+            print(f"Song index: {len(songs.available)} of {len(songs)} embedded songs have catalog metadata.")
+            return songs
+
+        # No index: assume dataset.json order matches the embedding indices.
+        # We use the dataset.json in 'backend' if available, or the root one.
+        for dataset_path in dataset_paths:
+            if catalog_exists(dataset_path):
+                # Columnar catalog with fallbacks resolved and JSON pre-serialized per song
+                return SongTable.from_json(dataset_path)
+        print("Dataset json not found!")
+        return SongTable([])
+
+    # --- Hot Reload ---
+
+    def reload(self) -> bool:
+        """
+        Loads the embeddings into a fresh snapshot and swaps it in. Requests
+        keep being served by the current snapshot while this runs. Returns
+        False if loading failed (the old snapshot stays live) or another
+        reload is already in progress.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            print("Reload already in progress, skipping.")
+            return False
+        try:
+            return self._load_model()
+        finally:
+            self._reload_lock.release()
+
+    def refresh_user_updates(self) -> int:
+        """
+        Swaps in the on-disk online user updates without reloading the model
+        (milliseconds; the embeddings, index and caches are shared). Returns
+        the number of users overlaid.
+        """
+        snap = self._snapshot
+        if snap is None:
+            return 0
+        user_updates = load_user_updates(settings.ABS_EMBEDDINGS_PATH, snap.checksum)
+        self._snapshot = snap.with_user_updates(user_updates)
+        return len(self._snapshot.updated_rows)
+
+    def start_watcher(self, interval: float):
+        """
+        Polls the embeddings file mtime and reloads when train.py writes a new
+        one; picks up online user updates (sync_graph.py) the same way.
+        """
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        updates_path = user_updates_path(settings.ABS_EMBEDDINGS_PATH)
+        def updates_mtime():
+            return os.path.getmtime(updates_path) if os.path.exists(updates_path) else 0.0
+
+        def watch():
+            seen_updates = updates_mtime()
+            while True:
+                time.sleep(interval)
+                mtime = source_mtime(settings.ABS_EMBEDDINGS_PATH)
+                snap = self._snapshot
+                if mtime and (snap is None or mtime > snap.source_mtime):
+                    print("Embeddings file changed on disk, reloading.")
+                    self.reload()
+                    seen_updates = updates_mtime()
+                elif updates_mtime() != seen_updates:
+                    seen_updates = updates_mtime()
+                    print(f"Online user updates changed, {self.refresh_user_updates()} users overlaid.")
+
+        self._watcher = threading.Thread(target=watch, name="embeddings-watcher", daemon=True)
+        self._watcher.start()
+
+    def model_info(self) -> Dict:
+        snap = self._snapshot
+        if snap is None:
+            return {"loaded": False, "model_version": 0}
+        return {
+            "loaded": True,
+            "model_version": snap.version,
+            "checksum": snap.checksum,
+            "loaded_at": snap.loaded_at,
+            "num_users": int(snap.user_emb.shape[0]),
+            "num_songs": int(snap.song_emb.shape[0]),
+            "index": snap.index.kind,
+            "topk_cache": snap.topk_cache is not None,
+            "online_updated_users": len(snap.updated_rows),
+            "reloading": self._reload_lock.locked(),
+        }
+
+    # --- Inference ---
+
+    def _cold_start(self, snap: ModelSnapshot, top_k: int) -> List[int]:
+        # Cold start: Return a diverse, randomized set from the full catalog
+        available = snap.songs.available
+        if not len(available):
+            return []
+
+        # Select up to 50 random samples to ensure "every song" visibility over time
+        pool_size = min(50, len(available))
+        indices = random.sample(available.tolist(), pool_size)
+        return indices[:top_k]
+
+    def _score_batch(self, snap: ModelSnapshot, user_indices: List[int], k: int) -> List[List[int]]:
+        """
+        Returns the top-k song indices per user. Users covered by the
+        precomputed cache are served from it; the rest (added after the
+        snapshot, updated online, or asking for more than it holds) are
+        scored live with a single index search.
+        """
+        cache = snap.topk_cache
+        if cache is None or k > cache.shape[1]:
+            return snap.index.search(snap.user_vectors(user_indices), k).tolist()
+
+        results = [None] * len(user_indices)
+        live_pos = []
+        for pos, u_idx in enumerate(user_indices):
+            if u_idx < cache.shape[0] and u_idx not in snap.updated_rows:
+                results[pos] = cache[u_idx, :k].tolist()
+            else:
+                live_pos.append(pos)
+
+        if live_pos:
+            live_users = [user_indices[pos] for pos in live_pos]
+            for pos, row in zip(live_pos, snap.index.search(snap.user_vectors(live_users), k).tolist()):
+                results[pos] = row
+        return results
+
+    def _pick(self, snap: ModelSnapshot, indices: List[int], top_k: int) -> List[int]:
+        # Shuffle the top_k * 2 candidate pool for variety, then cut to top_k
+        picked = snap.songs.valid(indices).tolist()
+        random.shuffle(picked)
+        return picked[:top_k]
+
+    def _recommend_indices(self, snap: ModelSnapshot, user_ids: List[str], top_k: int) -> Dict[str, List[int]]:
+        """
+        Song indices per user. All known users are scored together in one
+        index search; unknown or out-of-range users get the cold-start variety.
+        """
+        # One locked lookup for the whole batch
+        uid_to_idx = get_user_indices(user_ids)
+
+        results = {}
+        warm_uids = []
+        warm_indices = []
+        seen = set()
+        for uid in user_ids:
+            if uid in seen:
+                continue
+            seen.add(uid)
+            u_idx = uid_to_idx.get(uid)
+            if u_idx is None or not snap.has_user(u_idx):
+                results[uid] = self._cold_start(snap, top_k)
+            else:
+                warm_uids.append(uid)
+                warm_indices.append(u_idx)
+
+        if warm_indices:
+            try:
+                top_indices = self._score_batch(snap, warm_indices, top_k * 2) # Get more for diversity
+                for uid, row in zip(warm_uids, top_indices):
+                    results[uid] = self._pick(snap, row, top_k)
+            except Exception as e:
+                print(f"Batch inference error: {e}")
+                for uid in warm_uids:
+                    results[uid] = []
+
+        return results
 
     def get_recommendations(self, user_id: str, top_k: int = 10) -> List[Dict]:
-        if not self.loaded:
+        snap = self._snapshot
+        if snap is None:
             return []
-            
+
         # Get internal ID
         u_idx = get_user_idx(user_id, create=False)
-        if u_idx is None or not self.loaded:
-            # Cold start: Return a diverse, randomized set from the full metadata
+        if u_idx is None:
             print(f"Cold start for user {user_id}. Returning randomized variety.")
-            if not self.songs_metadata:
-                return []
-            
-            import random
-            # Select up to 50 random samples to ensure "every song" visibility over time
-            pool_size = min(50, len(self.songs_metadata))
-            indices = random.sample(range(len(self.songs_metadata)), pool_size)
-            
-            results = []
-            for idx in indices:
-                song = self.songs_metadata[idx]
-                results.append({
-                    "id": song.get("id"),
-                    "title": song.get("title"),
-                    "artist": song.get("artist"),
-                    "coverUrl": song.get("image_url") or song.get("coverUrl", "https://picsum.photos/200"),
-                    "audioUrl": song.get("audio_url") or song.get("audioUrl")
-                })
-            
-            # Final shuffle for return limit
-            random.shuffle(results)
-            return results[:top_k]
-            
-        # Check if user index is within embedding range
-        # Use shape check
-        if u_idx >= self.user_emb.shape[0]:
-            print(f"User index {u_idx} out of bounds for model (trained on {self.user_emb.shape[0]})")
+            return snap.songs.gather(self._cold_start(snap, top_k))
+
+        # Check if user index is within embedding range (or was embedded online since)
+        if not snap.has_user(u_idx):
+            print(f"User index {u_idx} out of bounds for model (trained on {snap.user_emb.shape[0]})")
             # Fallback to cold start logic
-            return self.get_recommendations("cold-start-fallback", top_k)
+            return snap.songs.gather(self._cold_start(snap, top_k))
 
         # Inference
         try:
-            u_vec = self.user_emb[u_idx]
-            scores = torch.matmul(self.song_emb, u_vec)
-            top_scores, top_indices = torch.topk(scores, top_k * 2) # Get more for diversity
-            
-            results = []
-            for idx_tensor in top_indices:
-                idx = idx_tensor.item()
-                if 0 <= idx < len(self.songs_metadata):
-                    song = self.songs_metadata[idx]
-                    results.append({
-                        "id": song.get("id"),
-                        "title": song.get("title"),
-                        "artist": song.get("artist"),
-                        "coverUrl": song.get("image_url") or song.get("coverUrl", "https://picsum.photos/200"),
-                        "audioUrl": song.get("audio_url") or song.get("audioUrl")
-                    })
-            
-            import random
-            random.shuffle(results)
-            return results[:top_k]
+            top_indices = self._score_batch(snap, [u_idx], top_k * 2)[0] # Get more for diversity
+            return snap.songs.gather(self._pick(snap, top_indices, top_k))
         except Exception as e:
             print(f"Inference error: {e}")
             return []
 
+    def get_recommendations_batch(self, user_ids: List[str], top_k: int = 10) -> Dict[str, List[Dict]]:
+        """Batched variant of get_recommendations for fan-out callers (e.g. email jobs)."""
+        snap = self._snapshot
+        if snap is None:
+            return {uid: [] for uid in user_ids}
+
+        indices = self._recommend_indices(snap, user_ids, top_k)
+        return {uid: snap.songs.gather(idx) for uid, idx in indices.items()}
+
+    def render_recommendations_batch(self, user_ids: List[str], top_k: int = 10) -> Dict[str, bytes]:
+        """
+        Complete JSON response bodies per user, assembled from the
+        pre-serialized song fragments. The model version in each body is the
+        snapshot that actually produced it.
+        """
+        snap = self._snapshot
+        if snap is None:
+            return {uid: _render_body(b"[]", 0) for uid in user_ids}
+
+        indices = self._recommend_indices(snap, user_ids, top_k)
+        return {uid: _render_body(snap.songs.render(idx), snap.version) for uid, idx in indices.items()}
+
+    def render_recommendations_map(self, user_ids: List[str], top_k: int = 10) -> bytes:
+        """Single JSON body for the batch endpoint: {"recommendations": {uid: [...]}, "model_version": N}."""
+        snap = self._snapshot
+        if snap is None:
+            return json.dumps({"recommendations": {uid: [] for uid in user_ids}, "model_version": 0}).encode("utf-8")
+
+        indices = self._recommend_indices(snap, user_ids, top_k)
+        entries = b",".join(
+            json.dumps(uid, ensure_ascii=False).encode("utf-8") + b":" + snap.songs.render(idx)
+            for uid, idx in indices.items()
+        )
+        return b'{"recommendations":{' + entries + b'},"model_version":' + str(snap.version).encode() + b"}"
+
+def _render_body(songs_json: bytes, version: int) -> bytes:
+    if songs_json == b"[]":
+        # If no recs (cold start or error), return empty list with info
+        return b'{"recommendations":[],"info":"No recommendations available","model_version":' + str(version).encode() + b"}"
+    return b'{"recommendations":' + songs_json + b',"model_version":' + str(version).encode() + b"}"
+
 recommendation_service = RecommendationService()
+
+# Groups concurrent GET /recommend/{user_id} calls into one batched scoring pass
+recommendation_coalescer = RequestCoalescer(
+    recommendation_service.render_recommendations_batch,
+    window_ms=settings.RECOMMEND_BATCH_WINDOW_MS,
+    max_batch_size=settings.RECOMMEND_BATCH_MAX_SIZE,
+)
@@ -0,0 +1,226 @@
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Field weights: a title hit outranks an artist hit outranks an album hit
+FIELDS = (('title', 3.0), ('artist', 2.0), ('album', 1.0))
+
+# Match quality per expansion type of a query token
+EXACT, PREFIX, SUBSTRING = 1.0, 0.8, 0.6
+FUZZY_SCALE = 0.7         # x trigram similarity
+FUZZY_THRESHOLD = 0.45    # Minimum Dice similarity of padded trigrams
+MAX_EXPANSIONS = 64       # Vocabulary terms one query token may expand to
+EXPANSION_POSTINGS = 16000 # Highest-weight postings read per query token across its non-exact expansions
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents ("Beyoncé" -> "beyonce")."""
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return text.lower()
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+def _trigrams(term: str) -> set:
+    padded = f"^{term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """
+    In-process inverted index over title/artist/album.
+
+    Document postings are CSR arrays keyed by term id (doc ids + field
+    weights), so one term lookup is two slices. Each query token is expanded
+    against the vocabulary, not the documents:
+      - exact term
+      - prefix terms (bisect over the sorted vocabulary), for type-ahead
+      - substring terms (intersection of the token's inner trigram postings)
+      - fuzzy terms (trigram Dice similarity), for typos
+    Per token the best expansion per document counts; scores are summed over
+    tokens with IDF weighting. Documents matching more tokens rank first, and
+    within that, titles starting with the query (the old prefix search).
+    """
+
+    def __init__(self, tracks: Sequence[Dict]):
+        self.num_docs = len(tracks)
+        vocab: Dict[str, int] = {}
+        term_col, doc_col, weight_col = array('i'), array('i'), array('f')
+        self.titles = []
+
+        for doc, track in enumerate(tracks):
+            self.titles.append(normalize(str(track.get('title') or '')))
+            for field, weight in FIELDS:
+                value = track.get(field)
+                if not value:
+                    continue
+                for token in tokenize(str(value)):
+                    tid = vocab.get(token)
+                    if tid is None:
+                        tid = vocab[token] = len(vocab)
+                    term_col.append(tid)
+                    doc_col.append(doc)
+                    weight_col.append(weight)
+
+        self.vocab = vocab
+        self.terms = [None] * len(vocab)
+        for term, tid in vocab.items():
+            self.terms[tid] = term
+
+        # --- Document postings (CSR by term, duplicate (term, doc) pairs merged) ---
+        terms = np.frombuffer(term_col, dtype=np.int32).astype(np.int64)
+        docs = np.frombuffer(doc_col, dtype=np.int32)
+        weights = np.frombuffer(weight_col, dtype=np.float32)
+        key = terms * max(self.num_docs, 1) + docs
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        uniq, starts = np.unique(key, return_index=True)
+
+        post_terms = uniq // max(self.num_docs, 1)
+        post_docs = (uniq % max(self.num_docs, 1)).astype(np.int32)
+        post_weights = np.add.reduceat(weights[order], starts).astype(np.float32) if uniq.size else np.empty(0, np.float32)
+
+        # Impact order inside each term (heaviest field hits first), so expansion
+        # terms can read just the head of their posting list
+        impact = np.lexsort((post_docs, -post_weights, post_terms))
+        self.post_docs = post_docs[impact]
+        self.post_weights = post_weights[impact]
+        df = np.bincount(post_terms, minlength=len(vocab))
+        self.offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=self.offsets[1:])
+        self.idf = np.log1p(self.num_docs / np.maximum(df, 1)).astype(np.float32)
+
+        # --- Vocabulary structures for query expansion ---
+        self.sorted_terms = sorted(vocab)
+        gram_terms = defaultdict(list)
+        self.gram_counts = np.zeros(len(vocab), dtype=np.int32)
+        for tid, term in enumerate(self.terms):
+            grams = _trigrams(term)
+            self.gram_counts[tid] = len(grams)
+            for gram in grams:
+                gram_terms[gram].append(tid)
+        self.gram_postings = {gram: np.array(tids, dtype=np.int32) for gram, tids in gram_terms.items()}
+
+    def __len__(self):
+        return self.num_docs
+
+    # --- Query expansion ---
+
+    def _expand(self, token: str) -> Dict[int, float]:
+        """Vocabulary term id -> match quality for one query token."""
+        matches: Dict[int, float] = {}
+        tid = self.vocab.get(token)
+        if tid is not None:
+            matches[tid] = EXACT
+
+        # Prefix (type-ahead)
+        pos = bisect_left(self.sorted_terms, token)
+        added = 0
+        while pos < len(self.sorted_terms) and added < MAX_EXPANSIONS:
+            term = self.sorted_terms[pos]
+            if not term.startswith(token):
+                break
+            if term != token:
+                matches.setdefault(self.vocab[term], PREFIX)
+                added += 1
+            pos += 1
+
+        # Substring / typo expansion only for tokens that are not a known term
+        if tid is not None or len(token) < 3:
+            return matches
+
+        # Substring: terms holding every inner trigram of the token, verified
+        inner = [token[i:i + 3] for i in range(len(token) - 2)]
+        postings = sorted((self.gram_postings.get(g) for g in inner), key=lambda p: 0 if p is None else len(p))
+        if postings and postings[0] is not None:
+            cand = postings[0]
+            for p in postings[1:]:
+                cand = np.intersect1d(cand, p, assume_unique=True)
+                if not cand.size:
+                    break
+            for tid in cand[:MAX_EXPANSIONS * 4].tolist():
+                if token in self.terms[tid]:
+                    matches.setdefault(tid, SUBSTRING)
+
+        # Fuzzy: padded-trigram Dice similarity against the vocabulary
+        grams = _trigrams(token)
+        hits = [self.gram_postings[g] for g in grams if g in self.gram_postings]
+        if hits:
+            cand, shared = np.unique(np.concatenate(hits), return_counts=True)
+            dice = 2.0 * shared / (len(grams) + self.gram_counts[cand])
+            keep = dice >= FUZZY_THRESHOLD
+            cand, dice = cand[keep], dice[keep]
+            if cand.size > MAX_EXPANSIONS:
+                top = np.argpartition(-dice, MAX_EXPANSIONS - 1)[:MAX_EXPANSIONS]
+                cand, dice = cand[top], dice[top]
+            for tid, sim in zip(cand.tolist(), dice.tolist()):
+                quality = FUZZY_SCALE * sim
+                if quality > matches.get(tid, 0.0):
+                    matches[tid] = quality
+        return matches
+
+    # --- Search ---
+
+    def search(self, query: str, limit: int = 20) -> List[int]:
+        """Ranked document indices for a free-text query."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self.num_docs:
+            return []
+
+        token_docs, token_scores = [], []
+        for token in tokens:
+            matches = self._expand(token)
+            if not matches:
+                continue
+            docs_parts, score_parts = [], []
+            per_term = max(100, EXPANSION_POSTINGS // len(matches))
+            # When the token is a known term, its expansions share its IDF so a
+            # rare prefix/typo term cannot outrank the exact word
+            exact_tid = self.vocab.get(token)
+            for tid, quality in matches.items():
+                lo, hi = self.offsets[tid], self.offsets[tid + 1]
+                if quality < EXACT:
+                    hi = min(hi, lo + per_term)
+                docs_parts.append(self.post_docs[lo:hi])
+                idf = self.idf[tid if exact_tid is None else exact_tid]
+                score_parts.append(self.post_weights[lo:hi] * (idf * quality))
+            docs = np.concatenate(docs_parts)
+            scores = np.concatenate(score_parts)
+
+            # Best expansion per document for this token
+            if len(docs_parts) > 1:
+                docs, inverse = np.unique(docs, return_inverse=True)
+                best = np.zeros(docs.size, dtype=np.float32)
+                np.maximum.at(best, inverse, scores)
+                scores = best
+            token_docs.append(docs)
+            token_scores.append(scores)
+
+        if not token_docs:
+            return []
+
+        if len(token_docs) == 1:
+            cand, score = token_docs[0], token_scores[0].astype(np.float64)
+            matched = np.ones(cand.size, dtype=np.int64)
+        else:
+            cand, inverse = np.unique(np.concatenate(token_docs), return_inverse=True)
+            score = np.bincount(inverse, weights=np.concatenate(token_scores), minlength=cand.size)
+            matched = np.bincount(inverse, minlength=cand.size)
+
+        # Documents matching more query tokens first, then by score
+        rank = matched * (score.max() + 1.0) + score
+        shortlist = min(cand.size, limit * 2)
+        top = np.argpartition(-rank, shortlist - 1)[:shortlist] if cand.size > shortlist else np.arange(cand.size)
+
+        # Within the shortlist, titles starting with the query phrase go first
+        phrase = ' '.join(tokens)
+        docs = cand[top]
+        prefix = np.fromiter((self.titles[d].startswith(phrase) for d in docs.tolist()), dtype=bool, count=docs.size)
+        order = np.lexsort((docs, -score[top], ~prefix, -matched[top]))
+        return docs[order][:limit].tolist()
@@ -0,0 +1,72 @@
+import json
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from recommendation_engine.catalog_store import load_catalog
+
+DEFAULT_COVER_URL = "https://picsum.photos/200"
+
+class SongTable:
+    """
+    Columnar, read-only view of the song catalog in embedding-index order.
+
+    Field fallbacks (image_url/coverUrl, audio_url/audioUrl) are resolved once
+    at load time, and every song's response card is pre-serialized to a JSON
+    fragment. Hydrating a ranked list is then a gather over object arrays plus
+    a bytes join instead of building a dict per song per request.
+    """
+
+    def __init__(self, songs: Sequence[Optional[Dict]]):
+        # None rows are embedding indices with no catalog entry; they are never served
+        self.present = np.array([s is not None for s in songs], dtype=bool)
+        self.available = np.flatnonzero(self.present)
+        songs = [s or {} for s in songs]
+        self.ids = _column([s.get("id") for s in songs])
+        self.titles = _column([s.get("title") for s in songs])
+        self.artists = _column([s.get("artist") for s in songs])
+        self.covers = _column([s.get("image_url") or s.get("coverUrl", DEFAULT_COVER_URL) for s in songs])
+        self.audios = _column([s.get("audio_url") or s.get("audioUrl") for s in songs])
+
+        # Response cards (shared between requests, never mutated) and their JSON encoding
+        self.cards = _column([
+            {"id": i, "title": t, "artist": a, "coverUrl": c, "audioUrl": u}
+            for i, t, a, c, u in zip(self.ids, self.titles, self.artists, self.covers, self.audios)
+        ])
+        self.fragments = _column([
+            json.dumps(card, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            for card in self.cards
+        ])
+
+    @classmethod
+    def from_json(cls, path: str) -> "SongTable":
+        # dataset.json, or its newer .jsonl / .columns.npz artifacts
+        return cls(load_catalog(path))
+
+    @classmethod
+    def aligned(cls, ids: Sequence[str], catalog: Sequence[Dict]) -> "SongTable":
+        """Table in embedding-index order: row i is the catalog entry whose id is ids[i]."""
+        by_id = {s.get("id"): s for s in catalog}
+        return cls([by_id.get(song_id) for song_id in ids])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def valid(self, indices) -> np.ndarray:
+        """Drops padding (-1), indices outside the catalog and songs without catalog metadata."""
+        idx = np.asarray(indices, dtype=np.int64)
+        idx = idx[(idx >= 0) & (idx < len(self))]
+        return idx[self.present[idx]]
+
+    def gather(self, indices) -> List[Dict]:
+        return self.cards[self.valid(indices)].tolist()
+
+    def render(self, indices) -> bytes:
+        """JSON array of song cards, e.g. b'[{...},{...}]'."""
+        return b"[" + b",".join(self.fragments[self.valid(indices)]) + b"]"
+
+def _column(values: List) -> np.ndarray:
+    # Object arrays so a ranked index array can gather a whole column in one call
+    col = np.empty(len(values), dtype=object)
+    col[:] = values
+    return col
@@ -1,9 +1,12 @@
 import torch
 import firebase_admin
 from firebase_admin import credentials, firestore
+import itertools
 import os
 import os
 import sys
+import time
+from datetime import datetime, timezone
 
 # Try package import first, then fallback to local
 try:
@@ -20,7 +23,29 @@ except ImportError:
 BASE_DIR = os.path.dirname(os.path.dirname(__file__)) # sonicstream/
 REC_DIR = os.path.join(BASE_DIR, "recommendation_engine")
 GRAPH_PATH = os.path.join(REC_DIR, "graph_data.pt")
-DATASET_PATH = os.path.join(REC_DIR, "dataset.json") # or ../dataset.json
+MODEL_PATH = os.path.join(REC_DIR, "hnn_model.pth")
+EMBEDDINGS_PATH = os.path.join(REC_DIR, "final_embeddings.pt")
+DATASET_PATH = os.path.join(BASE_DIR, "dataset.json") # Training catalog (graph song indices follow its order)
+
+sys.path.append(os.path.abspath(BASE_DIR))
+import numpy as np
+from recommendation_engine.graph_delta import (
+    DELTA_DTYPE, append_delta, delta_path_for, edge_weights, load_checkpoint, merge_edges,
+    pending_delta, save_checkpoint, truncate_delta,
+)
+from recommendation_engine.graph_store import open_store
+from recommendation_engine.song_index import load_or_build_song_index, song_index_path_for
+
+MIN_LISTEN_SECONDS = 10
+# The ingestion buffer stamps `ingested_at` with the Firestore commit time, so
+# the watermark follows write order however late an event is written (WAL
+# replay, flush retries). Each sync still re-reads this far behind the
+# watermark (skipping ids it has already applied) to cover commits that were
+# in flight while the previous sync read, and documents from before the
+# server timestamp, which carry the time their pod queued them.
+SYNC_OVERLAP_SECONDS = 300
+COMPACT_MIN_RECORDS = 50000 # Fold the delta log into the graph once it holds this many records
+MAX_STORE_SHARDS = 64 # Merge the graph store's shards once compactions have appended this many
 
 # Init Firebase (if not already)
 def get_db():
@@ -34,94 +59,200 @@ def get_db():
             return None
     return firestore.client()
 
-def sync_interactions_to_graph():
-    print("Syncing interactions from Firestore to Graph...")
-    
-    # 1. Load existing graph
+def _event_time(data):
+    # Commit time stamped by Firestore (older documents: the pod's time.time() at
+    # submit); documents without it only carry the client's ms timestamp, capped
+    # at now so a skewed clock cannot push the watermark ahead
+    ingested_at = data.get('ingested_at')
+    if ingested_at is not None:
+        return ingested_at.timestamp() if isinstance(ingested_at, datetime) else float(ingested_at)
+    try:
+        return min(float(data.get('timestamp') or 0) / 1000.0, time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+def load_graph():
+    """(store, graph_data): the sharded store and its meta (no edges read), else (None, legacy pickle)."""
+    store = open_store(GRAPH_PATH)
+    if store is not None:
+        return store, store.meta
     if not os.path.exists(GRAPH_PATH):
+        return None, None
+    return None, torch.load(GRAPH_PATH)
+
+def _new_checkpoint(graph_data):
+    return {
+        'generation': graph_data.get('delta_generation', 0),
+        'delta_bytes': 0,
+        'watermark': None,
+        'boundary': {}, # doc id -> event time, for ids within the overlap window of the watermark
+    }
+
+def sync_interactions_to_graph(db=None, compact=False, update_embeddings=True):
+    """
+    Incremental sync: reads only interactions newer than the checkpointed
+    watermark, aggregates them into (user, song, count) records and appends
+    them to the delta log. The graph itself only changes on compaction.
+    With update_embeddings, the affected users are re-embedded with the
+    trained model (online_update.py) so recommendations follow without a retrain.
+    Returns the number of users updated.
+    """
+    print("Syncing interactions from Firestore to Graph...")
+
+    # 1. Load existing graph and checkpoint
+    store, graph_data = load_graph()
+    if graph_data is None:
         print("Graph file not found. Run simulation first.")
-        return
+        return 0
+
+    checkpoint = load_checkpoint(GRAPH_PATH) or _new_checkpoint(graph_data)
+
+    generation = graph_data.get('delta_generation', 0)
+    if checkpoint['generation'] < generation:
+        # A compaction saved the graph but crashed before updating the checkpoint
+        stale = delta_path_for(GRAPH_PATH, checkpoint['generation'])
+        checkpoint.update(generation=generation, delta_bytes=0)
+        save_checkpoint(GRAPH_PATH, checkpoint)
+        if os.path.exists(stale):
+            os.remove(stale)
+    delta_path = delta_path_for(GRAPH_PATH, generation)
+    truncate_delta(delta_path, checkpoint['delta_bytes'])
 
-    graph_data = torch.load(GRAPH_PATH)
-    
-    # Original Edges
-    # [2, E]
-    user_song_edges = graph_data['edge_index_user_song']
-    
-    # 2. Fetch new interactions
-    db = get_db()
-    if not db: return
+    # 2. Fetch interactions past the watermark
+    db = db or get_db()
+    if not db: return 0
 
     interactions_ref = db.collection('interactions')
-    # Optimization: Filter by timestamp > last_sync? For now, fetch all.
-    docs = interactions_ref.stream()
-    
-    new_edges_u = []
-    new_edges_s = []
-    
-    count = 0
+    watermark = checkpoint['watermark']
+    if watermark is None:
+        docs = interactions_ref.stream() # First sync: everything
+    else:
+        since = watermark - SYNC_OVERLAP_SECONDS
+        # Range filters only match one type: server timestamps, then legacy float stamps
+        docs = itertools.chain(
+            interactions_ref.where('ingested_at', '>=', datetime.fromtimestamp(since, timezone.utc)).stream(),
+            interactions_ref.where('ingested_at', '>=', since).stream(),
+        )
+
+    boundary = dict(checkpoint['boundary'])
+    new_uids = []
+    new_song_ids = []
+
+    seen = 0
     for doc in docs:
+        if doc.id in boundary:
+            continue # Applied by a previous sync
         data = doc.to_dict()
-        uid_str = data.get('user_id')
-        song_id_str = data.get('song_id') # Usually "10", "55", etc. from dataset
-        
+        ts = _event_time(data)
+        boundary[doc.id] = ts
+        watermark = ts if watermark is None else max(watermark, ts)
+        seen += 1
+
         # Check if valid listen
-        if data.get('duration_listened', 0) < 10:
+        if data.get('duration_listened', 0) < MIN_LISTEN_SECONDS:
             continue
-            
-        # Map User
-        u_idx = get_user_idx(uid_str, create=True)
-        
-        # Map Song (Assumes song_id matches dataset index for MVP)
-        # In real app, we need a song_id_mapper too if IDs are strings like "s_123"
-        # Our dataset.json has numeric IDs mostly or we parse them.
-        try:
-            s_idx = int(song_id_str)
-        except:
-             # If song_id is 's_10', strip
-             try:
-                s_idx = int(str(song_id_str).replace('s_', ''))
-             except:
-                continue
-
-        new_edges_u.append(u_idx)
-        new_edges_s.append(s_idx)
-        count += 1
-        
-    print(f"Found {count} valid new interactions.")
-    
-    if count == 0:
+
+        new_uids.append(data.get('user_id'))
+        new_song_ids.append(data.get('song_id'))
+
+    if watermark is not None:
+        checkpoint['watermark'] = watermark
+        checkpoint['boundary'] = {i: t for i, t in boundary.items() if t >= watermark - SYNC_OVERLAP_SECONDS}
+
+    # 3. Map Songs (catalog id -> graph index, one batched lookup) and Users
+    song_index = load_or_build_song_index(song_index_path_for(GRAPH_PATH), DATASET_PATH)
+    s_idx = song_index.lookup(new_song_ids)
+    known = (s_idx >= 0) & (s_idx < graph_data['num_songs'])
+    if (~known).any():
+        print(f"Skipped {int((~known).sum())} interactions with songs not in the training catalog.")
+    new_edges_s = s_idx[known]
+    new_edges_u = np.array([get_user_idx(uid, create=True) for uid, ok in zip(new_uids, known) if ok], dtype=np.int64)
+
+    count = len(new_edges_u)
+    print(f"Found {count} valid new interactions ({seen} new documents).")
+
+    # 4. Append aggregated edges to the delta log, then commit the checkpoint
+    if count:
+        pairs, counts = np.unique(np.stack([new_edges_u, new_edges_s]), axis=1, return_counts=True)
+        checkpoint['delta_bytes'] = append_delta(delta_path, pairs[0], pairs[1], counts)
+    save_checkpoint(GRAPH_PATH, checkpoint)
+
+    updated = 0
+    if count and update_embeddings:
+        updated = update_user_embeddings(graph_data, np.unique(new_edges_u))
+
+    pending = checkpoint['delta_bytes'] // DELTA_DTYPE.itemsize
+    if compact or pending >= COMPACT_MIN_RECORDS:
+        compact_graph(graph_data, checkpoint, store)
+    return updated
+
+def update_user_embeddings(graph_data, users):
+    """Re-embeds `users` from the synced graph with the trained model; writes the service overlay."""
+    if not (os.path.exists(MODEL_PATH) and os.path.exists(EMBEDDINGS_PATH)):
+        print("No trained model yet, skipping online embedding update.")
+        return 0
+    from recommendation_engine.online_update import IncrementalUpdater
+
+    start = time.perf_counter()
+    updater = IncrementalUpdater(GRAPH_PATH, MODEL_PATH, EMBEDDINGS_PATH, graph_data=graph_data)
+    loaded = time.perf_counter()
+    updater.save(users, updater.recompute(users))
+    print(f"Re-embedded {len(users)} users in {(time.perf_counter() - loaded) * 1000:.1f} ms "
+          f"(+{(loaded - start) * 1000:.0f} ms loading the model and graph).")
+    return len(users)
+
+def compact_graph(graph_data=None, checkpoint=None, store=None):
+    """Folds the committed delta log into the graph and starts the next log generation."""
+    if graph_data is None:
+        store, graph_data = load_graph()
+    checkpoint = checkpoint or load_checkpoint(GRAPH_PATH) or _new_checkpoint(graph_data)
+    generation = graph_data.get('delta_generation', 0)
+    delta = pending_delta(GRAPH_PATH, graph_data)
+
+    if store is not None:
+        # Sharded store: the delta becomes one more shard, committed together with
+        # the next generation in a single meta.json replace. Nothing is rewritten.
+        store.append_shard(delta['user'], delta['song'], delta['count'], delta_generation=generation + 1)
+        _finish_compaction(checkpoint, generation)
+        print(f"Compacted {len(delta)} delta records into shard {len(store.meta['shards'])} "
+              f"of {store.path} ({store.meta['num_edges']} edges).")
+        if len(store.meta['shards']) > MAX_STORE_SHARDS:
+            store.compact()
+            print(f"Merged graph store into {len(store.meta['shards'])} shard(s).")
         return
 
-    # 3. Merge Edges
-    # Convert to Tensor
-    new_u_tensor = torch.tensor(new_edges_u, dtype=torch.long)
-    new_s_tensor = torch.tensor(new_edges_s, dtype=torch.long)
-    
-    # Stack [ [u...], [s...] ]
-    new_edges_stack = torch.stack([new_u_tensor, new_s_tensor], dim=0)
-    
-    # Concatenate with existing
-    updated_edges = torch.cat([user_song_edges, new_edges_stack], dim=1)
-    
-    # Update Graph Data
-    graph_data['edge_index_user_song'] = updated_edges
-    
-    # Update num_users if needed
-    # We might need to resize if new users > old num_users
-    # For GNN logic, we just need embeddings to exist.
-    # The 'num_users' in graph_data is just metadata usually.
-    # But we should update it.
-    from id_mapper import load_mapping
-    mapping = load_mapping()
-    max_idx = mapping['next_idx']
-    if max_idx > graph_data['num_users']:
-        graph_data['num_users'] = max_idx
-        print(f"Updated num_users to {max_idx}")
-
-    # Save
-    torch.save(graph_data, GRAPH_PATH)
-    print("Graph updated and saved!")
+    edges, weights = merge_edges(
+        graph_data['edge_index_user_song'].numpy(), edge_weights(graph_data),
+        delta['user'], delta['song'], delta['count'],
+    )
+
+    graph_data['edge_index_user_song'] = torch.from_numpy(edges).long()
+    graph_data['edge_weight_user_song'] = torch.from_numpy(weights)
+    graph_data['delta_generation'] = generation + 1
+
+    # Update num_users if new users were mapped
+    if edges.shape[1] and int(edges[0].max()) + 1 > graph_data['num_users']:
+        graph_data['num_users'] = int(edges[0].max()) + 1
+        print(f"Updated num_users to {graph_data['num_users']}")
+
+    # Save (atomically; the checkpoint is only advanced once the graph is durable)
+    tmp = GRAPH_PATH + ".tmp"
+    torch.save(graph_data, tmp)
+    os.replace(tmp, GRAPH_PATH)
+    _finish_compaction(checkpoint, generation)
+    print(f"Compacted {len(delta)} delta records; graph has {edges.shape[1]} unique user-song edges.")
+
+def _finish_compaction(checkpoint, generation):
+    checkpoint.update(generation=generation + 1, delta_bytes=0)
+    save_checkpoint(GRAPH_PATH, checkpoint)
+    old_log = delta_path_for(GRAPH_PATH, generation)
+    if os.path.exists(old_log):
+        os.remove(old_log)
 
 if __name__ == "__main__":
-    sync_interactions_to_graph()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compact", action="store_true", help="Fold the delta log into the graph after syncing")
+    parser.add_argument("--no-embedding-update", action="store_true", help="Only sync the graph")
+    args = parser.parse_args()
+    sync_interactions_to_graph(compact=args.compact, update_embeddings=not args.no_embedding_update)
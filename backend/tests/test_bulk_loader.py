@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.db.bulk_loader import BulkLoader
+from backend.db.local_store import LocalFirestore
+
+# songs.csv repeats some ids with different content. Copies of one id must not
+# race each other across concurrent batches: the last row wins, as with the old
+# sequential loop, and a rerun of an unchanged catalog writes nothing.
+
+def catalog():
+    rows = [(f"t{i:03d}", {"title": f"Song {i}"}) for i in range(200)]
+    for copy in range(7):
+        rows += [(f"d{i:02d}", {"title": f"Dup {i} v{copy}"}) for i in range(40)]
+    return rows
+
+def test_duplicate_ids_keep_last_row_and_rerun_settles(tmp_path):
+    checkpoint = str(tmp_path / "seed.jsonl")
+    db = LocalFirestore()
+
+    first = BulkLoader(db, 'tracks', checkpoint, batch_size=10, workers=8).load(catalog(), progress_every=0)
+    assert first['documents'] == 480
+    assert first['duplicate_ids'] == 240
+    assert first['written'] == 240
+    assert db.collection('tracks').document('d07').get().to_dict() == {"title": "Dup 7 v6"}
+
+    rerun = BulkLoader(db, 'tracks', checkpoint, batch_size=10, workers=8).load(catalog(), progress_every=0)
+    assert rerun['written'] == 0
+    assert rerun['skipped_unchanged'] == 240
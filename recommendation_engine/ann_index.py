@@ -0,0 +1,208 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+# Retrieval indexes over song embeddings (inner-product / MIPS).
+# Both indexes share the same interface:
+#   index.search(queries [B, Dim] float32, k) -> int64 [B, k] song indices (-1 = padding)
+# Pure NumPy so the backend and the offline scripts can share it without extra deps.
+
+INDEX_KINDS = ("exact", "ivf")
+QUERY_CHUNK = 256 # Rows of the [B, NumSongs] score matrix materialized at a time
+
+def _topk_rows(scores, k):
+    """Row-wise top-k (descending) via argpartition + sort of the k survivors."""
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(n), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1).astype(np.int64)
+
+class ExactIndex:
+    kind = "exact"
+
+    def __init__(self, vectors):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def search(self, queries, k, **_):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        out = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        for start in range(0, queries.shape[0], QUERY_CHUNK):
+            chunk = queries[start:start + QUERY_CHUNK]
+            top = _topk_rows(chunk @ self.vectors.T, k)
+            out[start:start + len(chunk), :top.shape[1]] = top
+        return out
+
+class IVFIndex:
+    """
+    Inverted-file index: k-means coarse quantizer + one posting list per centroid.
+    At query time only the `nprobe` closest lists are scored exactly.
+    Lists are stored CSR-style (offsets into a single id array) with the
+    vectors reordered so each list is a contiguous slice.
+    """
+    kind = "ivf"
+
+    def __init__(self, vectors, centroids, ids, offsets, nprobe=8):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.ids = np.ascontiguousarray(ids, dtype=np.int32)
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.vectors = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32)[self.ids])
+        self.nprobe = nprobe
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, vectors, nlist=0, n_iter=20, seed=42, nprobe=8):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = vectors.shape[0]
+        if nlist <= 0:
+            nlist = int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        centroids = _kmeans(vectors, nlist, n_iter, seed)
+        assign = _assign(vectors, centroids)
+
+        ids = np.argsort(assign, kind='stable').astype(np.int32)
+        counts = np.bincount(assign, minlength=nlist)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(vectors, centroids, ids, offsets, nprobe=nprobe)
+
+    def search(self, queries, k, nprobe=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+
+        # 1. Coarse: nearest lists for all queries in one GEMM
+        probes = _topk_rows(queries @ self.centroids.T, nprobe)
+
+        # 2. Fine: exact scores over the union of probed lists, per query
+        out = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        for row, (q, lists) in enumerate(zip(queries, probes)):
+            slices = [np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists]
+            cand = np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+            if cand.size == 0:
+                continue
+            scores = self.vectors[cand] @ q
+            top = _topk_rows(scores[None, :], k)[0]
+            out[row, :top.shape[0]] = self.ids[cand[top]]
+        return out
+
+def _assign(vectors, centroids, chunk=65536):
+    assign = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], chunk):
+        assign[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return assign
+
+def _kmeans(vectors, nlist, n_iter, seed):
+    """Spherical k-means on a sample (centroids kept unit-norm, assignment by dot product)."""
+    rng = np.random.default_rng(seed)
+    n, dim = vectors.shape
+    sample_size = min(n, nlist * 256)
+    sample = vectors[rng.choice(n, sample_size, replace=False)] if sample_size < n else vectors
+    centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+
+    for _ in range(n_iter):
+        assign = _assign(sample, centroids)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=nlist)
+        non_empty = np.nonzero(counts)[0]
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[non_empty]
+
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        centroids[non_empty] = sums
+
+        # Re-seed empty clusters with random sample points
+        empty = np.nonzero(counts == 0)[0]
+        if empty.size:
+            centroids[empty] = sample[rng.choice(sample.shape[0], empty.size, replace=False)]
+
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids.astype(np.float32)
+
+# --- Construction / Persistence ---
+
+def build_index(kind, vectors, nlist=0, nprobe=8):
+    if kind == "exact":
+        return ExactIndex(vectors)
+    if kind == "ivf":
+        return IVFIndex.build(vectors, nlist=nlist, nprobe=nprobe)
+    raise ValueError(f"Unknown index kind '{kind}' (expected one of {INDEX_KINDS})")
+
+def index_path_for(embeddings_path, kind):
+    """final_embeddings.pt -> final_embeddings.<kind>.npz (persisted next to the embeddings)."""
+    return f"{os.path.splitext(embeddings_path)[0]}.{kind}.npz"
+
+def save_index(index, path, checksum):
+    if index.kind == "exact":
+        return # Nothing to persist beyond the embeddings themselves
+    np.savez(path, kind=index.kind, num_vectors=len(index), checksum=checksum,
+             centroids=index.centroids, ids=index.ids, offsets=index.offsets)
+
+def load_index(path, vectors, checksum, nprobe=8):
+    data = np.load(path)
+    if str(data['checksum']) != checksum:
+        raise ValueError("built from different embeddings")
+    if int(data['num_vectors']) != vectors.shape[0]:
+        raise ValueError(f"covers {int(data['num_vectors'])} vectors, embeddings have {vectors.shape[0]}")
+    return IVFIndex(vectors, data['centroids'], data['ids'], data['offsets'], nprobe=nprobe)
+
+def load_or_build_index(kind, vectors, embeddings_path, checksum, nlist=0, nprobe=8):
+    """
+    Loads the persisted index next to the embeddings if it was built from the
+    same embeddings (by checksum), otherwise builds it and tries to persist it
+    for the next start.
+    """
+    if kind == "exact":
+        return ExactIndex(vectors)
+
+    path = index_path_for(embeddings_path, kind)
+    if os.path.exists(path):
+        try:
+            return load_index(path, vectors, checksum, nprobe=nprobe)
+        except Exception as e:
+            print(f"Stale or unreadable index at {path} ({e}), rebuilding.")
+
+    start = time.time()
+    index = build_index(kind, vectors, nlist=nlist, nprobe=nprobe)
+    print(f"Built {kind} index over {len(index)} songs in {time.time() - start:.2f}s")
+    try:
+        save_index(index, path, checksum)
+    except OSError as e:
+        print(f"Could not persist index to {path}: {e}")
+    return index
+
+def main():
+    from embedding_store import load_embeddings
+
+    parser = argparse.ArgumentParser(description="Build the song retrieval index next to final_embeddings.pt")
+    parser.add_argument("--embeddings", default="final_embeddings.pt")
+    parser.add_argument("--kind", default="ivf", choices=INDEX_KINDS)
+    parser.add_argument("--nlist", type=int, default=0, help="Number of IVF lists (0 = 4*sqrt(N))")
+    args = parser.parse_args()
+
+    _, song_emb, checksum = load_embeddings(args.embeddings)
+
+    start = time.time()
+    index = build_index(args.kind, song_emb, nlist=args.nlist)
+    save_index(index, index_path_for(args.embeddings, args.kind), checksum)
+    print(f"Built {args.kind} index over {len(index)} songs in {time.time() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import ExactIndex, IVFIndex
+
+# Recall@k vs latency of the IVF index against exact brute force.
+# Uses clustered synthetic unit vectors (songs cluster by artist/genre in the
+# real embeddings too); pass --embeddings to benchmark the trained ones instead.
+
+def synthetic_embeddings(num_songs, dim, num_clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, num_clusters, num_songs)
+    x = centers[labels] + 0.5 * rng.standard_normal((num_songs, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def recall_at_k(approx, exact):
+    hits = sum(len(set(a[a >= 0]).intersection(e)) for a, e in zip(approx, exact))
+    return hits / exact.size
+
+def time_queries(index, queries, k, batch, **kwargs):
+    """Mean milliseconds per query when issuing `batch` queries per search call."""
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        index.search(queries[i:i + batch], k, **kwargs)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+def run(songs, queries, k, nprobes):
+    print(f"\n=== {songs.shape[0]:,} songs x {songs.shape[1]} dim, {len(queries)} queries, k={k} ===")
+
+    exact = ExactIndex(songs)
+    truth = exact.search(queries, k)
+    exact_ms_1 = time_queries(exact, queries, k, batch=1)
+    exact_ms_64 = time_queries(exact, queries, k, batch=64)
+    print(f"{'index':<16}{'recall@k':>10}{'ms/query (b=1)':>18}{'ms/query (b=64)':>18}")
+    print(f"{'exact':<16}{1.0:>10.3f}{exact_ms_1:>18.3f}{exact_ms_64:>18.3f}")
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(songs)
+    print(f"(ivf build: nlist={ivf.nlist}, {time.perf_counter() - start:.2f}s)")
+
+    for nprobe in nprobes:
+        approx = ivf.search(queries, k, nprobe=nprobe)
+        ms_1 = time_queries(ivf, queries, k, batch=1, nprobe=nprobe)
+        ms_64 = time_queries(ivf, queries, k, batch=64, nprobe=nprobe)
+        label = f"ivf nprobe={nprobe}"
+        print(f"{label:<16}{recall_at_k(approx, truth):>10.3f}{ms_1:>18.3f}{ms_64:>18.3f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--k", type=int, default=40) # Service asks for top_k * 2
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--embeddings", default=None, help="Benchmark a trained final_embeddings.pt instead")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        import torch
+        emb_data = torch.load(args.embeddings, map_location="cpu")
+        songs = emb_data['song_embeddings'].float().numpy()
+        queries = emb_data['user_embeddings'].float().numpy()[:args.queries]
+        run(songs, queries, args.k, args.nprobe)
+        return
+
+    for size in args.sizes:
+        songs = synthetic_embeddings(size, args.dim, num_clusters=max(16, size // 500))
+        rng = np.random.default_rng(1)
+        # Users look like noisy mixtures of the songs they listen to
+        queries = songs[rng.integers(0, size, args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        run(songs, queries, args.k, args.nprobe)
+
+if __name__ == "__main__":
+    main()
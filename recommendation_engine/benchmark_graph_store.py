@@ -0,0 +1,70 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Load time and peak memory of graph_data.pt (pickle) vs graph_data.store/.
+# Each case runs in a fresh interpreter (torch already imported) so its peak
+# RSS is its own; generate a large graph first, e.g.
+#   python simulate_data.py --users 1000000 --pickle
+#   python benchmark_graph_store.py
+
+CASES = {
+    # What sync_graph needs before it has read any interaction
+    'metadata': (
+        "d = torch.load(GRAPH); n = d['num_users']",
+        "from graph_store import open_store; n = open_store(GRAPH).meta['num_users']",
+    ),
+    # What the online updater needs: the neighbourhoods of a few users
+    'user rows': (
+        "d = torch.load(GRAPH); e = d['edge_index_user_song'][0].numpy(); "
+        "rows = [np.flatnonzero(e == u) for u in USERS]",
+        "from graph_store import open_store; s = open_store(GRAPH); rows = [s.neighbours(u) for u in USERS]",
+    ),
+    # Raw edge arrays
+    'edge arrays': (
+        "d = torch.load(GRAPH)",
+        "from graph_store import open_store; d = open_store(GRAPH).to_graph_data()",
+    ),
+    # graph.load_graph_data (training): edges + delta + CSR adjacencies
+    'load_graph_data': (
+        "import graph_store; graph_store.open_store = lambda path: None; "
+        "from graph import load_graph_data; d = load_graph_data(GRAPH)",
+        "from graph import load_graph_data; d = load_graph_data(GRAPH)",
+    ),
+}
+
+CHILD = """
+import contextlib, io, json, resource, time
+import numpy as np, torch # Imported before timing: both formats end up needing torch for training
+GRAPH = {graph!r}
+USERS = list(range(0, 1000, 100))
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    exec({code!r})
+print(json.dumps({{'seconds': time.perf_counter() - start,
+                  'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+def measure(graph, code):
+    out = subprocess.run([sys.executable, "-c", CHILD.format(graph=graph, code=code)],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graph", default="graph_data.pt", help="Needs both the pickle and the store")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    args = parser.parse_args()
+
+    baseline = measure(args.graph, "pass") # Interpreter + numpy + torch
+    print(f"(baseline interpreter: {baseline['rss_mb']:.0f} MB)")
+    print(f"{'case':<18}{'pickle s':>10}{'store s':>10}{'speedup':>9}{'pickle MB':>11}{'store MB':>10}")
+    for name in args.cases:
+        pickle_code, store_code = CASES[name]
+        p, s = measure(args.graph, pickle_code), measure(args.graph, store_code)
+        print(f"{name:<18}{p['seconds']:>10.2f}{s['seconds']:>10.2f}{p['seconds'] / s['seconds']:>8.1f}x"
+              f"{p['rss_mb']:>11.0f}{s['rss_mb']:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+
+import numpy as np
+import torch
+
+import train as cfg
+from graph import build_adjacency, load_graph_data, to_sparse_csr
+from train_engine import TrainingEngine
+
+# Compares negative sampling strategies by held-out Recall@K per epoch.
+# One random edge per user (with at least two) is held out of both message
+# passing and training; after every epoch the user's top K songs, excluding
+# training positives, are checked for the held-out song. --synthetic builds
+# a graph with genre structure (users listen mostly within their genres, with
+# popularity skew) so recall measures more than popularity.
+
+STRATEGIES = {
+    'uniform':         dict(distribution="uniform", filter_positives=False),
+    'uniform+filter':  dict(distribution="uniform"),
+    'uniform+inbatch': dict(distribution="uniform", in_batch_ratio=0.25),
+    'uniform+hard':    dict(distribution="uniform", hard_ratio=0.25),
+    'popularity':      dict(distribution="popularity"),
+}
+
+def synthetic_graph(path, num_users, num_songs, num_artists, listens_per_user, num_genres=50, seed=0):
+    rng = np.random.default_rng(seed)
+    song_genre = rng.integers(0, num_genres, num_songs)
+    artist_genre = rng.integers(0, num_genres, num_artists)
+    # Each song by an artist of its genre
+    artists_by_genre = [np.flatnonzero(artist_genre == g) for g in range(num_genres)]
+    song_artist = np.array([rng.choice(artists_by_genre[g]) if len(artists_by_genre[g]) else rng.integers(num_artists)
+                            for g in song_genre])
+    popularity = rng.pareto(1.2, num_songs) + 1
+    songs_by_genre = [np.flatnonzero(song_genre == g) for g in range(num_genres)]
+    genre_p = [popularity[idx] / popularity[idx].sum() for idx in songs_by_genre]
+
+    users, songs = [], []
+    for u in range(num_users):
+        genres = rng.choice(num_genres, 2, replace=False)
+        n = rng.integers(listens_per_user // 2, listens_per_user * 2)
+        in_genre = rng.random(n) < 0.9
+        picks = rng.choice(genres, n)
+        drawn = [rng.choice(songs_by_genre[g], p=genre_p[g]) for g in picks[in_genre]]
+        drawn += list(rng.choice(num_songs, (~in_genre).sum(), p=popularity / popularity.sum()))
+        users += [u] * len(drawn)
+        songs += drawn
+    pairs = np.unique(np.stack([users, songs]), axis=1)
+    torch.save({
+        'num_users': num_users,
+        'num_songs': num_songs,
+        'num_artists': num_artists,
+        'edge_index_user_song': torch.from_numpy(pairs).long(),
+        'edge_index_song_artist': torch.from_numpy(np.stack([np.arange(num_songs), song_artist])).long(),
+    }, path)
+    print(f"Synthetic graph: {num_users:,} users, {num_songs:,} songs, {pairs.shape[1]:,} edges -> {path}")
+
+def holdout_split(data, seed=0):
+    rng = np.random.default_rng(seed)
+    edges = data['user_song_edges'].numpy()
+    weights = data['user_song_weights'].numpy()
+    order = np.lexsort((rng.random(edges.shape[1]), edges[0]))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = edges[0, order[1:]] != edges[0, order[:-1]]
+    degree = np.bincount(edges[0], minlength=data['num_users'])
+    test = order[first & (degree[edges[0, order]] > 1)]
+    keep = np.ones(edges.shape[1], dtype=bool)
+    keep[test] = False
+
+    train = dict(data)
+    train['user_song_edges'] = torch.from_numpy(edges[:, keep])
+    train['user_song_weights'] = torch.from_numpy(weights[keep])
+    train['user_song_csr'] = to_sparse_csr(*build_adjacency(
+        edges[0, keep], edges[1, keep], data['num_users'], data['num_songs'], weights[keep], data['aggregation']),
+        (data['num_users'], data['num_songs']))
+    return train, edges[0, test], edges[1, test]
+
+@torch.no_grad()
+def recall_at_k(u_emb, s_emb, train_edges, test_u, test_s, k):
+    scores = u_emb[torch.from_numpy(test_u)] @ s_emb.T
+    # Mask the users' training positives
+    row_of = {u: i for i, u in enumerate(test_u.tolist())}
+    tu, ts = train_edges[0].numpy(), train_edges[1].numpy()
+    mask = np.isin(tu, test_u)
+    rows = np.fromiter((row_of[u] for u in tu[mask]), dtype=np.int64)
+    scores[torch.from_numpy(rows), torch.from_numpy(ts[mask])] = -float('inf')
+    top = scores.topk(k, dim=1).indices
+    return (top == torch.from_numpy(test_s)[:, None]).any(dim=1).float().mean().item()
+
+def run(data, test_u, test_s, mode, epochs, k, options, seed=0):
+    torch.manual_seed(seed)
+    model, optimizers = cfg.build_model(data, mode)
+    sampler = cfg.build_sampler(data, mode, seed=seed)
+    negatives = cfg.build_negative_sampler(data, model, seed=seed, **options)
+    edges = data['user_song_edges']
+    engine = TrainingEngine(edges[0], edges[1], data['num_songs'], cfg.BATCH_SIZE, optimizers,
+                            verbose=False, negative_sampler=negatives)
+    batch_loss = cfg.sampled_batch_loss(model.forward_sampled, sampler)
+
+    recalls = []
+    for _ in range(epochs):
+        model.train()
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.fit(1, batch_loss)
+        u_emb, s_emb = cfg.final_embeddings(model, data, sampler, mode)
+        recalls.append(recall_at_k(u_emb, s_emb, edges, test_u, test_s, k))
+    seconds = sum(h['seconds'] for h in engine.history)
+    return recalls, seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graph", default="graph_data.pt")
+    parser.add_argument("--mode", choices=["full", "minibatch"], default="full")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--target", type=float, help="Recall@K to reach (default: 90%% of the best uniform recall)")
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument("--synthetic", type=int, nargs=4, metavar=("USERS", "SONGS", "ARTISTS", "LISTENS_PER_USER"))
+    args = parser.parse_args()
+
+    graph = args.graph
+    if args.synthetic:
+        graph = os.path.join(tempfile.gettempdir(), "benchmark_negatives_graph.pt")
+        synthetic_graph(graph, *args.synthetic)
+    data, test_u, test_s = holdout_split(load_graph_data(graph, cfg.AGGREGATION))
+    print(f"Held out {len(test_u)} edges; Recall@{args.k} over {args.epochs} epochs ({args.mode})")
+
+    results = {name: run(data, test_u, test_s, args.mode, args.epochs, args.k, STRATEGIES[name])
+               for name in args.strategies}
+    target = args.target or 0.9 * max(results.get('uniform', next(iter(results.values())))[0])
+
+    print(f"\n{'strategy':<22}{'best recall':>12}{'final recall':>14}{'epochs to ' + format(target, '.3f'):>18}{'train s':>10}")
+    for name, (recalls, seconds) in results.items():
+        reached = next((i + 1 for i, r in enumerate(recalls) if r >= target), None)
+        print(f"{name:<22}{max(recalls):>12.3f}{recalls[-1]:>14.3f}{reached or '-':>18}{seconds:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+# Compares the train.py modes (epoch / full / minibatch) on the same graph:
+# mean epoch time, samples/sec and peak RSS. Each mode runs in its own
+# process so peak RSS is not shared between runs. --synthetic builds a
+# random graph with power-law user activity to test scaling beyond the demo data.
+# --workers 1 2 4 repeats each mode with that many data-parallel processes
+# (train.py --workers) to show epoch time vs number of workers.
+# --kernel compares one full-graph forward + backward with edge-list
+# (index_add) vs sparse CSR (torch.sparse.mm) aggregation instead.
+
+def synthetic_graph(path, num_users, num_songs, num_artists, num_edges, seed=0):
+    rng = np.random.default_rng(seed)
+    activity = rng.pareto(1.5, num_users) + 1
+    users = rng.choice(num_users, num_edges, p=activity / activity.sum())
+    popularity = rng.pareto(1.2, num_songs) + 1
+    songs = rng.choice(num_songs, num_edges, p=popularity / popularity.sum())
+    pairs = np.unique(np.stack([users, songs]), axis=1)
+    torch.save({
+        'num_users': num_users,
+        'num_songs': num_songs,
+        'num_artists': num_artists,
+        'edge_index_user_song': torch.from_numpy(pairs).long(),
+        'edge_index_song_artist': torch.from_numpy(np.stack([np.arange(num_songs), rng.integers(0, num_artists, num_songs)])).long(),
+    }, path)
+    print(f"Synthetic graph: {num_users:,} users, {num_songs:,} songs, {pairs.shape[1]:,} edges -> {path}")
+
+def run_mode(mode, graph, epochs, workers=1):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        report = f.name
+    try:
+        cmd = [sys.executable, "train.py", "--mode", mode, "--epochs", str(epochs),
+               "--graph", graph, "--no-save", "--report", report, "--workers", str(workers)]
+        result = subprocess.run(cmd, cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"{mode} x{workers} failed:\n{result.stderr[-2000:]}")
+            return None
+        with open(report) as f:
+            return json.load(f)
+    finally:
+        os.remove(report)
+
+def bench_kernel(graph, repeats=3):
+    from graph import load_graph_data
+    from model import HeteroGNN
+    from train_engine import current_rss_mb
+
+    data = load_graph_data(graph)
+    model = HeteroGNN(data['num_users'], data['num_songs'], data['num_artists'])
+    layouts = {
+        'edge list': (data['user_song_edges'], data['song_artist_edges']),
+        'sparse csr': (data['user_song_csr'], data['song_artist_csr']),
+    }
+    print(f"{'aggregation':<14}{'fwd+bwd s':>12}{'RSS delta MB':>14}")
+    for name, (us, sa) in layouts.items():
+        times, growth = [], []
+        for _ in range(repeats):
+            model.zero_grad()
+            before = current_rss_mb() or 0
+            start = time.perf_counter()
+            u, s = model(us, sa)
+            (u.sum() + s.sum()).backward()
+            times.append(time.perf_counter() - start)
+            growth.append((current_rss_mb() or 0) - before)
+            del u, s
+        print(f"{name:<14}{min(times):>12.3f}{max(growth):>14,.0f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graph", default="graph_data.pt")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["epoch", "full", "minibatch"])
+    parser.add_argument("--synthetic", type=int, nargs=4, metavar=("USERS", "SONGS", "ARTISTS", "EDGES"))
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="Worker counts to compare")
+    parser.add_argument("--kernel", action="store_true", help="Compare aggregation kernels instead of train modes")
+    args = parser.parse_args()
+
+    graph = os.path.abspath(args.graph)
+    if args.synthetic:
+        graph = os.path.join(tempfile.gettempdir(), "benchmark_graph.pt")
+        synthetic_graph(graph, *args.synthetic)
+    if args.kernel:
+        bench_kernel(graph)
+        return
+
+    print(f"CPU cores: {os.cpu_count()}")
+    print(f"{'mode':<12}{'workers':>8}{'epoch s':>10}{'speedup':>9}{'samples/s':>14}{'peak RSS MB':>14}{'final loss':>12}")
+    for mode in args.modes:
+        baseline = None
+        for workers in args.workers:
+            if workers > 1 and mode == "epoch":
+                continue # Data-parallel runs cover the per-batch modes only
+            r = run_mode(mode, graph, args.epochs, workers)
+            if not r:
+                continue
+            baseline = baseline or r['mean_epoch_seconds']
+            print(f"{mode:<12}{workers:>8}{r['mean_epoch_seconds']:>10.2f}{baseline / r['mean_epoch_seconds']:>8.2f}x"
+                  f"{r['mean_samples_per_sec']:>14,.0f}{r['peak_rss_mb'] or 0:>14,.0f}{r['final_loss']:>12.3f}")
+
+if __name__ == "__main__":
+    main()
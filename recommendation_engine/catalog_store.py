@@ -0,0 +1,320 @@
+import argparse
+import gc
+import json
+import os
+import time
+from array import array
+from contextlib import contextmanager
+from operator import itemgetter
+
+import numpy as np
+
+# Song catalog artifacts next to dataset.json.
+#
+#   dataset.json          <- legacy: one indented JSON array, fully parsed on load
+#   dataset.jsonl         <- one compact JSON object per line (streamable)
+#   dataset.columns.npz   <- columnar binary: per field either an int64/float64
+#                            array or the UTF-8 values joined by NUL bytes, plus
+#                            the row indices missing the field
+#
+# Writers stream rows into both (CatalogWriter); readers go through
+# load_catalog() / load_columns(), which pick the newest artifact present
+# (columns, then jsonl, then json on equal mtimes). Decoding a string column is
+# one bytes.decode + str.split and a JSON column is one json.loads, so loading
+# the columnar catalog costs little more than building the row dicts, and
+# load_columns(path, ['id']) skips the dicts altogether.
+
+COLUMN_KINDS = ("str", "int", "float", "json") # json = any other value, stored as its JSON text
+
+def catalog_paths(dataset_path):
+    base = os.path.splitext(dataset_path)[0]
+    return {
+        'json': dataset_path,
+        'jsonl': f"{base}.jsonl",
+        'columns': f"{base}.columns.npz",
+    }
+
+def catalog_source(dataset_path):
+    """(format, path) of the artifact load_catalog reads, or (None, None) if there is none."""
+    found = [(os.path.getmtime(path), -rank, fmt, path)
+             for rank, (fmt, path) in enumerate(reversed(list(catalog_paths(dataset_path).items())))
+             if os.path.exists(path)]
+    if not found:
+        return None, None
+    _, _, fmt, path = max(found)
+    return fmt, path
+
+def catalog_exists(dataset_path):
+    return catalog_source(dataset_path)[0] is not None
+
+_MISSING = object()
+_PLACEHOLDER = {"str": "", "int": 0, "float": 0.0, "json": None} # Stored for missing fields
+_encode_json = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+def _kind_of(values):
+    """Column kind that holds every value in `values` exactly."""
+    types = set(map(type, values))
+    if types == {str}:
+        return "str"
+    if types == {int} and -2**63 <= min(values) and max(values) < 2**63:
+        return "int"
+    return "float" if types == {float} else "json"
+
+class _Column:
+    """One column being written: NUL-joined UTF-8 text (str / json) or a typed array."""
+    def __init__(self, kind, rows_before):
+        self.kind = kind
+        self.values = bytearray() if kind in ("str", "json") else array('q' if kind == "int" else 'd')
+        self.missing = array('q')
+        if rows_before:
+            self.extend([_MISSING] * rows_before, 0)
+
+    def extend(self, values, first_row):
+        if not len(values):
+            return
+        missing = [i for i, v in enumerate(values) if v is _MISSING]
+        if missing:
+            self.missing.extend(first_row + i for i in missing)
+            values = list(values)
+            for i in missing:
+                values[i] = _PLACEHOLDER[self.kind]
+
+        if self.kind != "json" and _kind_of(values) != self.kind:
+            # Mixed types (e.g. ints and floats) fall back to JSON text so values round-trip exactly
+            old = self.decode()
+            self.kind, self.values = "json", bytearray()
+            self.extend(old, 0)
+
+        if self.kind == "str":
+            joined = "\x00".join(values)
+            if joined.count("\x00") != len(values) - 1: # A value contains NUL itself
+                old = self.decode()
+                self.kind, self.values = "json", bytearray()
+                self.extend(old, 0)
+                self.extend(values, 0)
+                return
+            self.values += joined.encode('utf-8') + b"\x00"
+        elif self.kind == "json":
+            if values.count(values[0]) == len(values): # e.g. an all-empty "lyrics" column
+                text = "\x00".join([_encode_json(values[0])] * len(values))
+            else:
+                text = "\x00".join(map(_encode_json, values))
+            self.values += text.encode('utf-8') + b"\x00"
+        else:
+            self.values.extend(values)
+
+    def decode(self):
+        """Column values as a list (placeholders included)."""
+        return _decode_values(self.values if self.kind in ("int", "float") else bytes(self.values), self.kind)
+
+class CatalogWriter:
+    """
+    Streams catalog rows into dataset.jsonl and (on close) dataset.columns.npz.
+    Rows are buffered CHUNK_ROWS at a time and appended column by column as
+    packed bytes / typed arrays, so no row dicts are kept. Files are written
+    under temporary names and renamed by close().
+    """
+    CHUNK_ROWS = 10000
+
+    def __init__(self, dataset_path, write_json=False):
+        self.paths = catalog_paths(dataset_path)
+        self.write_json = write_json
+        self.columns = {}
+        self.rows = 0
+        self._chunk = []
+        self._jsonl = open(self.paths['jsonl'] + ".tmp", 'w', encoding='utf-8')
+        self._json = open(self.paths['json'] + ".tmp", 'w', encoding='utf-8') if write_json else None
+
+    def append(self, row):
+        self._chunk.append(row)
+        if len(self._chunk) >= self.CHUNK_ROWS:
+            self._flush()
+
+    def _flush(self):
+        chunk, self._chunk = self._chunk, []
+        if not chunk:
+            return
+        lines = "\n".join(map(_encode_json, chunk))
+        self._jsonl.write(lines + "\n")
+        if self._json is not None:
+            self._json.write(("[" if not self.rows else ",\n") + lines.replace("\n", ",\n"))
+
+        key_sets = set(map(tuple, map(dict.keys, chunk)))
+        names = list(dict.fromkeys(name for keys in key_sets for name in keys))
+        for name in names:
+            if len(key_sets) == 1:
+                values = list(map(itemgetter(name), chunk))
+            else:
+                values = [row.get(name, _MISSING) for row in chunk]
+            column = self.columns.get(name)
+            if column is None:
+                present = [v for v in values if v is not _MISSING]
+                column = self.columns[name] = _Column(_kind_of(present) if present else "json", self.rows)
+            column.extend(values, self.rows)
+        for name, column in self.columns.items():
+            if name not in names:
+                column.extend([_MISSING] * len(chunk), self.rows)
+        self.rows += len(chunk)
+
+    def close(self):
+        self._flush()
+        self._jsonl.close()
+        if self._json is not None:
+            self._json.write("]\n" if self.rows else "[]\n")
+            self._json.close()
+
+        arrays = {'schema': np.array(json.dumps({
+            'rows': self.rows,
+            'columns': {name: column.kind for name, column in self.columns.items()},
+        }))}
+        for name, column in self.columns.items():
+            if column.kind in ("str", "json"):
+                arrays[f"{name}.values"] = np.frombuffer(column.values, dtype=np.uint8)
+            else:
+                arrays[f"{name}.values"] = np.frombuffer(column.values, dtype=np.int64 if column.kind == "int" else np.float64)
+            if len(column.missing):
+                arrays[f"{name}.missing"] = np.frombuffer(column.missing, dtype=np.int64)
+        tmp = self.paths['columns'] + ".tmp.npz"
+        np.savez(tmp, **arrays)
+
+        # Columns last: with equal mtimes it is the artifact readers prefer
+        if self.write_json:
+            os.replace(self.paths['json'] + ".tmp", self.paths['json'])
+        os.replace(self.paths['jsonl'] + ".tmp", self.paths['jsonl'])
+        os.replace(tmp, self.paths['columns'])
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._jsonl.close()
+            if self._json is not None:
+                self._json.close()
+
+def _decode_values(raw, kind):
+    """Values of a packed column: a number array, or NUL-terminated UTF-8 text."""
+    if kind in ("int", "float"):
+        return raw.tolist()
+    text = raw.decode('utf-8')
+    if kind == "str":
+        return text.split("\x00")[:-1]
+    # JSON text never contains a raw NUL: the whole column parses as one JSON array
+    return json.loads("[" + text[:-1].replace("\x00", ",") + "]")
+
+def _decode_column(data, name, kind):
+    raw = data[f"{name}.values"]
+    return _decode_values(raw if kind in ("int", "float") else raw.tobytes(), kind)
+
+@contextmanager
+def _gc_paused():
+    # Millions of new dicts would otherwise trigger repeated cyclic-GC passes over them
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def load_columns(dataset_path, fields=None):
+    """
+    {field: list of values} for `fields` (default all) in catalog order; rows
+    missing a field hold None. Reads the columnar artifact when it is the
+    newest, else falls back to building the columns from the rows.
+    """
+    fmt, path = catalog_source(dataset_path)
+    if fmt is None:
+        raise FileNotFoundError(f"No catalog at {dataset_path}")
+    if fmt != "columns":
+        rows = load_catalog(dataset_path)
+        names = fields if fields is not None else list(dict.fromkeys(k for row in rows for k in row))
+        return {name: [row.get(name) for row in rows] for name in names}
+
+    with np.load(path) as data, _gc_paused():
+        schema = json.loads(data['schema'].item())
+        columns = {}
+        for name in (fields if fields is not None else schema['columns']):
+            kind = schema['columns'].get(name)
+            if kind is None:
+                columns[name] = [None] * schema['rows']
+                continue
+            values = _decode_column(data, name, kind)
+            if f"{name}.missing" in data.files:
+                for i in data[f"{name}.missing"].tolist():
+                    values[i] = None
+            columns[name] = values
+    return columns
+
+def load_catalog(dataset_path, fmt="auto"):
+    """
+    The catalog as a list of track dicts.
+      fmt="auto":                  the newest artifact present (catalog_source)
+      fmt="columns"/"jsonl"/"json": that artifact
+    """
+    path = catalog_paths(dataset_path).get(fmt)
+    if fmt == "auto":
+        fmt, path = catalog_source(dataset_path)
+    if path is None or not os.path.exists(path):
+        raise FileNotFoundError(f"No catalog at {dataset_path}")
+    with _gc_paused():
+        return _load_rows(fmt, path)
+
+def _load_rows(fmt, path):
+    if fmt == "json":
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if fmt == "jsonl":
+        # Compact JSON lines never contain a raw newline: parse the file as one array
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.loads("[" + ",".join(filter(str.strip, f.read().split("\n"))) + "]")
+
+    with np.load(path) as data:
+        schema = json.loads(data['schema'].item())
+        names = list(schema['columns'])
+        rows = [dict(zip(names, values)) for values in
+                zip(*(_decode_column(data, name, schema['columns'][name]) for name in names))]
+        for name in names:
+            if f"{name}.missing" in data.files:
+                for i in data[f"{name}.missing"].tolist():
+                    del rows[i][name]
+    return rows
+
+def iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes dataset.jsonl + dataset.columns.npz for an existing dataset.json")
+    parser.add_argument("dataset", nargs="?", default="../dataset.json")
+    parser.add_argument("--benchmark", action="store_true", help="Time load_catalog from each artifact")
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        start = time.perf_counter()
+        with open(args.dataset, 'r', encoding='utf-8') as f:
+            tracks = json.load(f)
+        with CatalogWriter(args.dataset) as writer:
+            for track in tracks:
+                writer.append(track)
+        elapsed = time.perf_counter() - start
+        print(f"Wrote {writer.rows} tracks in {elapsed:.2f}s ({writer.rows / elapsed:,.0f} rows/s) "
+              f"-> {catalog_paths(args.dataset)['jsonl']}, {catalog_paths(args.dataset)['columns']}")
+        return
+
+    for fmt, path in catalog_paths(args.dataset).items():
+        if os.path.exists(path):
+            start = time.perf_counter()
+            rows = len(load_catalog(args.dataset, fmt))
+            print(f"{fmt:<8}{os.path.getsize(path) / 1e6:>10.1f} MB{time.perf_counter() - start:>9.2f}s  ({rows:,} rows)")
+    start = time.perf_counter()
+    ids = load_columns(args.dataset, ['id'])['id']
+    print(f"ids only: {len(ids):,} in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import contextlib
+import io
+import json
+import os
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+
+import train as cfg
+from graph import load_graph_data
+from train_engine import TrainingEngine
+
+# Data-parallel BPR training across CPU cores with torch.distributed (gloo).
+#
+# One process per worker. Every rank loads the graph and holds a full model
+# replica; the positive edges are split into equal shards and each rank
+# trains on its shard with batch BATCH_SIZE // workers, so a step covers the
+# same global batch as single-process training. DDP averages the gradients
+# (dense buckets for the linear layers, sparse rows for the embeddings in
+# minibatch mode) during backward, so every replica takes the same step and
+# rank 0 can save the result.
+
+class SampledForward(nn.Module):
+    """Routes DDP's forward to HeteroGNN.forward_sampled."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, batch):
+        return self.model.forward_sampled(batch)
+
+def shard_edges(edges, rank, world_size, seed=0):
+    """Equal-sized random shard of the [2, E] edges (drops E % world_size, so batch counts match)."""
+    perm = torch.randperm(edges.shape[1], generator=torch.Generator().manual_seed(seed))
+    per_rank = edges.shape[1] // world_size
+    idx = perm[rank * per_rank:(rank + 1) * per_rank]
+    return edges[0][idx], edges[1][idx]
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _worker(rank, world_size, port, mode, epochs, graph_path, save, report_path):
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    # Split the cores between workers instead of each using all of them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) if rank else contextlib.nullcontext():
+            data = load_graph_data(graph_path, cfg.AGGREGATION)
+
+        torch.manual_seed(0) # Same init everywhere (DDP also broadcasts rank 0's weights)
+        model, optimizers = cfg.build_model(data, mode)
+        ddp = DistributedDataParallel(SampledForward(model))
+        sampler = cfg.build_sampler(data, mode, seed=rank)
+        torch.manual_seed(rank) # Different shuffles and negatives per rank
+
+        train_u, train_s = shard_edges(data['user_song_edges'], rank, world_size)
+        engine = TrainingEngine(train_u, train_s, data['num_songs'], max(1, cfg.BATCH_SIZE // world_size),
+                                optimizers, verbose=(rank == 0),
+                                negative_sampler=cfg.build_negative_sampler(data, model, seed=rank))
+        model.train()
+        engine.fit(epochs, cfg.sampled_batch_loss(ddp, sampler))
+
+        # Every rank runs the same number of batches: loss = mean over ranks, throughput = sum
+        totals = torch.tensor([[h['loss'], h['samples_per_sec']] for h in engine.history], dtype=torch.float64)
+        dist.all_reduce(totals)
+        if rank != 0:
+            return
+
+        for h, (loss, rate) in zip(engine.history, totals.tolist()):
+            h['loss'], h['samples_per_sec'] = loss / world_size, rate
+        summary = engine.summary()
+        summary['workers'] = world_size
+        print(f"[{world_size} workers] Mean epoch {summary['mean_epoch_seconds']:.2f}s | "
+              f"{summary['mean_samples_per_sec']:,.0f} samples/s | peak RSS per worker {summary['peak_rss_mb'] or 0:,.0f} MB")
+        if report_path:
+            with open(report_path, 'w') as f:
+                json.dump({'mode': mode, **summary, 'history': engine.history}, f, indent=2)
+        if save:
+            cfg.save_outputs(model, *cfg.final_embeddings(model, data, sampler, mode))
+    finally:
+        dist.destroy_process_group()
+
+def train_parallel(world_size, mode="minibatch", epochs=cfg.EPOCHS, graph_path="graph_data.pt", save=True, report_path=None):
+    if mode == "epoch":
+        raise ValueError("Data-parallel training supports the per-batch modes (full, minibatch), not 'epoch'")
+    print(f"Training on {world_size} CPU workers (gloo, {mode})...")
+    mp.spawn(_worker, args=(world_size, _free_port(), mode, epochs, graph_path, save, report_path),
+             nprocs=world_size, join=True)
@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+# Memory-mappable embedding store.
+#
+#   final_embeddings.pt         <- torch pickle (training artifact, fully deserialized on load)
+#   final_embeddings.user.npy   <- raw [NumUsers, Dim] array
+#   final_embeddings.song.npy   <- raw [NumSongs, Dim] array
+#   final_embeddings.meta.json  <- dtype, shapes, checksum, aggregation (written last = export complete)
+#   final_embeddings.user_updates.npz <- users re-embedded online since training
+#                                        (online_update.py), tied to the base checksums
+#
+# The .npy files are opened with mmap_mode='r', so every uvicorn worker maps
+# the same page-cache pages instead of holding its own deserialized copy, and
+# startup cost no longer grows with the catalog. float32 is zero-copy for
+# serving; float16 halves disk/page cache but is upcast when scored.
+
+STORE_DTYPES = ("float32", "float16")
+
+def store_paths(embeddings_path):
+    base = os.path.splitext(embeddings_path)[0]
+    return {
+        'user': f"{base}.user.npy",
+        'song': f"{base}.song.npy",
+        'meta': f"{base}.meta.json",
+    }
+
+def _file_sha256(path, digest, chunk_size=1 << 20):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+
+def export_embeddings(user_emb, song_emb, embeddings_path, dtype="float32", aggregation=None):
+    """Writes the .npy pair and the meta file. Readers never observe a half-written store."""
+    if dtype not in STORE_DTYPES:
+        raise ValueError(f"Unsupported dtype '{dtype}' (expected one of {STORE_DTYPES})")
+    paths = store_paths(embeddings_path)
+
+    digest = hashlib.sha256()
+    for key, arr in (('user', user_emb), ('song', song_emb)):
+        tmp_path = paths[key] + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(arr, dtype=dtype))
+        _file_sha256(tmp_path, digest)
+        os.replace(tmp_path, paths[key])
+
+    meta = {
+        'dtype': dtype,
+        'num_users': int(user_emb.shape[0]),
+        'num_songs': int(song_emb.shape[0]),
+        'dim': int(song_emb.shape[1]),
+        'checksum': digest.hexdigest(),
+        'created_at': time.time(),
+    }
+    if aggregation is not None:
+        meta['aggregation'] = aggregation # How the model aggregated neighbours (online_update.py)
+    tmp_meta = paths['meta'] + ".tmp"
+    with open(tmp_meta, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, paths['meta'])
+    return meta
+
+def has_store(embeddings_path):
+    return os.path.exists(store_paths(embeddings_path)['meta'])
+
+def load_store(embeddings_path, mmap=True):
+    """Returns (user_emb, song_emb, meta); arrays are read-only memory maps when mmap=True."""
+    paths = store_paths(embeddings_path)
+    with open(paths['meta'], 'r') as f:
+        meta = json.load(f)
+    mode = 'r' if mmap else None
+    user_emb = np.load(paths['user'], mmap_mode=mode)
+    song_emb = np.load(paths['song'], mmap_mode=mode)
+    return user_emb, song_emb, meta
+
+def source_mtime(embeddings_path):
+    """Latest modification time of either embeddings format (0 if neither exists)."""
+    candidates = [embeddings_path, store_paths(embeddings_path)['meta']]
+    return max((os.path.getmtime(p) for p in candidates if os.path.exists(p)), default=0.0)
+
+def load_embeddings(embeddings_path, fmt="auto", mmap=True):
+    """
+    Loads (user_emb, song_emb, checksum) as NumPy arrays from either format.
+      fmt="npy":  the memory-mapped store
+      fmt="pt":   the torch pickle (checksum = sha256 of the file)
+      fmt="auto": the store if present and at least as new as the pickle, else the pickle
+    """
+    if _use_store(embeddings_path, fmt):
+        user_emb, song_emb, meta = load_store(embeddings_path, mmap=mmap)
+        return user_emb, song_emb, meta['checksum']
+
+    import torch
+    emb_data = torch.load(embeddings_path, map_location="cpu")
+    digest = hashlib.sha256()
+    _file_sha256(embeddings_path, digest)
+    return (emb_data['user_embeddings'].float().numpy(),
+            emb_data['song_embeddings'].float().numpy(),
+            digest.hexdigest())
+
+def _use_store(embeddings_path, fmt):
+    if fmt == "auto" and has_store(embeddings_path):
+        meta_path = store_paths(embeddings_path)['meta']
+        return not os.path.exists(embeddings_path) or os.path.getmtime(meta_path) >= os.path.getmtime(embeddings_path)
+    return fmt == "npy"
+
+def embedding_aggregation(embeddings_path, fmt="auto", default="sum"):
+    """
+    Neighbour aggregation the embeddings were trained with, from the store's
+    meta file. Only a pickle without a store (or a store exported before the
+    field existed) is unpickled to read it.
+    """
+    if _use_store(embeddings_path, fmt):
+        with open(store_paths(embeddings_path)['meta'], 'r') as f:
+            aggregation = json.load(f).get('aggregation')
+        if aggregation is not None or not os.path.exists(embeddings_path):
+            return aggregation or default
+    import torch
+    return torch.load(embeddings_path, map_location="cpu").get('aggregation', default)
+
+def user_updates_path(embeddings_path):
+    return f"{os.path.splitext(embeddings_path)[0]}.user_updates.npz"
+
+def embedding_checksums(embeddings_path):
+    """Every checksum load_embeddings can report for the current files (store and pickle)."""
+    checksums = []
+    if has_store(embeddings_path):
+        with open(store_paths(embeddings_path)['meta'], 'r') as f:
+            checksums.append(json.load(f)['checksum'])
+    if os.path.exists(embeddings_path):
+        digest = hashlib.sha256()
+        _file_sha256(embeddings_path, digest)
+        checksums.append(digest.hexdigest())
+    return checksums
+
+def load_user_updates(embeddings_path, checksum):
+    """(user_idx, vectors) updated on top of the embeddings with `checksum`, or None."""
+    path = user_updates_path(embeddings_path)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if checksum not in data['checksums'].tolist():
+            return None # Written against older embeddings; superseded by the retrain
+        return data['user_idx'], data['vectors']
+
+def save_user_updates(embeddings_path, checksums, user_idx, vectors):
+    """Merges updated user vectors into the overlay (later updates win). Atomic."""
+    user_idx = np.asarray(user_idx, dtype=np.int64)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    existing = load_user_updates(embeddings_path, checksums[0]) if checksums else None
+    if existing is not None:
+        keep = ~np.isin(existing[0], user_idx)
+        user_idx = np.concatenate([existing[0][keep], user_idx])
+        vectors = np.concatenate([existing[1][keep], vectors])
+
+    path = user_updates_path(embeddings_path)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, checksums=np.array(checksums), user_idx=user_idx, vectors=vectors)
+    os.replace(tmp, path)
+    return len(user_idx)
+
+def main():
+    import torch
+
+    parser = argparse.ArgumentParser(description="Convert final_embeddings.pt into the mmap-able .npy store")
+    parser.add_argument("--embeddings", default="final_embeddings.pt")
+    parser.add_argument("--dtype", default="float32", choices=STORE_DTYPES)
+    args = parser.parse_args()
+
+    emb_data = torch.load(args.embeddings, map_location="cpu")
+    meta = export_embeddings(emb_data['user_embeddings'].float().numpy(),
+                             emb_data['song_embeddings'].float().numpy(),
+                             args.embeddings, dtype=args.dtype, aggregation=emb_data.get('aggregation'))
+    print(f"Exported {meta['num_users']} users / {meta['num_songs']} songs ({meta['dtype']}) to {store_paths(args.embeddings)['meta']}")
+
+if __name__ == "__main__":
+    main()
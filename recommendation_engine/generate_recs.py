@@ -1,6 +1,9 @@
-import torch
 import json
 import os
+from ann_index import load_or_build_index
+from catalog_store import load_catalog
+from embedding_store import load_embeddings
+from song_index import SONG_INDEX_FILE, load_or_build_song_index
 
 # --- Config ---
 EMBEDDINGS_PATH = "final_embeddings.pt"
@@ -8,39 +11,36 @@ DATASET_PATH = "../dataset.json" # Relative
 OUTPUT_PATH = "../frontend/public/recommendations.json"
 TOP_K = 20
 DEMO_USER_ID = 0
+INDEX_KIND = "exact" # or "ivf" for large catalogs
 
 def generate_recommendations():
     print("Loading data...")
-    # 1. Load Embeddings
-    emb_data = torch.load(EMBEDDINGS_PATH)
-    user_emb = emb_data['user_embeddings']
-    song_emb = emb_data['song_embeddings']
+    # 1. Load Embeddings (mmap'd .npy store if exported, else the torch pickle)
+    user_emb, song_emb, checksum = load_embeddings(EMBEDDINGS_PATH)
     
     # 2. Load Metadata
-    with open(DATASET_PATH, 'r', encoding='utf-8') as f:
-        songs_metadata = json.load(f)
+    songs_metadata = {s['id']: s for s in load_catalog(DATASET_PATH)}
+    song_ids = load_or_build_song_index(SONG_INDEX_FILE, DATASET_PATH).ids()
         
     print(f"Generating recommendations for User {DEMO_USER_ID}...")
     
-    # 3. Compute Scores
-    # User Vector: [Dim]
-    u_vec = user_emb[DEMO_USER_ID] 
-    
-    # Scores: [NumSongs]
-    scores = torch.matmul(song_emb, u_vec)
-    
+    # 3. Retrieval Index (exact brute force or IVF persisted next to the embeddings)
+    index = load_or_build_index(INDEX_KIND, song_emb, EMBEDDINGS_PATH, checksum)
+
     # 4. Rank
-    top_scores, top_indices = torch.topk(scores, TOP_K)
+    # User Vector: [1, Dim] -> top indices [TOP_K]
+    u_vec = user_emb[DEMO_USER_ID][None, :]
+    top_indices = index.search(u_vec, TOP_K)[0]
     
     # 5. Format Output
     recommended_songs = []
-    for idx_tensor in top_indices:
-        idx = idx_tensor.item()
-        # Map Index -> Song Metadata
-        # We assume dataset.json order matched 0..N indices used in training
-        # (which is true because simulate_data.py used strict enumeration)
-        song = songs_metadata[idx]
-        recommended_songs.append(song)
+    for idx in top_indices.tolist():
+        if idx < 0:
+            continue
+        # Map Index -> Song ID (song_index.npz from simulate_data.py) -> Song Metadata
+        song = songs_metadata.get(song_ids[idx]) if idx < len(song_ids) else None
+        if song:
+            recommended_songs.append(song)
         
     # 6. Save to Frontend
     with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
@@ -1,36 +1,112 @@
+import warnings
+import numpy as np
 import torch
+try:
+    from recommendation_engine.graph_delta import edge_weights, merge_edges, pending_delta
+    from recommendation_engine.graph_store import open_store
+except ImportError:
+    from graph_delta import edge_weights, merge_edges, pending_delta
+    from graph_store import open_store
 
-def load_graph_data(data_path="graph_data.pt"):
-    print(f"Loading graph data from {data_path}...")
-    try:
-        raw_data = torch.load(data_path)
-    except FileNotFoundError:
-        print("Error: graph_data.pt not found. Run simulate_data.py first.")
-        return None
+AGGREGATIONS = ("sum", "mean", "sym")
+
+def build_adjacency(src, dst, num_src, num_dst, weights=None, aggregation="sum"):
+    """
+    CSR arrays (indptr, indices, values) of the [num_src, num_dst] adjacency,
+    rows = source nodes. values are the edge weights (1 if None) normalized by:
+      sum  -> w                                  (neighbour sum, the original behaviour)
+      mean -> w / rowsum(w)                      (neighbour mean)
+      sym  -> w / sqrt(rowsum(w) * colsum(w))    (GCN-style degree normalization)
+    """
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{aggregation}' (expected one of {AGGREGATIONS})")
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    w = np.ones(len(src), dtype=np.float64) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    if len(src) and (src[1:] < src[:-1]).any(): # Store / compacted edges are already sorted by source
+        order = np.argsort(src, kind='stable')
+        src, dst, w = src[order], dst[order], w[order]
+    indptr = np.zeros(num_src + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_src), out=indptr[1:])
+
+    row = np.bincount(src, weights=w, minlength=num_src)[src] if aggregation != "sum" else None
+    col = np.bincount(dst, weights=w, minlength=num_dst)[dst] if aggregation == "sym" else None
+    return indptr, dst, normalize_values(w, row, col, aggregation)
+
+def normalize_values(w, row_sum, col_sum, aggregation):
+    """Edge values for `aggregation` from raw weights and the per-edge row / column weight sums."""
+    if aggregation == "mean":
+        w = w / row_sum
+    elif aggregation == "sym":
+        w = w / np.sqrt(row_sum * col_sum)
+    return np.asarray(w, dtype=np.float32)
+
+def to_sparse_csr(indptr, indices, values, shape):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore") # "Sparse CSR tensor support is in beta state"
+        return torch.sparse_csr_tensor(torch.from_numpy(indptr), torch.from_numpy(indices),
+                                       torch.from_numpy(values), size=shape)
+
+def load_graph_data(data_path="graph_data.pt", aggregation="sum"):
+    # Sharded store (graph_data.store/) when present, else the legacy pickle
+    store = open_store(data_path)
+    if store is not None:
+        print(f"Loading graph data from {store.path} ({len(store.meta['shards'])} shard(s))...")
+        raw_data = store.to_graph_data()
+    else:
+        print(f"Loading graph data from {data_path}...")
+        try:
+            raw_data = torch.load(data_path)
+        except FileNotFoundError:
+            print("Error: graph_data.pt not found. Run simulate_data.py first.")
+            return None
 
     # Prepare adjacency indices for message passing
     # Edge Index: [2, num_edges]
     # We need to efficiently query neighbors. 
     
-    # 1. User -> Song (Listens)
+    # 1. User -> Song (Listens), plus interactions synced since the last compaction
     user_song_edges = raw_data['edge_index_user_song']
+    user_song_weights = edge_weights(raw_data)
+    num_users = raw_data['num_users']
+    delta = pending_delta(data_path, raw_data)
+    if len(delta):
+        edges, user_song_weights = merge_edges(
+            user_song_edges.numpy(), user_song_weights, delta['user'], delta['song'], delta['count'])
+        user_song_edges = torch.from_numpy(edges).long()
+        num_users = max(num_users, int(edges[0].max()) + 1)
+        print(f"Applied {len(delta)} pending delta records from incremental sync.")
     
     # 2. Song -> Artist (Created By)
     song_artist_edges = raw_data['edge_index_song_artist']
 
     print(f"Graph Stats:")
-    print(f"- Users: {raw_data['num_users']}")
+    print(f"- Users: {num_users}")
     print(f"- Songs: {raw_data['num_songs']}")
     print(f"- Artists: {raw_data['num_artists']}")
     print(f"- User-Song Edges: {user_song_edges.shape[1]}")
     print(f"- Song-Artist Edges: {song_artist_edges.shape[1]}")
 
+    # Sparse adjacency for message passing (aggregation = one sparse x dense matmul)
+    num_users, num_songs, num_artists = num_users, raw_data['num_songs'], raw_data['num_artists']
+    user_song_csr = to_sparse_csr(*build_adjacency(
+        user_song_edges[0], user_song_edges[1], num_users, num_songs, user_song_weights, aggregation),
+        (num_users, num_songs))
+    song_artist_csr = to_sparse_csr(*build_adjacency(
+        song_artist_edges[0], song_artist_edges[1], num_songs, num_artists, None, aggregation),
+        (num_songs, num_artists))
+
     return {
-        'num_users': raw_data['num_users'],
+        'num_users': num_users,
         'num_songs': raw_data['num_songs'],
         'num_artists': raw_data['num_artists'],
         'user_song_edges': user_song_edges,
-        'song_artist_edges': song_artist_edges
+        'user_song_weights': torch.as_tensor(user_song_weights, dtype=torch.float32), # Listen counts per edge
+        'song_artist_edges': song_artist_edges,
+        'user_song_csr': user_song_csr,     # [NumUsers, NumSongs]
+        'song_artist_csr': song_artist_csr, # [NumSongs, NumArtists]
+        'aggregation': aggregation,
     }
 
 if __name__ == "__main__":
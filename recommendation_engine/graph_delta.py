@@ -0,0 +1,96 @@
+import json
+import os
+
+import numpy as np
+
+# Append-only delta log for the user->song edges of graph_data.pt.
+#
+# Incremental syncs append (user, song, count) records to
+# graph_data.delta.<generation>.log instead of rewriting the graph file.
+# The checkpoint (graph_data.sync.json) records how many bytes of the log
+# are committed, the interaction watermark and the generation. Compaction
+# folds the log into the graph (a new graph store shard, or a rewrite of a
+# legacy graph_data.pt), which then records the next generation, and starts
+# a new log; readers merge graph + committed delta on load.
+#
+# Edges in the graph are unique (user, song) pairs sorted by user then song,
+# with a float weight = number of listens.
+
+DELTA_DTYPE = np.dtype([('user', '<i8'), ('song', '<i8'), ('count', '<f4')])
+
+def checkpoint_path_for(graph_path):
+    return os.path.splitext(graph_path)[0] + ".sync.json"
+
+def delta_path_for(graph_path, generation):
+    return os.path.splitext(graph_path)[0] + f".delta.{generation}.log"
+
+def load_checkpoint(graph_path):
+    path = checkpoint_path_for(graph_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_checkpoint(graph_path, checkpoint):
+    path = checkpoint_path_for(graph_path)
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def append_delta(path, users, songs, counts):
+    """Appends records and fsyncs; returns the new log length in bytes."""
+    records = np.empty(len(users), dtype=DELTA_DTYPE)
+    records['user'], records['song'], records['count'] = users, songs, counts
+    with open(path, 'ab') as f:
+        f.write(records.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+def truncate_delta(path, length):
+    """Drops an uncommitted tail (appended but not checkpointed before a crash)."""
+    if os.path.exists(path) and os.path.getsize(path) > length:
+        with open(path, 'r+b') as f:
+            f.truncate(length)
+
+def read_delta(path, length=None):
+    if not os.path.exists(path):
+        return np.empty(0, dtype=DELTA_DTYPE)
+    size = os.path.getsize(path) if length is None else min(length, os.path.getsize(path))
+    count = size // DELTA_DTYPE.itemsize # A torn trailing record is ignored
+    return np.fromfile(path, dtype=DELTA_DTYPE, count=count)
+
+def merge_edges(edge_index, weights, users, songs, counts):
+    """
+    Unions weighted edge lists, summing the weights of duplicate (user, song)
+    pairs. edge_index is a [2, E] integer array; returns (edge_index, weights)
+    as numpy arrays, sorted by (user, song).
+    """
+    u = np.concatenate([np.asarray(edge_index[0], dtype=np.int64), np.asarray(users, dtype=np.int64)])
+    s = np.concatenate([np.asarray(edge_index[1], dtype=np.int64), np.asarray(songs, dtype=np.int64)])
+    w = np.concatenate([np.asarray(weights, dtype=np.float32), np.asarray(counts, dtype=np.float32)])
+    if not u.size:
+        return np.empty((2, 0), dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    stride = int(s.max()) + 1
+    keys, inverse = np.unique(u * stride + s, return_inverse=True)
+    summed = np.bincount(inverse, weights=w, minlength=keys.size).astype(np.float32)
+    return np.stack([keys // stride, keys % stride]), summed
+
+def edge_weights(graph_data):
+    """Per-edge listen counts; graphs written before deduplication count 1 per column."""
+    weights = graph_data.get('edge_weight_user_song')
+    if weights is None:
+        return np.ones(graph_data['edge_index_user_song'].shape[1], dtype=np.float32)
+    return np.asarray(weights, dtype=np.float32)
+
+def pending_delta(graph_path, graph_data):
+    """Committed delta records not yet compacted into graph_data."""
+    checkpoint = load_checkpoint(graph_path)
+    generation = graph_data.get('delta_generation', 0)
+    if checkpoint is None or checkpoint.get('generation', 0) != generation:
+        return np.empty(0, dtype=DELTA_DTYPE)
+    return read_delta(delta_path_for(graph_path, generation), checkpoint.get('delta_bytes', 0))
@@ -0,0 +1,340 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    from recommendation_engine.graph_delta import edge_weights, merge_edges
+except ImportError:
+    from graph_delta import edge_weights, merge_edges
+
+# On-disk graph format (replaces the graph_data.pt pickle).
+#
+#   graph_data.store/
+#     meta.json               <- counts, delta generation, shard list (written last, atomically)
+#     maps.json               <- optional id maps (artist names), never needed to train
+#     favourite_artists.npy   <- optional simulate_data.py ground truth [NumUsers, 3]
+#     song_artist.npy         <- int32 [2, E_sa]
+#     us-00000.indptr.npy     <- int64 [user_hi - user_lo + 1], CSR row pointers
+#     us-00000.indices.npy    <- int32 song per edge, sorted by (user, song) within the shard
+#     us-00000.weights.npy    <- float32 listen count per edge
+#
+# Each user->song shard covers a user range [user_lo, user_hi). Shards are
+# immutable once listed in meta.json; new edges (e.g. a sync compaction)
+# are appended as a new shard, and readers sum duplicate (user, song) pairs
+# across shards. All arrays are .npy files opened with mmap, so a reader only
+# touches the pages it needs (one user's row is two small slices).
+# meta.json's num_edges counts unique (user, song) pairs across all shards,
+# i.e. the edges of the merged graph.
+
+STORE_FORMAT = 1
+
+def store_path_for(graph_path):
+    return os.path.splitext(graph_path)[0] + ".store"
+
+def open_store(graph_path):
+    """GraphStore next to graph_path (graph_data.pt -> graph_data.store/), or None."""
+    path = store_path_for(graph_path)
+    return GraphStore(path) if os.path.exists(os.path.join(path, "meta.json")) else None
+
+def _atomic_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(obj, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _save(path, arr):
+    tmp = path + ".tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+def csr_from_edges(users, songs, weights=None):
+    """(user_lo, user_hi, indptr, indices, weights) with duplicate pairs summed."""
+    users = np.asarray(users, dtype=np.int64)
+    songs = np.asarray(songs, dtype=np.int64)
+    weights = np.ones(len(users), dtype=np.float32) if weights is None else weights
+    edges, weights = merge_edges(np.stack([users, songs]), weights, [], [], [])
+    if not edges.shape[1]:
+        return 0, 0, np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    lo, hi = int(edges[0, 0]), int(edges[0, -1]) + 1
+    indptr = np.zeros(hi - lo + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[0] - lo, minlength=hi - lo), out=indptr[1:])
+    return lo, hi, indptr, edges[1].astype(np.int32), weights
+
+def write_shard_files(store_path, name, indptr, indices, weights):
+    """Writes one shard's arrays; it becomes visible once listed in meta.json."""
+    _save(os.path.join(store_path, f"{name}.indptr.npy"), np.asarray(indptr, dtype=np.int64))
+    _save(os.path.join(store_path, f"{name}.indices.npy"), np.asarray(indices, dtype=np.int32))
+    _save(os.path.join(store_path, f"{name}.weights.npy"), np.asarray(weights, dtype=np.float32))
+
+class GraphStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != STORE_FORMAT:
+            raise ValueError(f"Unsupported graph store format {self.meta.get('format')} in {path}")
+        self._shards = None
+
+    @classmethod
+    def create(cls, path, num_users, num_songs, num_artists, song_artist_edges, maps=None, shards=()):
+        """
+        New store at `path` (replacing any existing one). `shards` lists
+        already-written shard files: dicts with name, user_lo, user_hi, num_edges.
+        """
+        os.makedirs(path, exist_ok=True)
+        _save(os.path.join(path, "song_artist.npy"), np.asarray(song_artist_edges, dtype=np.int32))
+        if maps is not None:
+            _atomic_json(os.path.join(path, "maps.json"), maps)
+        shards = list(shards)
+        meta = {
+            'format': STORE_FORMAT,
+            'num_users': max([num_users] + [s['user_hi'] for s in shards]),
+            'num_songs': num_songs,
+            'num_artists': num_artists,
+            'num_edges': 0,
+            'delta_generation': 0,
+            'shards': [],
+            'created_at': time.time(),
+        }
+        store = cls.__new__(cls)
+        store.path, store.meta, store._shards = path, meta, None
+        for shard in shards:
+            # Disjoint user ranges (the usual case) add their edges as they are
+            meta['num_edges'] += store._new_pairs(shard)
+            meta['shards'].append(shard)
+            store._shards = None
+        _atomic_json(os.path.join(path, "meta.json"), meta)
+        live = {f"{s['name']}.{part}.npy" for s in shards for part in ("indptr", "indices", "weights")}
+        for f in os.listdir(path):
+            if f.startswith("us-") and f not in live:
+                os.remove(os.path.join(path, f)) # Shards of a previous store at this path
+        return cls(path)
+
+    # --- Reading ---
+
+    def _load_shard(self, shard, mmap_mode=None):
+        return (shard['user_lo'], shard['user_hi'],
+                *(np.load(os.path.join(self.path, f"{shard['name']}.{part}.npy"), mmap_mode=mmap_mode)
+                  for part in ("indptr", "indices", "weights")))
+
+    def shards(self):
+        """[(user_lo, user_hi, indptr, indices, weights)] as memory maps."""
+        if self._shards is None:
+            self._shards = [self._load_shard(shard, 'r') for shard in self.meta['shards']]
+        return self._shards
+
+    def _rows(self, users):
+        """(user, song) keys of the given users' rows in every listed shard (mmap slices only)."""
+        keys = []
+        for lo, hi, indptr, indices, _ in self.shards():
+            rows = users[(users >= lo) & (users < hi)] - lo
+            if not len(rows):
+                continue
+            starts, ends = indptr[rows], indptr[rows + 1]
+            lengths = ends - starts
+            if not lengths.sum():
+                continue
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            keys.append(np.repeat(rows + lo, lengths) * self.meta['num_songs'] + np.asarray(indices[offsets], dtype=np.int64))
+        return np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+
+    def _new_pairs(self, shard):
+        """Number of the shard's (user, song) pairs not already in the listed shards."""
+        if not any(s['user_lo'] < shard['user_hi'] and shard['user_lo'] < s['user_hi'] and s['num_edges']
+                   for s in self.meta['shards']):
+            return shard['num_edges']
+        lo, _, indptr, indices, _ = self._load_shard(shard, 'r')
+        lengths = np.diff(indptr)
+        users = np.flatnonzero(lengths) + lo
+        keys = np.repeat(np.arange(lo, lo + len(lengths), dtype=np.int64), lengths) * self.meta['num_songs'] + indices
+        return int(len(keys) - np.isin(keys, self._rows(users)).sum())
+
+    def song_artist_edges(self):
+        return np.load(os.path.join(self.path, "song_artist.npy")).astype(np.int64)
+
+    def maps(self):
+        path = os.path.join(self.path, "maps.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def user_song_edges(self):
+        """All user->song edges as ([2, E] int64, float32 weights), unique pairs sorted by (user, song)."""
+        # Shards with disjoint user ranges (simulation chunks, compact()) are already
+        # globally sorted and unique once placed in user order; shards overlapping
+        # them (appended deltas) are merged in afterwards.
+        base, overlay, covered = [], [], 0
+        for shard in sorted(self.meta['shards'], key=lambda shard: shard['user_lo']):
+            if not shard['num_edges']:
+                continue
+            if shard['user_lo'] >= covered:
+                base.append(shard)
+                covered = shard['user_hi']
+            else:
+                overlay.append(shard)
+
+        # Read shard by shard (not mmap'd: the pages are copied once and dropped)
+        total = sum(shard['num_edges'] for shard in base)
+        edges = np.empty((2, total), dtype=np.int64)
+        weights = np.empty(total, dtype=np.float32)
+        pos = 0
+        for shard in base:
+            lo, hi, indptr, indices, w = self._load_shard(shard)
+            n = len(indices)
+            edges[0, pos:pos + n] = np.repeat(np.arange(lo, hi, dtype=np.int64), np.diff(indptr))
+            edges[1, pos:pos + n] = indices
+            weights[pos:pos + n] = w
+            pos += n
+        if not overlay:
+            return edges, weights
+
+        extra = [(np.repeat(np.arange(lo, hi, dtype=np.int64), np.diff(indptr)), indices, w)
+                 for lo, hi, indptr, indices, w in map(self._load_shard, overlay)]
+        extra_edges, extra_weights = merge_edges(
+            np.empty((2, 0), dtype=np.int64), [], np.concatenate([e[0] for e in extra]),
+            np.concatenate([e[1] for e in extra]), np.concatenate([e[2] for e in extra]))
+        # Sum pairs already in the base, insert the rest at their sorted positions
+        stride = self.meta['num_songs']
+        keys = edges[0] * stride + edges[1]
+        extra_keys = extra_edges[0] * stride + extra_edges[1]
+        pos = np.searchsorted(keys, extra_keys)
+        found = pos < len(keys)
+        found[found] = keys[pos[found]] == extra_keys[found]
+        weights[pos[found]] += extra_weights[found]
+        return (np.insert(edges, pos[~found], extra_edges[:, ~found], axis=1),
+                np.insert(weights, pos[~found], extra_weights[~found]))
+
+    def neighbours(self, user):
+        """(songs, weights) of one user across all shards, duplicates summed."""
+        songs, weights = [], []
+        for lo, hi, indptr, indices, w in self.shards():
+            if lo <= user < hi:
+                start, end = indptr[user - lo], indptr[user - lo + 1]
+                songs.append(np.asarray(indices[start:end], dtype=np.int64))
+                weights.append(np.asarray(w[start:end], dtype=np.float64))
+        if not songs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        if len(songs) == 1:
+            return songs[0], weights[0]
+        songs, inverse = np.unique(np.concatenate(songs), return_inverse=True)
+        return songs, np.bincount(inverse, weights=np.concatenate(weights))
+
+    def song_degree(self):
+        """Summed listen weight per song (streamed shard by shard)."""
+        degree = np.zeros(self.meta['num_songs'], dtype=np.float64)
+        for _, _, _, indices, weights in self.shards():
+            for start in range(0, len(indices), 1 << 24):
+                degree += np.bincount(indices[start:start + (1 << 24)], weights=weights[start:start + (1 << 24)],
+                                      minlength=len(degree))
+        return degree
+
+    def to_graph_data(self):
+        """Same dict layout as the legacy graph_data.pt pickle."""
+        import torch
+        edges, weights = self.user_song_edges()
+        return {
+            'num_users': self.meta['num_users'],
+            'num_songs': self.meta['num_songs'],
+            'num_artists': self.meta['num_artists'],
+            'edge_index_user_song': torch.from_numpy(edges),
+            'edge_weight_user_song': torch.from_numpy(np.ascontiguousarray(weights)),
+            'edge_index_song_artist': torch.from_numpy(self.song_artist_edges()),
+            'delta_generation': self.meta['delta_generation'],
+        }
+
+    # --- Writing ---
+
+    def append_shard(self, users, songs, weights, delta_generation=None):
+        """
+        Adds the edges as a new shard. The shard and (optionally) the new
+        delta generation become visible together in one meta.json replace.
+        """
+        lo, hi, indptr, indices, weights = csr_from_edges(users, songs, weights)
+        meta = dict(self.meta)
+        if len(indices):
+            name = f"us-{max([int(s['name'][3:]) for s in meta['shards']] + [-1]) + 1:05d}"
+            write_shard_files(self.path, name, indptr, indices, weights)
+            shard = {'name': name, 'user_lo': lo, 'user_hi': hi, 'num_edges': len(indices)}
+            meta['num_edges'] += self._new_pairs(shard) # Pairs already in older shards are summed, not added
+            meta['shards'] = meta['shards'] + [shard]
+            meta['num_users'] = max(meta['num_users'], hi)
+        if delta_generation is not None:
+            meta['delta_generation'] = delta_generation
+        _atomic_json(os.path.join(self.path, "meta.json"), meta)
+        self.meta, self._shards = meta, None
+
+    def compact(self, max_edges_per_shard=50_000_000):
+        """Rewrites all shards as disjoint user ranges (duplicates summed) with at most ~max_edges_per_shard each."""
+        edges, weights = self.user_song_edges()
+        old = [s['name'] for s in self.meta['shards']]
+        first = max([int(n[3:]) for n in old] + [-1]) + 1
+
+        # Cut at user boundaries
+        cuts = [0]
+        while cuts[-1] < edges.shape[1]:
+            end = min(cuts[-1] + max_edges_per_shard, edges.shape[1])
+            while end < edges.shape[1] and edges[0, end] == edges[0, end - 1]:
+                end += 1
+            cuts.append(end)
+        shards = []
+        for i, (a, b) in enumerate(zip(cuts[:-1], cuts[1:])):
+            lo, hi, indptr, indices, w = csr_from_edges(edges[0, a:b], edges[1, a:b], weights[a:b])
+            name = f"us-{first + i:05d}"
+            write_shard_files(self.path, name, indptr, indices, w)
+            shards.append({'name': name, 'user_lo': lo, 'user_hi': hi, 'num_edges': len(indices)})
+
+        meta = dict(self.meta, shards=shards, num_edges=int(edges.shape[1]))
+        _atomic_json(os.path.join(self.path, "meta.json"), meta)
+        self.meta, self._shards = meta, None
+        for name in old:
+            for part in ("indptr", "indices", "weights"):
+                os.remove(os.path.join(self.path, f"{name}.{part}.npy"))
+
+def convert(graph_path):
+    """graph_data.pt -> graph_data.store/ (listen counts kept, duplicate pairs summed)."""
+    import torch
+
+    data = torch.load(graph_path)
+    edges = data['edge_index_user_song'].numpy()
+    lo, hi, indptr, indices, weights = csr_from_edges(edges[0], edges[1], edge_weights(data))
+    path = store_path_for(graph_path)
+    os.makedirs(path, exist_ok=True)
+    shards = []
+    if len(indices):
+        write_shard_files(path, "us-00000", indptr, indices, weights)
+        shards.append({'name': "us-00000", 'user_lo': lo, 'user_hi': hi, 'num_edges': len(indices)})
+    store = GraphStore.create(path, data['num_users'], data['num_songs'], data['num_artists'],
+                              data['edge_index_song_artist'].numpy(),
+                              maps={'artist_id_map': data.get('artist_id_map', {})}, shards=shards)
+    if data.get('delta_generation'):
+        store.append_shard([], [], [], delta_generation=data['delta_generation'])
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description="Graph store utilities")
+    parser.add_argument("command", choices=["convert", "compact", "info"])
+    parser.add_argument("--graph", default="graph_data.pt")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "convert":
+        store = convert(args.graph)
+        print(f"Converted {args.graph} -> {store.path} in {time.perf_counter() - start:.1f}s")
+    else:
+        store = open_store(args.graph)
+        if store is None:
+            print(f"No graph store for {args.graph}")
+            return
+        if args.command == "compact":
+            store.compact()
+            print(f"Compacted into {len(store.meta['shards'])} shard(s) in {time.perf_counter() - start:.1f}s")
+    print(json.dumps({k: v for k, v in store.meta.items() if k != 'shards'} | {'shards': len(store.meta['shards'])}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,14 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 class HeteroGNN(nn.Module):
-    def __init__(self, num_users, num_songs, num_artists, hidden_dim=64):
+    def __init__(self, num_users, num_songs, num_artists, hidden_dim=64, sparse=False):
         super().__init__()
         
         # --- 1. Base Embeddings (Node Features) ---
-        self.user_emb = nn.Embedding(num_users, hidden_dim)
-        self.song_emb = nn.Embedding(num_songs, hidden_dim)
-        self.artist_emb = nn.Embedding(num_artists, hidden_dim)
+        # sparse=True: gradients only for the rows a mini-batch touched (use with optim.SparseAdam)
+        self.user_emb = nn.Embedding(num_users, hidden_dim, sparse=sparse)
+        self.song_emb = nn.Embedding(num_songs, hidden_dim, sparse=sparse)
+        self.artist_emb = nn.Embedding(num_artists, hidden_dim, sparse=sparse)
         
         # --- 2. Transformation Layers (Message Passing Weights) ---
         # Transform Artist info before aggregating to Song
@@ -29,9 +30,11 @@ class HeteroGNN(nn.Module):
 
     def forward(self, user_song_adj, song_artist_adj):
         """
-        Perform Message Passing Steps manually without sparse libraries.
-        This is a 'Full Batch' forward pass logic for demo purposes.
-        For massive scale, we would use mini-batch neighbor sampling.
+        Full Batch forward pass.
+        The adjacencies are either sparse CSR tensors ([NumUsers, NumSongs] and
+        [NumSongs, NumArtists], see graph.build_adjacency), in which case each
+        aggregation is one sparse x dense matmul with the normalization baked
+        into the values, or [2, E] edge lists aggregated with index_add (sum).
         """
         
         # --- Step 0: Initial Embeddings ---
@@ -41,53 +44,64 @@ class HeteroGNN(nn.Module):
         
         # --- Step 1: Artist -> Song Aggregation ---
         # "Songs represent their creators"
-        # We need to compute mean(Artist Neighbors) for each song.
-        # Since standard PyTorch scatter_reduce isn't always available/stable without extra libs,
-        # we'll approximate or use a simple loop/index_add for this specific dataset size.
+        aggr_artist = self.aggregate(song_artist_adj, h_a, h_s.shape[0])
         
-        # Create a buffer for aggregated artist info
-        aggr_artist = torch.zeros_like(h_s)
-        
-        # Edges: [2, E_sa] -> (song_idx, artist_idx)
-        song_indices = song_artist_adj[0]
-        artist_indices = song_artist_adj[1]
-        
-        # Gather artist features per edge
-        edge_artist_feats = h_a[artist_indices] # [E_sa, Dim]
-        
-        # Sum into songs (Scatter Add)
-        # index_add_ is provided in core PyTorch
-        aggr_artist.index_add_(0, song_indices, edge_artist_feats)
+        # Update Song Embeddings
+        h_s_new = self.update_songs(h_s, aggr_artist)
+
+        # --- Step 2: Song -> User Aggregation ---
+        # "Users represent what they listen to" (aggregates the *UPDATED* song features)
+        aggr_song = self.aggregate(user_song_adj, h_s_new, h_u.shape[0])
         
-        # Normalize (divide by degree) - Optional, simplified here to just Sum or we can track counts
-        # For this demo, Sum is fine as most songs have 1 artist.
+        # Update User Embeddings
+        h_u_new = self.update_users(h_u, aggr_song)
         
-        # Update Song Embeddings
+        return h_u_new, h_s_new
+
+    @staticmethod
+    def aggregate(adj, h_src, num_dst):
+        """Per-row aggregation of neighbour features h_src -> [num_dst, Dim]."""
+        if adj.layout == torch.sparse_csr:
+            # No [E, Dim] gather buffer; backward is adj^T @ grad, also sparse
+            return torch.sparse.mm(adj, h_src)
+
+        # Edges: [2, E] -> (dst_idx, src_idx); gather per edge and sum (Scatter Add)
+        out = torch.zeros(num_dst, h_src.shape[1], dtype=h_src.dtype, device=h_src.device)
+        return out.index_add_(0, adj[0], h_src[adj[1]])
+
+    def update_songs(self, h_s, aggr_artist):
         # h_s_new = W_update( [h_s || W_msg(aggr_artist)] )
         msg_artist = F.relu(self.W_artist_song(aggr_artist))
         h_s_new = self.W_s_update(torch.cat([h_s, msg_artist], dim=1))
-        h_s_new = F.normalize(h_s_new, p=2, dim=1) # Normalize to stable sphere
+        return F.normalize(h_s_new, p=2, dim=1) # Normalize to stable sphere
 
-        # --- Step 2: Song -> User Aggregation ---
-        # "Users represent what they listen to"
-        aggr_song = torch.zeros_like(h_u)
-        
-        # Edges: [2, E_us] -> (user_idx, song_idx)
-        user_indices = user_song_adj[0]
-        song_indices_us = user_song_adj[1]
-        
-        # Gather *UPDATED* song features
-        edge_song_feats = h_s_new[song_indices_us]
-        
-        # Sum into users
-        aggr_song.index_add_(0, user_indices, edge_song_feats)
-        
-        # Update User Embeddings
+    def update_users(self, h_u, aggr_song):
         msg_song = F.relu(self.W_song_user(aggr_song))
         h_u_new = self.W_u_update(torch.cat([h_u, msg_song], dim=1))
-        h_u_new = F.normalize(h_u_new, p=2, dim=1)
-        
-        return h_u_new, h_s_new
+        return F.normalize(h_u_new, p=2, dim=1)
+
+    def forward_sampled(self, batch):
+        """
+        Same two message-passing steps as forward(), restricted to a sampled
+        computation graph (sampler.MiniBatch). Only the embedding rows of the
+        batch's nodes are read, so memory scales with the batch, not the graph.
+        Returns final embeddings of the batch's target users and songs.
+        """
+        h_u = self.user_emb(batch.users)
+        h_s = self.song_emb(batch.songs)
+        h_a = self.artist_emb(batch.artists)
+
+        # Artist -> Song (weighted by degree / fanout for sampled neighbourhoods)
+        aggr_artist = torch.zeros_like(h_s)
+        aggr_artist.index_add_(0, batch.sa_edges[0], h_a[batch.sa_edges[1]] * batch.sa_weight[:, None])
+        h_s_new = self.update_songs(h_s, aggr_artist)
+
+        # Song -> User
+        aggr_song = torch.zeros_like(h_u)
+        aggr_song.index_add_(0, batch.us_edges[0], h_s_new[batch.us_edges[1]] * batch.us_weight[:, None])
+        h_u_new = self.update_users(h_u, aggr_song)
+
+        return h_u_new[batch.user_pos], h_s_new[batch.song_pos]
 
     def predict_pair(self, u_emb, s_emb, u_idx, s_idx):
         # Retrieve final embeddings
@@ -0,0 +1,119 @@
+import numpy as np
+import torch
+
+# Negative sampling for BPR training.
+#
+# A negative for (user, positive song) is drawn from a base distribution,
+# uniform or popularity^alpha via an alias table. Optionally part of the batch
+# instead takes in-batch negatives (another row's positive song, so popular songs
+# come up as often as they occur in the data), and part takes hard negatives
+# (the highest-scoring of `hard_candidates` base draws under the current
+# embeddings). Negatives that turn out to be one of the user's own training
+# positives are redrawn, checked against a sorted array of
+# user * num_songs + song keys with one np.searchsorted per batch.
+
+class PositiveSet:
+    """Vectorized membership test for (user, song) training pairs."""
+    def __init__(self, users, songs, num_songs: int):
+        self.num_songs = num_songs
+        self.keys = np.unique(np.asarray(users, dtype=np.int64) * num_songs + np.asarray(songs, dtype=np.int64))
+
+    def contains(self, users, songs) -> np.ndarray:
+        query = np.asarray(users, dtype=np.int64) * self.num_songs + np.asarray(songs, dtype=np.int64)
+        if not len(self.keys):
+            return np.zeros(query.shape, dtype=bool)
+        pos = np.minimum(np.searchsorted(self.keys, query), len(self.keys) - 1)
+        return self.keys[pos] == query
+
+class AliasTable:
+    """Vose's alias method: O(1) draws from a fixed discrete distribution."""
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+        self.prob = np.ones(n)
+        self.alias = np.arange(n, dtype=np.int64)
+
+        small = list(np.flatnonzero(scaled < 1.0))
+        large = list(np.flatnonzero(scaled >= 1.0))
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1 up to rounding error
+
+    def sample(self, size, rng: np.random.Generator) -> np.ndarray:
+        idx = rng.integers(0, len(self.prob), size)
+        return np.where(rng.random(size) < self.prob[idx], idx, self.alias[idx])
+
+class NegativeSampler:
+    """
+    Callable(users, pos_songs) -> neg_songs (LongTensors) for TrainingEngine.
+    score_fn(users, candidates[B, K]) -> scores[B, K] is required when hard_ratio > 0.
+    """
+    def __init__(self, pos_users, pos_songs, num_songs: int, distribution="popularity", alpha=0.75,
+                 filter_positives=True, max_retries=5, in_batch_ratio=0.0, hard_ratio=0.0,
+                 hard_candidates=16, score_fn=None, seed=None):
+        if distribution not in ("uniform", "popularity"):
+            raise ValueError(f"Unknown negative distribution '{distribution}'")
+        if hard_ratio > 0 and score_fn is None:
+            raise ValueError("hard_ratio > 0 needs a score_fn")
+        pos_users = np.asarray(pos_users, dtype=np.int64)
+        pos_songs = np.asarray(pos_songs, dtype=np.int64)
+
+        self.num_songs = num_songs
+        self.positives = PositiveSet(pos_users, pos_songs, num_songs) if filter_positives else None
+        self.max_retries = max_retries
+        self.in_batch_ratio = in_batch_ratio
+        self.hard_ratio = hard_ratio
+        self.hard_candidates = hard_candidates
+        self.score_fn = score_fn
+        self.rng = np.random.default_rng(seed)
+        self.alias = None
+        if distribution == "popularity":
+            # word2vec-style smoothing; +1 keeps never-played songs reachable
+            counts = np.bincount(pos_songs, minlength=num_songs)
+            self.alias = AliasTable((counts + 1.0) ** alpha)
+        self.stats = {'drawn': 0, 'redrawn': 0, 'unresolved': 0}
+
+    def draw(self, size) -> np.ndarray:
+        if self.alias is None:
+            return self.rng.integers(0, self.num_songs, size)
+        return self.alias.sample(size, self.rng)
+
+    def __call__(self, users, pos_songs):
+        users = users.numpy().astype(np.int64, copy=False)
+        pos_songs = pos_songs.numpy().astype(np.int64, copy=False)
+        n = len(users)
+        neg = self.draw(n)
+
+        # Row roles: [in-batch | hard | base], assigned at random
+        role = self.rng.random(n)
+        in_batch = role < self.in_batch_ratio
+        hard = (role >= self.in_batch_ratio) & (role < self.in_batch_ratio + self.hard_ratio)
+        if in_batch.any():
+            neg[in_batch] = pos_songs[self.rng.integers(0, n, in_batch.sum())]
+        if hard.any():
+            neg[hard] = self._hard(users[hard])
+
+        if self.positives is not None:
+            bad = self.positives.contains(users, neg)
+            for _ in range(self.max_retries):
+                if not bad.any():
+                    break
+                idx = np.flatnonzero(bad)
+                self.stats['redrawn'] += len(idx)
+                neg[idx] = self.draw(len(idx))
+                bad[idx] = self.positives.contains(users[idx], neg[idx])
+            self.stats['unresolved'] += int(bad.sum()) # Users who played almost everything
+        self.stats['drawn'] += n
+        return torch.from_numpy(neg)
+
+    def _hard(self, users):
+        cand = self.draw((len(users), self.hard_candidates))
+        scores = self.score_fn(torch.from_numpy(users), torch.from_numpy(cand)).cpu().numpy()
+        if self.positives is not None:
+            scores[self.positives.contains(users[:, None], cand)] = -np.inf
+        return cand[np.arange(len(users)), scores.argmax(axis=1)]
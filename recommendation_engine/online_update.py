@@ -0,0 +1,151 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+
+try:
+    from recommendation_engine.embedding_store import embedding_aggregation, embedding_checksums, load_embeddings, save_user_updates
+    from recommendation_engine.graph import build_adjacency, normalize_values
+    from recommendation_engine.graph_delta import edge_weights, pending_delta
+    from recommendation_engine.graph_store import open_store
+    from recommendation_engine.model import HeteroGNN
+except ImportError:
+    from embedding_store import embedding_aggregation, embedding_checksums, load_embeddings, save_user_updates
+    from graph import build_adjacency, normalize_values
+    from graph_delta import edge_weights, pending_delta
+    from graph_store import open_store
+    from model import HeteroGNN
+
+# Online update of user embeddings for new interactions, without retraining.
+#
+# In HeteroGNN a song's final embedding depends only on its artists, so a new
+# (user, song) edge changes nothing but that user's final embedding:
+#   h_u_new = update_users(h_u, aggregate(final song embeddings of u's songs))
+# The updater recomputes exactly that for the affected users with the frozen
+# trained weights. This is exact for "sum" and "mean" aggregation; under "sym"
+# the new edges also shift the song degrees other users are normalized by,
+# which waits for the next retrain. Users added after training have no trained
+# base embedding and start from zero, so they are embedded by their songs alone.
+#
+# With the sharded graph store only the affected users' rows are read (mmap);
+# the legacy pickle is loaded whole.
+#
+# Results go to final_embeddings.user_updates.npz (embedding_store), which the
+# recommendation service overlays on the trained user embeddings.
+
+class IncrementalUpdater:
+    def __init__(self, graph_path="graph_data.pt", model_path="hnn_model.pth",
+                 embeddings_path="final_embeddings.pt", graph_data=None):
+        self.embeddings_path = embeddings_path
+        self.aggregation = embedding_aggregation(embeddings_path) # From the store's meta, no unpickling
+        _, self.song_emb, _ = load_embeddings(embeddings_path) # Rows gathered per update (may be a read-only mmap)
+        self.checksums = embedding_checksums(embeddings_path)
+
+        state = torch.load(model_path, map_location="cpu")
+        num_users, dim = state['user_emb.weight'].shape
+        self.model = HeteroGNN(num_users, state['song_emb.weight'].shape[0], state['artist_emb.weight'].shape[0], dim)
+        self.model.load_state_dict(state)
+        self.model.eval()
+
+        # Current user -> song neighbourhoods (graph + pending delta), raw listen counts
+        self.store = open_store(graph_path)
+        if self.store is not None:
+            graph_data = self.store.meta
+            self.num_users = graph_data['num_users']
+            # Column sums are only needed by "sym"; the store streams them from its shards
+            self.song_degree = self.store.song_degree() if self.aggregation == "sym" else np.zeros(graph_data['num_songs'])
+        else:
+            graph_data = graph_data if graph_data is not None else torch.load(graph_path)
+            edges, weights = graph_data['edge_index_user_song'].numpy(), edge_weights(graph_data)
+            self.num_users = max(graph_data['num_users'], int(edges[0].max()) + 1 if edges.shape[1] else 0)
+            self.indptr, self.indices, self.weights = build_adjacency(
+                edges[0], edges[1], self.num_users, graph_data['num_songs'], weights, "sum")
+            self.song_degree = np.bincount(edges[1], weights=weights, minlength=graph_data['num_songs'])
+        self.extra = {} # user -> {song: count} from the pending delta and add_edges() since load
+        delta = pending_delta(graph_path, graph_data)
+        if len(delta):
+            self.add_edges(delta['user'], delta['song'], delta['count'])
+
+    def add_edges(self, users, songs, counts):
+        """Records new (user, song, count) edges; returns the affected users."""
+        users = np.asarray(users, dtype=np.int64)
+        songs = np.asarray(songs, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.float64)
+        np.add.at(self.song_degree, songs, counts)
+        for u, s, c in zip(users.tolist(), songs.tolist(), counts.tolist()):
+            row = self.extra.setdefault(u, {})
+            row[s] = row.get(s, 0.0) + c
+        self.num_users = max(self.num_users, int(users.max()) + 1 if len(users) else 0)
+        return np.unique(users)
+
+    def _neighbours(self, user):
+        songs = np.empty(0, dtype=np.int64)
+        weights = np.empty(0, dtype=np.float64)
+        if self.store is not None:
+            songs, weights = self.store.neighbours(user)
+        elif user + 1 < len(self.indptr):
+            start, end = self.indptr[user], self.indptr[user + 1]
+            songs, weights = self.indices[start:end], self.weights[start:end].astype(np.float64)
+        extra = self.extra.get(user)
+        if extra:
+            songs = np.concatenate([songs, np.fromiter(extra.keys(), dtype=np.int64, count=len(extra))])
+            weights = np.concatenate([weights, np.fromiter(extra.values(), dtype=np.float64, count=len(extra))])
+            songs, inverse = np.unique(songs, return_inverse=True)
+            weights = np.bincount(inverse, weights=weights)
+        return songs, weights
+
+    @torch.no_grad()
+    def recompute(self, users):
+        """Final embeddings [len(users), Dim] of `users` from their current neighbourhoods."""
+        users = np.asarray(users, dtype=np.int64)
+        if not len(users):
+            return np.empty((0, self.song_emb.shape[1]), dtype=np.float32)
+        rows, songs, values = [], [], []
+        for i, u in enumerate(users.tolist()):
+            s, w = self._neighbours(u)
+            rows.append(np.full(len(s), i, dtype=np.int64))
+            songs.append(s)
+            values.append(normalize_values(w, np.full(len(s), w.sum()), self.song_degree[s], self.aggregation))
+        rows, songs, values = np.concatenate(rows), np.concatenate(songs), np.concatenate(values)
+
+        aggr = torch.zeros(len(users), self.song_emb.shape[1])
+        feats = torch.from_numpy(np.asarray(self.song_emb[songs], dtype=np.float32))
+        aggr.index_add_(0, torch.from_numpy(rows), feats * torch.from_numpy(values)[:, None])
+
+        # Trained base embedding where there is one, zero for users newer than the model
+        trained = self.model.user_emb.weight
+        h_u = torch.zeros(len(users), trained.shape[1])
+        known = users < trained.shape[0]
+        h_u[torch.from_numpy(known)] = trained[torch.from_numpy(users[known])]
+        return self.model.update_users(h_u, aggr).numpy()
+
+    def update(self, users, songs, counts, save=True):
+        """add_edges + recompute + (optionally) persist. Returns (user_idx, vectors)."""
+        affected = self.add_edges(users, songs, counts)
+        vectors = self.recompute(affected)
+        if save:
+            self.save(affected, vectors)
+        return affected, vectors
+
+    def save(self, users, vectors):
+        return save_user_updates(self.embeddings_path, self.checksums, users, vectors)
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed users from the current graph with the trained model")
+    parser.add_argument("users", type=int, nargs="+", help="User indices to recompute")
+    parser.add_argument("--graph", default="graph_data.pt")
+    parser.add_argument("--model", default="hnn_model.pth")
+    parser.add_argument("--embeddings", default="final_embeddings.pt")
+    args = parser.parse_args()
+
+    updater = IncrementalUpdater(args.graph, args.model, args.embeddings)
+    start = time.perf_counter()
+    vectors = updater.recompute(args.users)
+    total = updater.save(args.users, vectors)
+    print(f"Updated {len(args.users)} users in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({total} users in {os.path.basename(args.embeddings)} overlay)")
+
+if __name__ == "__main__":
+    main()
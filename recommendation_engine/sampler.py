@@ -0,0 +1,148 @@
+import numpy as np
+import torch
+
+try:
+    from recommendation_engine.graph import build_adjacency
+except ImportError:
+    from graph import build_adjacency
+
+# Neighbour sampling for mini-batch HeteroGNN training.
+#
+# The model is two hops deep: a user's output embedding sums the *updated*
+# embeddings of the songs it listened to, and an updated song embedding sums
+# its artists. A mini-batch therefore needs, for its target users and songs:
+#   users   -> up to `song_fanout` sampled songs each
+#   songs   -> (targets + sampled neighbours) up to `artist_fanout` artists each
+# Edge values are the normalized adjacency values of the full-batch model
+# (graph.build_adjacency: listen counts under sum / mean / sym aggregation).
+# Sampling is with replacement when a node has more neighbours than the fanout,
+# and every sampled edge is weighted value * degree / fanout, so the weighted sum
+# is an unbiased estimate of the full-neighbourhood aggregation.
+# Nodes at or below the fanout keep all their neighbours with their own value.
+
+class CSR:
+    """Adjacency of one edge type, rows = source nodes."""
+    def __init__(self, src, dst, num_src: int, num_dst=None, weights=None, aggregation="sum"):
+        dst = np.asarray(dst, dtype=np.int64)
+        if num_dst is None:
+            num_dst = int(dst.max()) + 1 if len(dst) else 0
+        self.indptr, self.indices, self.values = build_adjacency(src, dst, num_src, num_dst, weights, aggregation)
+
+    def degree(self, nodes: np.ndarray) -> np.ndarray:
+        return self.indptr[nodes + 1] - self.indptr[nodes]
+
+    def sample(self, nodes: np.ndarray, fanout, rng: np.random.Generator):
+        """
+        Returns (row, col, weight): row = position of the node in `nodes`,
+        col = global neighbour id. fanout=None takes every neighbour.
+        """
+        deg = self.degree(nodes)
+        start = self.indptr[nodes]
+        full = deg if fanout is None else np.where(deg <= fanout, deg, 0)
+
+        # Nodes whose whole neighbourhood is kept
+        row_full = np.repeat(np.arange(len(nodes)), full)
+        offsets = np.arange(row_full.size) - np.repeat(np.cumsum(full) - full, full)
+        col_full = self.indices[start[row_full] + offsets]
+        weight_full = self.values[start[row_full] + offsets]
+        if fanout is None:
+            return row_full, col_full, weight_full
+
+        # High-degree nodes: `fanout` draws with replacement, scaled by degree / fanout
+        big = np.flatnonzero(deg > fanout)
+        row_big = np.repeat(big, fanout)
+        draws = (rng.random(row_big.size) * deg[row_big]).astype(np.int64)
+        col_big = self.indices[start[row_big] + draws]
+        weight_big = self.values[start[row_big] + draws] * (deg[row_big] / fanout).astype(np.float32)
+
+        row = np.concatenate([row_full, row_big])
+        col = np.concatenate([col_full, col_big])
+        weight = np.concatenate([weight_full, weight_big])
+        return row, col, weight
+
+class MiniBatch:
+    """
+    Sampled computation graph with local ids. `users`, `songs` and `artists`
+    hold the global ids of the nodes involved; edge arrays index into them.
+    `user_pos` / `song_pos` map the requested targets to their local rows.
+    """
+    def __init__(self, users, songs, artists, us_edges, us_weight, sa_edges, sa_weight, user_pos, song_pos):
+        self.users = users
+        self.songs = songs
+        self.artists = artists
+        self.us_edges = us_edges   # [2, E] (local user, local song)
+        self.us_weight = us_weight
+        self.sa_edges = sa_edges   # [2, E] (local song, local artist)
+        self.sa_weight = sa_weight
+        self.user_pos = user_pos
+        self.song_pos = song_pos
+
+    def to(self, device):
+        for name, value in vars(self).items():
+            setattr(self, name, value.to(device))
+        return self
+
+class NeighborSampler:
+    def __init__(self, user_song_edges, song_artist_edges, num_users: int, num_songs: int,
+                 song_fanout=10, artist_fanout=None, seed=None, user_song_weights=None,
+                 num_artists=None, aggregation="sum"):
+        us = np.asarray(user_song_edges)
+        sa = np.asarray(song_artist_edges)
+        weights = None if user_song_weights is None else np.asarray(user_song_weights)
+        self.user_songs = CSR(us[0], us[1], num_users, num_songs, weights, aggregation)
+        self.song_artists = CSR(sa[0], sa[1], num_songs, num_artists, None, aggregation)
+        self.song_fanout = song_fanout
+        self.artist_fanout = artist_fanout
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self, target_users, target_songs) -> MiniBatch:
+        """Computation graph for output embeddings of target_users and target_songs (global ids, repeats allowed)."""
+        target_users = np.asarray(target_users, dtype=np.int64)
+        target_songs = np.asarray(target_songs, dtype=np.int64)
+
+        users, user_pos = np.unique(target_users, return_inverse=True)
+        us_row, us_song, us_weight = self.user_songs.sample(users, self.song_fanout, self.rng)
+
+        # Songs needed: targets plus the users' sampled neighbours
+        songs, song_inverse = np.unique(np.concatenate([target_songs, us_song]), return_inverse=True)
+        song_pos = song_inverse[:len(target_songs)]
+        us_local_song = song_inverse[len(target_songs):]
+
+        sa_row, sa_artist, sa_weight = self.song_artists.sample(songs, self.artist_fanout, self.rng)
+        artists, sa_local_artist = np.unique(sa_artist, return_inverse=True)
+
+        return MiniBatch(
+            users=_long(users), songs=_long(songs), artists=_long(artists),
+            us_edges=_long(np.stack([us_row, us_local_song])), us_weight=torch.from_numpy(us_weight),
+            sa_edges=_long(np.stack([sa_row, sa_local_artist])), sa_weight=torch.from_numpy(sa_weight),
+            user_pos=_long(user_pos), song_pos=_long(song_pos),
+        )
+
+def _long(a) -> torch.Tensor:
+    return torch.from_numpy(np.ascontiguousarray(a, dtype=np.int64))
+
+@torch.no_grad()
+def infer_embeddings(model, sampler: NeighborSampler, num_users: int, num_songs: int, chunk_size=65536, device='cpu'):
+    """
+    Exact (unsampled) final embeddings for every node, computed layer by layer
+    in chunks so peak memory is bounded by the chunk, not the edge count.
+    """
+    model.eval()
+    h_s_new = torch.empty(num_songs, model.song_emb.embedding_dim)
+    for start in range(0, num_songs, chunk_size):
+        songs = np.arange(start, min(start + chunk_size, num_songs))
+        row, artist, weight = sampler.song_artists.sample(songs, None, sampler.rng)
+        h_s = model.song_emb(torch.from_numpy(songs).to(device))
+        h_a = model.artist_emb(torch.from_numpy(artist).to(device))
+        aggr = torch.zeros_like(h_s).index_add_(0, torch.from_numpy(row).to(device), h_a * torch.from_numpy(weight).to(device)[:, None])
+        h_s_new[start:start + len(songs)] = model.update_songs(h_s, aggr).cpu()
+
+    h_u_new = torch.empty(num_users, model.user_emb.embedding_dim)
+    for start in range(0, num_users, chunk_size):
+        users = np.arange(start, min(start + chunk_size, num_users))
+        row, song, weight = sampler.user_songs.sample(users, None, sampler.rng)
+        h_u = model.user_emb(torch.from_numpy(users).to(device))
+        feats = h_s_new[torch.from_numpy(song)].to(device) * torch.from_numpy(weight).to(device)[:, None]
+        aggr = torch.zeros_like(h_u).index_add_(0, torch.from_numpy(row).to(device), feats)
+        h_u_new[start:start + len(users)] = model.update_users(h_u, aggr).cpu()
+    return h_u_new, h_s_new
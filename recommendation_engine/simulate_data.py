@@ -1,9 +1,14 @@
-import json
-import random
-import torch
+import argparse
+import multiprocessing as mp
 import os
+import shutil
+import time
+
 import numpy as np
-from collections import defaultdict
+import torch
+from catalog_store import load_catalog
+from graph_store import GraphStore, store_path_for, write_shard_files
+from song_index import SongIndex, SONG_INDEX_FILE
 
 # --- Configuration ---
 DATASET_PATH = "../dataset.json" # Relative to recommendation_engine/
@@ -12,100 +17,157 @@ MIN_INTERACTIONS = 5
 MAX_INTERACTIONS = 50
 ARTIST_AFFINITY_PROB = 0.7 # 70% chance to listen to preferred artist
 RANDOM_SEED = 42
+CHUNK_USERS = 100_000 # Users simulated per chunk (one graph store shard each)
+
+# Listening model (per user): 1-3 favourite artists; MIN..MAX listens, each a
+# song by a favourite artist with ARTIST_AFFINITY_PROB, else a random song;
+# repeated songs are dropped. Users are simulated in chunks with NumPy arrays,
+# and each chunk's unique (user, song) edges are written as one CSR shard of
+# the graph store (<output>.store/, graph_store.py), so memory is bounded by the
+# chunk size. Chunk i always uses SeedSequence(seed).spawn(...)[i], so the
+# result does not depend on --workers.
 
 def load_data(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return load_catalog(path) # dataset.json or its .jsonl / .columns.npz artifacts
+
+class Catalog:
+    """Song / artist arrays the chunk simulator needs (sent once to each worker)."""
+    def __init__(self, songs):
+        self.num_songs = len(songs)
+        self.artists = sorted(set(s['artist'] for s in songs if s.get('artist')))
+        artist_id_map = {name: i for i, name in enumerate(self.artists)}
+
+        self.song_artist = np.array([artist_id_map.get(s.get('artist'), -1) for s in songs], dtype=np.int64)
+        has_artist = np.flatnonzero(self.song_artist >= 0)
+        # Songs grouped by artist (CSR): songs of artist a = artist_songs[artist_indptr[a]:artist_indptr[a + 1]]
+        self.artist_songs = has_artist[np.argsort(self.song_artist[has_artist], kind='stable')]
+        self.artist_indptr = np.zeros(len(self.artists) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.song_artist[has_artist], minlength=len(self.artists)), out=self.artist_indptr[1:])
+
+def _favourite_artists(rng, n, num_artists):
+    """[n, 3] distinct artists per user (sequential draws without replacement) and how many of them count (1-3)."""
+    a = rng.integers(0, num_artists, n)
+    b = rng.integers(0, max(num_artists - 1, 1), n)
+    b += b >= a
+    c = rng.integers(0, max(num_artists - 2, 1), n)
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    c += c >= lo
+    c += c >= hi
+    favs = np.stack([a, b, c], axis=1)
+    num_favs = rng.integers(1, min(3, num_artists) + 1, n)
+    favs[np.arange(3)[None, :] >= num_favs[:, None]] = -1
+    return favs, num_favs
+
+def simulate_chunk(catalog: Catalog, first_user: int, num_users: int, seed):
+    """Unique (user, song) edges, sorted, and the favourite artists of users [first_user, first_user + num_users)."""
+    rng = np.random.default_rng(seed)
+    favs, num_favs = _favourite_artists(rng, num_users, len(catalog.artists))
+
+    listens = rng.integers(MIN_INTERACTIONS, MAX_INTERACTIONS + 1, num_users)
+    user = np.repeat(np.arange(num_users), listens)
+    total = len(user)
+
+    # Affinity listens: a favourite artist, then one of its songs
+    artist = favs[user, (rng.random(total) * num_favs[user]).astype(np.int64)]
+    start = catalog.artist_indptr[artist]
+    count = catalog.artist_indptr[artist + 1] - start
+    song = catalog.artist_songs[start + (rng.random(total) * count).astype(np.int64)]
+
+    # Random exploration
+    explore = rng.random(total) >= ARTIST_AFFINITY_PROB
+    song[explore] = rng.integers(0, catalog.num_songs, int(explore.sum()))
 
-def simulate_graph_data():
-    random.seed(RANDOM_SEED)
-    np.random.seed(RANDOM_SEED)
+    keys = np.unique(user.astype(np.int64) * catalog.num_songs + song)
+    users = (keys // catalog.num_songs + first_user).astype(np.int32)
+    songs = (keys % catalog.num_songs).astype(np.int32)
+    return users, songs, favs.astype(np.int32)
 
+_catalog = None
+
+def _init_worker(catalog):
+    global _catalog
+    _catalog = catalog
+
+def _write_chunk(args):
+    store_path, name, first_user, num_users, seed = args
+    users, songs, favs = simulate_chunk(_catalog, first_user, num_users, seed)
+    # Edges come out sorted by (user, song): the chunk is already a CSR shard
+    indptr = np.zeros(num_users + 1, dtype=np.int64)
+    np.cumsum(np.bincount(users - first_user, minlength=num_users), out=indptr[1:])
+    write_shard_files(store_path, name, indptr, songs, np.ones(len(songs), dtype=np.float32))
+    shard = {'name': name, 'user_lo': first_user, 'user_hi': first_user + num_users, 'num_edges': len(songs)}
+    return shard, favs
+
+def simulate_graph_data(num_users=NUM_USERS, output_path="graph_data.pt", workers=1, chunk_users=CHUNK_USERS,
+                        seed=RANDOM_SEED, write_pickle=False):
     print(f"Loading data from {DATASET_PATH}...")
     songs = load_data(DATASET_PATH)
-    
-    # 1. Mappings (ID -> Index)
-    # We need to map string IDs to integer indices for PyTorch
-    song_id_map = {s['id']: i for i, s in enumerate(songs)}
-    
-    unique_artists = sorted(list(set(s['artist'] for s in songs if s.get('artist'))))
-    artist_id_map = {name: i for i, name in enumerate(unique_artists)}
-    
-    # Group songs by artist for simulation
-    songs_by_artist = defaultdict(list)
-    for s in songs:
-        if s.get('artist'):
-            songs_by_artist[s['artist']].append(s['id'])
-            
-    print(f"Stats: {len(songs)} Songs, {len(unique_artists)} Artists")
-
-    # 2. Simulate Users
-    user_interactions = [] # List of (user_idx, song_idx)
-    user_preferences = {}  # user_idx -> [preferred_artist_names]
-
-    print(f"Simulating {NUM_USERS} users...")
-    for user_idx in range(NUM_USERS):
-        # Assign 1-3 favorite artists
-        num_favs = random.randint(1, 3)
-        fav_artists = random.sample(unique_artists, num_favs)
-        user_preferences[user_idx] = fav_artists
-        
-        # Determine number of listens
-        num_listens = random.randint(MIN_INTERACTIONS, MAX_INTERACTIONS)
-        
-        listened_songs = set()
-        
-        for _ in range(num_listens):
-            # Decide strategy: Pick from favorite artist OR random song
-            if random.random() < ARTIST_AFFINITY_PROB:
-                # Pick one of the fav artists
-                chosen_artist = random.choice(fav_artists)
-                # Pick a song by that artist
-                artist_songs = songs_by_artist.get(chosen_artist, [])
-                if artist_songs:
-                    song_id = random.choice(artist_songs)
-                else:
-                    # Fallback if artist has no songs (shouldn't happen with logic above)
-                    song_id = random.choice(songs)['id']
-            else:
-                # Random exploration
-                song_id = random.choice(songs)['id']
-            
-            if song_id not in listened_songs:
-                listened_songs.add(song_id)
-                user_interactions.append((user_idx, song_id_map[song_id]))
-
-    print(f"Generated {len(user_interactions)} interactions.")
-
-    # 3. Create Edge Indices
-    # User -> Song
-    edge_index_user_song = torch.tensor(user_interactions, dtype=torch.long).t()
-    
-    # Song -> Artist
-    song_artist_edges = []
-    for s in songs:
-        if s.get('artist') and s['artist'] in artist_id_map:
-            s_idx = song_id_map[s['id']]
-            a_idx = artist_id_map[s['artist']]
-            song_artist_edges.append((s_idx, a_idx))
-    
-    edge_index_song_artist = torch.tensor(song_artist_edges, dtype=torch.long).t()
-
-    # 4. Save Data
-    data = {
-        'num_users': NUM_USERS,
-        'num_songs': len(songs),
-        'num_artists': len(unique_artists),
-        'song_id_map': song_id_map, # To map back to JSON
-        'artist_id_map': artist_id_map,
-        'user_preferences': user_preferences, # Ground truth for verification
-        'edge_index_user_song': edge_index_user_song,
-        'edge_index_song_artist': edge_index_song_artist
-    }
-    
-    output_path = "graph_data.pt"
+    catalog = Catalog(songs)
+
+    # Persisted id <-> index table shared by sync, generate_recs and the API
+    SongIndex.from_ids([s['id'] for s in songs]).save(
+        os.path.join(os.path.dirname(os.path.abspath(output_path)), SONG_INDEX_FILE))
+    print(f"Stats: {catalog.num_songs} Songs, {len(catalog.artists)} Artists")
+
+    # 1. Simulate users in chunks -> graph store shards
+    store_path = store_path_for(output_path)
+    shutil.rmtree(store_path, ignore_errors=True)
+    os.makedirs(store_path)
+    starts = list(range(0, num_users, chunk_users))
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    tasks = [(store_path, f"us-{i:05d}", first, min(chunk_users, num_users - first), seeds[i])
+             for i, first in enumerate(starts)]
+
+    print(f"Simulating {num_users:,} users in {len(tasks)} chunks on {workers} worker(s)...")
+    begin = time.perf_counter()
+    if workers > 1:
+        with mp.Pool(workers, initializer=_init_worker, initargs=(catalog,)) as pool:
+            results = pool.map(_write_chunk, tasks, chunksize=1)
+    else:
+        _init_worker(catalog)
+        results = [_write_chunk(task) for task in tasks]
+    elapsed = time.perf_counter() - begin
+    shards = [shard for shard, _ in results]
+    num_edges = sum(shard['num_edges'] for shard in shards)
+    print(f"Generated {num_edges:,} interactions in {elapsed:.1f}s ({num_edges / elapsed:,.0f} edges/s) -> {store_path}")
+
+    # 2. Song -> Artist edges, ground truth and metadata (meta.json last: the store is complete)
+    has_artist = np.flatnonzero(catalog.song_artist >= 0)
+    favourite_artists = np.concatenate([favs for _, favs in results]) # [NumUsers, 3], -1 = none
+    np.save(os.path.join(store_path, "favourite_artists.npy"), favourite_artists)
+    store = GraphStore.create(store_path, num_users, catalog.num_songs, len(catalog.artists),
+                              np.stack([has_artist, catalog.song_artist[has_artist]]),
+                              maps={'artist_id_map': {name: i for i, name in enumerate(catalog.artists)}},
+                              shards=shards)
+    print(f"Graph store saved to {store_path}")
+
+    if write_pickle:
+        save_graph(store, [s['id'] for s in songs], favourite_artists, output_path)
+    return num_edges
+
+def save_graph(store, song_ids, favourite_artists, output_path):
+    """Legacy graph_data.pt pickle with the same content as the store."""
+    data = store.to_graph_data()
+    del data['edge_weight_user_song'], data['delta_generation'] # All ones / 0 for a fresh simulation
+    data.update({
+        'song_id_map': {sid: i for i, sid in enumerate(song_ids)}, # To map back to JSON
+        'artist_id_map': store.maps()['artist_id_map'],
+        'user_favorite_artists': torch.from_numpy(favourite_artists), # Ground truth for verification
+    })
     torch.save(data, output_path)
     print(f"Graph data saved to {output_path}")
 
+def main():
+    parser = argparse.ArgumentParser(description="Simulates user listening data on the song catalog")
+    parser.add_argument("--users", type=int, default=NUM_USERS)
+    parser.add_argument("--workers", type=int, default=1, help="Processes simulating chunks in parallel")
+    parser.add_argument("--chunk-users", type=int, default=CHUNK_USERS)
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED)
+    parser.add_argument("--output", default="graph_data.pt")
+    parser.add_argument("--pickle", action="store_true", help="Also write the legacy graph_data.pt pickle")
+    args = parser.parse_args()
+    simulate_graph_data(args.users, args.output, args.workers, args.chunk_users, args.seed,
+                        write_pickle=args.pickle)
+
 if __name__ == "__main__":
-    simulate_graph_data()
+    main()
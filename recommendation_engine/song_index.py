@@ -0,0 +1,141 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+try:
+    from recommendation_engine.catalog_store import load_columns
+except ImportError:
+    from catalog_store import load_columns
+
+# Song id <-> graph/embedding index table.
+#
+# Catalog ids are opaque strings ("0bYg9bo50gSsH3LtXe2SQn", "AN1zv7KP"), and
+# the graph index of a song is its position in the catalog the graph was built
+# from. The table is built once by simulate_data.py and saved as
+# song_index.npz; sync_graph.py, generate_recs.py and the recommendation
+# service all resolve ids through it instead of parsing them.
+#
+# Storage: the UTF-8 ids as one fixed-width bytes array (width padded to a
+# multiple of 8) ordered by a 64-bit hash of the id, plus the permutation back
+# to graph order. A batch of lookups hashes the ids with a few vectorized
+# uint64 ops, binary-searches the sorted hashes (np.searchsorted) and verifies
+# the id bytes, so no per-id Python objects are kept in memory.
+
+SONG_INDEX_FILE = "song_index.npz"
+_HASH_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+def _encode(song_ids, dtype):
+    encoded = [str(s).encode('utf-8') for s in song_ids]
+    # The cast to the key width truncates longer ids, which must not match a real key
+    too_long = np.fromiter((len(e) > dtype.itemsize for e in encoded), dtype=bool, count=len(encoded))
+    return np.array(encoded, dtype=dtype), too_long
+
+def _hash(keys):
+    words = keys.view(np.uint64).reshape(len(keys), keys.dtype.itemsize // 8)
+    h = np.zeros(len(keys), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for col in range(words.shape[1]):
+            h = (h ^ words[:, col]) * _HASH_MULT
+    return h
+
+class SongIndex:
+    def __init__(self, keys: np.ndarray, perm: np.ndarray):
+        self.keys = keys # ids as dtype 'S<8k>', ordered by hash
+        self.perm = perm # keys[i] is the song with graph index perm[i]
+        self.hashes = _hash(keys)
+        # Colliding hashes (astronomically rare) fall back to binary search over the ids
+        self._by_bytes = None
+        if len(keys) > 1 and (self.hashes[1:] == self.hashes[:-1]).any():
+            self._by_bytes = np.argsort(keys)
+
+    @classmethod
+    def from_ids(cls, ids) -> "SongIndex":
+        """ids[i] = id of the song with graph index i."""
+        encoded = [str(i).encode('utf-8') for i in ids]
+        width = max([len(e) for e in encoded] + [1])
+        keys = np.array(encoded, dtype=f"S{(width + 7) // 8 * 8}")
+        if len(np.unique(keys)) != len(keys):
+            uniq, counts = np.unique(keys, return_counts=True)
+            raise ValueError(f"Duplicate song ids in catalog: {[d.decode() for d in uniq[counts > 1][:5]]}")
+        order = np.argsort(_hash(keys), kind='stable')
+        return cls(keys[order], order.astype(np.int32 if len(order) < 2**31 else np.int64))
+
+    @classmethod
+    def from_catalog(cls, dataset_path: str) -> "SongIndex":
+        return cls.from_ids(load_columns(dataset_path, ['id'])['id'])
+
+    def save(self, path: str):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, keys=self.keys, perm=self.perm)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SongIndex":
+        with np.load(path) as data:
+            return cls(data['keys'], data['perm'])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, song_ids) -> np.ndarray:
+        """Graph indices for a batch of ids; -1 for ids not in the catalog."""
+        query, too_long = _encode(song_ids, self.keys.dtype)
+        if not len(self.keys) or not len(query):
+            return np.full(len(query), -1, dtype=np.int64)
+
+        if self._by_bytes is None:
+            pos = np.searchsorted(self.hashes, _hash(query))
+            pos[pos == len(self.keys)] = 0
+        else:
+            pos = self._by_bytes[np.minimum(np.searchsorted(self.keys[self._by_bytes], query), len(self.keys) - 1)]
+        found = (self.keys[pos] == query) & ~too_long
+        return np.where(found, self.perm[pos], -1).astype(np.int64)
+
+    def get(self, song_id):
+        """Graph index of one id, or None."""
+        idx = int(self.lookup([song_id])[0])
+        return idx if idx >= 0 else None
+
+    def ids(self) -> np.ndarray:
+        """Song ids in graph order (object array of str)."""
+        out = np.empty(len(self.keys), dtype=object)
+        out[self.perm] = [k.decode('utf-8') for k in self.keys.tolist()]
+        return out
+
+def song_index_path_for(graph_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(graph_path)), SONG_INDEX_FILE)
+
+def load_or_build_song_index(path: str, dataset_path: str) -> SongIndex:
+    if os.path.exists(path):
+        return SongIndex.load(path)
+    index = SongIndex.from_catalog(dataset_path)
+    index.save(path)
+    print(f"Built song index for {len(index)} songs -> {path}")
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds song_index.npz from the training catalog")
+    parser.add_argument("--dataset", default="../dataset.json")
+    parser.add_argument("--output", default=SONG_INDEX_FILE)
+    parser.add_argument("--benchmark", type=int, default=0, help="Also time N random lookups")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = SongIndex.from_catalog(args.dataset)
+    index.save(args.output)
+    print(f"Indexed {len(index)} songs in {time.perf_counter() - start:.2f}s -> {args.output}")
+
+    if args.benchmark:
+        rng = np.random.default_rng(0)
+        ids = index.ids()
+        query = list(ids[rng.integers(0, len(ids), args.benchmark)])
+        start = time.perf_counter()
+        result = index.lookup(query)
+        elapsed = time.perf_counter() - start
+        assert (ids[result] == np.asarray(query, dtype=object)).all()
+        print(f"{args.benchmark} lookups in {elapsed * 1000:.1f} ms ({args.benchmark / elapsed / 1e6:.2f}M/s)")
+
+if __name__ == "__main__":
+    main()
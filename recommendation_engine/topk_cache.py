@@ -0,0 +1,56 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+# Offline stage: precompute every user's top-K song indices once per training run.
+# Stored as a compact int32 [NumUsers, K] array keyed by user index, tagged with the
+# checksum of the embeddings it was computed from so serving can detect staleness.
+
+CACHE_K = 100       # Deep enough for the service's top_k * 2 candidate pool
+USER_CHUNK = 4096   # Users scored per search call
+
+def cache_path_for(embeddings_path):
+    """final_embeddings.pt -> final_embeddings.topk.npz"""
+    return f"{os.path.splitext(embeddings_path)[0]}.topk.npz"
+
+def build_topk_cache(user_emb, index, k=CACHE_K):
+    topk = np.empty((user_emb.shape[0], k), dtype=np.int32)
+    for start in range(0, user_emb.shape[0], USER_CHUNK):
+        topk[start:start + USER_CHUNK] = index.search(user_emb[start:start + USER_CHUNK], k)
+    return topk
+
+def save_topk_cache(path, topk, checksum):
+    np.savez(path, topk=topk, checksum=checksum)
+
+def load_topk_cache(path, checksum):
+    """Returns the cached [NumUsers, K] array, or None if missing or built from other embeddings."""
+    if not os.path.exists(path):
+        return None
+    data = np.load(path)
+    if str(data['checksum']) != checksum:
+        print(f"Top-K cache at {path} was built from different embeddings, ignoring it.")
+        return None
+    return data['topk']
+
+def main():
+    from ann_index import ExactIndex
+    from embedding_store import load_embeddings
+
+    parser = argparse.ArgumentParser(description="Precompute per-user top-K recommendations")
+    parser.add_argument("--embeddings", default="final_embeddings.pt")
+    parser.add_argument("--k", type=int, default=CACHE_K)
+    args = parser.parse_args()
+
+    user_emb, song_emb, checksum = load_embeddings(args.embeddings)
+
+    start = time.time()
+    # Always exact offline: the cache is only computed once per training run
+    topk = build_topk_cache(user_emb, ExactIndex(song_emb), args.k)
+    out_path = cache_path_for(args.embeddings)
+    save_topk_cache(out_path, topk, checksum)
+    print(f"Cached top-{args.k} for {topk.shape[0]} users in {time.time() - start:.2f}s -> {out_path}")
+
+if __name__ == "__main__":
+    main()
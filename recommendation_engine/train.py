@@ -1,10 +1,13 @@
+import json
+import os
 import torch
-import torch.nn as nn
 import torch.optim as optim
 from graph import load_graph_data
 from model import HeteroGNN
-import time
-import random
+from embedding_store import export_embeddings, user_updates_path
+from sampler import NeighborSampler, infer_embeddings
+from negatives import NegativeSampler
+from train_engine import TrainingEngine, bpr_loss
 
 # --- Config ---
 EMBEDDING_DIM = 64
@@ -13,94 +16,167 @@ EPOCHS = 50
 BATCH_SIZE = 1024  # Large batch for BPR
 DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
-def train():
-    print(f"Training on {DEVICE}...")
-    
+# "full"      = per batch, recompute exactly the embeddings the batch needs (full neighbourhoods)
+# "minibatch" = per batch, neighbour-sampled computation graph; memory bounded by batch size
+# "epoch"     = one full-graph forward per epoch, batch gradients accumulated into one step
+TRAIN_MODE = "full"
+SONG_FANOUT = 10      # Songs sampled per user per batch (minibatch mode)
+ARTIST_FANOUT = None  # Artists sampled per song (None = all; most songs have one)
+INFERENCE_CHUNK = 65536
+# Neighbour aggregation: "sum" (listen-count weighted sum), "mean" or "sym" (degree-normalized)
+AGGREGATION = "sum"
+
+# Negatives: base distribution "uniform" or "popularity" (count^alpha), never a training positive.
+# Compare strategies on your data with benchmark_negatives.py before changing the defaults.
+NEGATIVE_DISTRIBUTION = "uniform"
+NEGATIVE_ALPHA = 0.75
+FILTER_POSITIVE_NEGATIVES = True
+IN_BATCH_NEGATIVES = 0.0 # Share of rows whose negative is another row's positive
+HARD_NEGATIVES = 0.0     # Share of rows whose negative is the top-scoring of HARD_CANDIDATES draws
+HARD_CANDIDATES = 16
+
+def train(mode=TRAIN_MODE, epochs=EPOCHS, graph_path="graph_data.pt", save=True, report_path=None):
+    print(f"Training on {DEVICE} ({mode})...")
+
     # 1. Load Data
-    data = load_graph_data()
+    data = load_graph_data(graph_path, AGGREGATION)
     if not data: return
 
-    num_users = data['num_users']
-    num_songs = data['num_songs']
-    num_artists = data['num_artists']
-    
-    # Adjacency Lists (for Message Passing)
-    user_song_adj = data['user_song_edges'].to(DEVICE)     # [2, E_us]
-    song_artist_adj = data['song_artist_edges'].to(DEVICE) # [2, E_sa]
+    # Sparse CSR adjacencies (for full-graph Message Passing)
+    user_song_adj = data['user_song_csr'].to(DEVICE)     # [NumUsers, NumSongs]
+    song_artist_adj = data['song_artist_csr'].to(DEVICE) # [NumSongs, NumArtists]
 
     # Training Edges (Positive Samples)
     # We use the same edges for message passing AND training for this transductive demo.
     # In rigorous setups, you'd split edges.
-    train_pos_u = user_song_adj[0]
-    train_pos_s = user_song_adj[1]
-    num_edges = train_pos_u.shape[0]
+    train_pos_u = data['user_song_edges'][0]
+    train_pos_s = data['user_song_edges'][1]
 
     # 2. Model & Opt
-    model = HeteroGNN(num_users, num_songs, num_artists, EMBEDDING_DIM).to(DEVICE)
-    optimizer = optim.Adam(model.parameters(), lr=LR)
-    
+    model, optimizers = build_model(data, mode)
+    engine = TrainingEngine(train_pos_u, train_pos_s, data['num_songs'], BATCH_SIZE, optimizers,
+                            negative_sampler=build_negative_sampler(data, model))
+    sampler = build_sampler(data, mode)
+
     # 3. Training Loop
     model.train()
-    
-    for epoch in range(EPOCHS):
-        total_loss = 0
-        
-        # Shuffle training edges
-        perm = torch.randperm(num_edges)
-        train_pos_u = train_pos_u[perm]
-        train_pos_s = train_pos_s[perm]
-        
-        # 1. Forward Pass (Get UPDATED embeddings via Message Passing)
-        # We do this once per epoch (Full Batch GNN) or per large batch
-        # For this dataset size, Full Batch is fast and stable.
-        u_emb_final, s_emb_final = model(user_song_adj, song_artist_adj)
-        
-        # 2. Mini-batching for BPR Loss
-        for i in range(0, num_edges, BATCH_SIZE):
-            batch_u_idx = train_pos_u[i:i+BATCH_SIZE]
-            batch_pos_s_idx = train_pos_s[i:i+BATCH_SIZE]
-            current_batch_size = len(batch_u_idx)
-            
-            # Negative Sampling
-            batch_neg_s_idx = torch.randint(0, num_songs, (current_batch_size,), device=DEVICE)
-            
-            # Look up embeddings
-            u_e = u_emb_final[batch_u_idx]
-            pos_s_e = s_emb_final[batch_pos_s_idx]
-            neg_s_e = s_emb_final[batch_neg_s_idx]
-            
-            # Compute Scores (Dot Product)
-            pos_scores = (u_e * pos_s_e).sum(dim=1)
-            neg_scores = (u_e * neg_s_e).sum(dim=1)
-            
-            # BPR Loss: -ln(sigmoid(pos - neg))
-            loss = -torch.log(torch.sigmoid(pos_scores - neg_scores) + 1e-10).mean()
-            
-            optimizer.zero_grad()
-            loss.backward(retain_graph=True) # Retain graph because u_emb_final depends on graph
-            optimizer.step()
-            
-            total_loss += loss.item()
-
-            # Detach to save memory if doing multi-step (not strictly needed for BPR here but good practice)
-            # But since we re-compute forward pass next epoch, we are fine.
-
-        if (epoch+1) % 5 == 0:
-            print(f"Epoch {epoch+1}/{EPOCHS} | Loss: {total_loss:.4f}")
+    if mode == "epoch":
+        # One forward pass (Full Batch GNN) shared by every batch of the epoch
+        epoch_emb = {}
+
+        def begin_epoch():
+            epoch_emb['u'], epoch_emb['s'] = model(user_song_adj, song_artist_adj)
+
+        def batch_loss(u, pos, neg):
+            u, pos, neg = u.to(DEVICE), pos.to(DEVICE), neg.to(DEVICE)
+            return bpr_loss(epoch_emb['u'][u], epoch_emb['s'][pos], epoch_emb['s'][neg])
+
+        engine.fit(epochs, batch_loss, accumulate=True, begin_epoch=begin_epoch)
+        epoch_emb.clear()
+    else:
+        engine.fit(epochs, sampled_batch_loss(model.forward_sampled, sampler))
+
+    summary = engine.summary()
+    print(f"Mean epoch {summary['mean_epoch_seconds']:.2f}s | {summary['mean_samples_per_sec']:,.0f} samples/s | "
+          f"peak RSS {summary['peak_rss_mb'] or 0:,.0f} MB")
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump({'mode': mode, **summary, 'history': engine.history}, f, indent=2)
+    if not save:
+        return summary
 
     # 4. Save Model & Embeddings
+    save_outputs(model, *final_embeddings(model, data, sampler, mode))
+    return summary
+
+def build_model(data, mode):
+    sparse = mode == "minibatch"
+    model = HeteroGNN(data['num_users'], data['num_songs'], data['num_artists'], EMBEDDING_DIM, sparse=sparse).to(DEVICE)
+    if sparse:
+        # Only the embedding rows a batch touched are updated
+        embedding_params = [model.user_emb.weight, model.song_emb.weight, model.artist_emb.weight]
+        dense_params = [p for n, p in model.named_parameters() if not n.endswith('_emb.weight')]
+        optimizers = [optim.SparseAdam(embedding_params, lr=LR), optim.Adam(dense_params, lr=LR)]
+    else:
+        optimizers = [optim.Adam(model.parameters(), lr=LR)]
+    return model, optimizers
+
+def build_sampler(data, mode, seed=None):
+    return NeighborSampler(data['user_song_edges'], data['song_artist_edges'], data['num_users'], data['num_songs'],
+                           song_fanout=SONG_FANOUT if mode == "minibatch" else None,
+                           artist_fanout=ARTIST_FANOUT if mode == "minibatch" else None,
+                           seed=seed, user_song_weights=data['user_song_weights'],
+                           num_artists=data['num_artists'], aggregation=AGGREGATION)
+
+def build_negative_sampler(data, model, seed=None, **overrides):
+    options = dict(distribution=NEGATIVE_DISTRIBUTION, alpha=NEGATIVE_ALPHA,
+                   filter_positives=FILTER_POSITIVE_NEGATIVES, in_batch_ratio=IN_BATCH_NEGATIVES,
+                   hard_ratio=HARD_NEGATIVES, hard_candidates=HARD_CANDIDATES)
+    options.update(overrides)
+    edges = data['user_song_edges']
+    return NegativeSampler(edges[0].numpy(), edges[1].numpy(), data['num_songs'],
+                           score_fn=embedding_scorer(model), seed=seed, **options)
+
+def embedding_scorer(model):
+    """
+    Hard-negative scores from the base embedding tables: the trainable part of
+    the current embeddings, without a message-passing forward per batch.
+    """
+    @torch.no_grad()
+    def score(users, candidates):
+        u = model.user_emb.weight[users.to(DEVICE)]          # [B, Dim]
+        s = model.song_emb.weight[candidates.to(DEVICE)]     # [B, K, Dim]
+        return (s * u[:, None, :]).sum(dim=-1)
+    return score
+
+def sampled_batch_loss(forward_sampled, sampler):
+    def batch_loss(u, pos, neg):
+        # Fresh forward over just this batch's computation graph [users] x [positives ++ negatives]
+        batch = sampler.sample(u.numpy(), torch.cat([pos, neg]).numpy()).to(DEVICE)
+        u_e, s_e = forward_sampled(batch)
+        return bpr_loss(u_e, s_e[:len(pos)], s_e[len(pos):])
+    return batch_loss
+
+def final_embeddings(model, data, sampler, mode):
+    model.eval()
+    if mode == "minibatch":
+        # Final embeddings use every neighbour (no sampling), computed in chunks
+        return infer_embeddings(model, sampler, data['num_users'], data['num_songs'], INFERENCE_CHUNK, DEVICE)
+    with torch.no_grad():
+        return model(data['user_song_csr'].to(DEVICE), data['song_artist_csr'].to(DEVICE))
+
+def save_outputs(model, final_u, final_s):
     torch.save(model.state_dict(), "hnn_model.pth")
     print("\nModel saved to hnn_model.pth")
-    
+
     # Save Final Embeddings for Inference
-    model.eval()
-    with torch.no_grad():
-        final_u, final_s = model(user_song_adj, song_artist_adj)
-        torch.save({
-            'user_embeddings': final_u.cpu(),
-            'song_embeddings': final_s.cpu()
-        }, "final_embeddings.pt")
-        print("Final embeddings saved to final_embeddings.pt")
+    torch.save({
+        'user_embeddings': final_u.cpu(),
+        'song_embeddings': final_s.cpu(),
+        'aggregation': AGGREGATION, # online_update.py re-embeds users the same way
+    }, "final_embeddings.pt")
+    print("Final embeddings saved to final_embeddings.pt")
+
+    # Memory-mappable copy for serving (shared page cache across workers)
+    export_embeddings(final_u.cpu().numpy(), final_s.cpu().numpy(), "final_embeddings.pt", aggregation=AGGREGATION)
+    print("Exported mmap store final_embeddings.{user,song}.npy")
+
+    # Online user updates were relative to the previous embeddings
+    if os.path.exists(user_updates_path("final_embeddings.pt")):
+        os.remove(user_updates_path("final_embeddings.pt"))
 
 if __name__ == "__main__":
-    train()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["full", "minibatch", "epoch"], default=TRAIN_MODE)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--graph", default="graph_data.pt")
+    parser.add_argument("--no-save", action="store_true", help="Train and report only (benchmarks)")
+    parser.add_argument("--report", help="Write per-epoch stats as JSON to this path")
+    parser.add_argument("--workers", type=int, default=1, help="Data-parallel worker processes (full/minibatch)")
+    args = parser.parse_args()
+    if args.workers > 1:
+        from distributed import train_parallel
+        train_parallel(args.workers, args.mode, args.epochs, args.graph, save=not args.no_save, report_path=args.report)
+    else:
+        train(args.mode, args.epochs, args.graph, save=not args.no_save, report_path=args.report)
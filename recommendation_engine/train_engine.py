@@ -0,0 +1,137 @@
+import os
+import time
+
+import torch
+
+try:
+    import resource # POSIX only
+except ImportError:
+    resource = None
+
+# BPR training loop shared by the train.py modes, with per-epoch wall time,
+# samples/sec (positive edges per second) and peak RSS reporting.
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if os.name != 'darwin' else peak / (1024 * 1024) # KB on Linux, bytes on macOS
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def bpr_loss(u_e, pos_s_e, neg_s_e):
+    pos_scores = (u_e * pos_s_e).sum(dim=1)
+    neg_scores = (u_e * neg_s_e).sum(dim=1)
+    # BPR Loss: -ln(sigmoid(pos - neg))
+    return -torch.log(torch.sigmoid(pos_scores - neg_scores) + 1e-10).mean()
+
+class TrainingEngine:
+    """
+    Iterates shuffled positive (user, song) edges in batches and calls
+    `batch_loss(users, pos_songs, neg_songs) -> loss`. Negatives come from
+    `negative_sampler(users, pos_songs)` (see negatives.py), or are uniform.
+
+    By default every batch does backward + optimizer step on a forward pass
+    it computed itself. With accumulate=True the batch losses are summed and
+    a single backward/step runs at the end of the epoch (for a forward pass
+    shared by the whole epoch, set up in `begin_epoch`).
+
+    Progress is printed every `log_every` epochs and after the last one;
+    verbose=False (e.g. non-zero ranks of a distributed run) prints nothing.
+    """
+
+    def __init__(self, train_pos_u, train_pos_s, num_songs, batch_size, optimizers, log_every=5,
+                 negative_sampler=None, verbose=True):
+        self.train_pos_u = train_pos_u
+        self.train_pos_s = train_pos_s
+        self.num_songs = num_songs
+        self.batch_size = batch_size
+        self.optimizers = optimizers
+        self.log_every = log_every
+        self.verbose = verbose
+        self.negative_sampler = negative_sampler
+        self.history = []
+
+    def _zero_grad(self):
+        for opt in self.optimizers:
+            opt.zero_grad()
+
+    def _step(self):
+        for opt in self.optimizers:
+            opt.step()
+
+    def fit(self, epochs, batch_loss, accumulate=False, begin_epoch=None):
+        num_edges = self.train_pos_u.shape[0]
+        num_batches = (num_edges + self.batch_size - 1) // self.batch_size
+
+        for epoch in range(epochs):
+            start = time.perf_counter()
+            total_loss = 0.0
+            epoch_loss = None
+
+            if begin_epoch:
+                begin_epoch()
+            if accumulate:
+                self._zero_grad()
+
+            # Shuffle training edges
+            perm = torch.randperm(num_edges)
+            for i in range(0, num_edges, self.batch_size):
+                idx = perm[i:i + self.batch_size]
+                batch_u = self.train_pos_u[idx]
+                batch_pos = self.train_pos_s[idx]
+                # Negative Sampling
+                if self.negative_sampler is not None:
+                    batch_neg = self.negative_sampler(batch_u, batch_pos)
+                else:
+                    batch_neg = torch.randint(0, self.num_songs, (len(idx),))
+
+                loss = batch_loss(batch_u, batch_pos, batch_neg)
+                total_loss += loss.item()
+
+                if accumulate:
+                    epoch_loss = loss if epoch_loss is None else epoch_loss + loss
+                else:
+                    self._zero_grad()
+                    loss.backward()
+                    self._step()
+
+            if accumulate and epoch_loss is not None:
+                (epoch_loss / num_batches).backward()
+                self._step()
+
+            elapsed = time.perf_counter() - start
+            stats = {
+                'epoch': epoch + 1,
+                'loss': total_loss,
+                'seconds': elapsed,
+                'samples_per_sec': num_edges / elapsed if elapsed else 0.0,
+                'rss_mb': current_rss_mb(),
+                'peak_rss_mb': peak_rss_mb(),
+            }
+            self.history.append(stats)
+            if self.verbose and ((epoch + 1) % self.log_every == 0 or epoch + 1 == epochs):
+                print(f"Epoch {epoch+1}/{epochs} | Loss: {total_loss:.4f} | {elapsed:.2f}s | "
+                      f"{stats['samples_per_sec']:,.0f} samples/s | peak RSS {_fmt_mb(stats['peak_rss_mb'])}")
+        return self.history
+
+    def summary(self):
+        if not self.history:
+            return {}
+        seconds = [h['seconds'] for h in self.history]
+        return {
+            'epochs': len(self.history),
+            'mean_epoch_seconds': sum(seconds) / len(seconds),
+            'mean_samples_per_sec': sum(h['samples_per_sec'] for h in self.history) / len(self.history),
+            'final_loss': self.history[-1]['loss'],
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+def _fmt_mb(value):
+    return "n/a" if value is None else f"{value:,.0f} MB"